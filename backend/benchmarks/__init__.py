@@ -0,0 +1,4 @@
+"""Offline performance benchmarks for the IntelliRAG backend.
+
+Run from the `backend` directory: `python -m benchmarks.run --help`.
+"""
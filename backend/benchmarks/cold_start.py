@@ -0,0 +1,68 @@
+"""
+Worker Cold-Start Probe
+
+Runs in a fresh interpreter (spawned by `benchmarks.run --scenario cold_start`) and
+prints one JSON line with the time spent in each phase of a worker boot:
+
+- `import_s`: importing the application (with the offline stand-ins installed),
+- `startup_s`: the FastAPI lifespan (warm-up, when enabled),
+- `first_request_s` / `second_request_s`: the first two `/qa` calls.
+
+    python -m benchmarks.cold_start [--no-warm-up] [--llm-latency 0.0]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-warm-up", action="store_true")
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    os.environ["WARM_UP_ON_STARTUP"] = "false" if args.no_warm_up else "true"
+    # No database here: the schema migration is a deploy concern, not part of the benchmark
+    os.environ["MIGRATE_ON_STARTUP"] = "false"
+
+    start = time.perf_counter()
+    from .fakes import install_stand_ins
+
+    install_stand_ins(llm_latency=args.llm_latency)
+    from src.app import api
+    imported = time.perf_counter()
+
+    import httpx
+    from fastapi import Request  # resolved at definition time (no postponed annotations here)
+
+    async def bench_user(request: Request) -> str:
+        return "cold-start-user"
+
+    api.app.dependency_overrides[api.verify_clerk_token] = bench_user
+
+    async def boot() -> dict:
+        async with api.lifespan(api.app):
+            started = time.perf_counter()
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                latencies = []
+                for _ in range(2):
+                    t = time.perf_counter()
+                    resp = await client.post("/qa", json={"question": "What are the payment terms?"})
+                    resp.raise_for_status()
+                    latencies.append(time.perf_counter() - t)
+        return {
+            "import_s": round(imported - start, 4),
+            "startup_s": round(started - imported, 4),
+            "first_request_s": round(latencies[0], 4),
+            "second_request_s": round(latencies[1], 4),
+        }
+
+    print(json.dumps(asyncio.run(boot())))
+
+
+if __name__ == "__main__":
+    main()
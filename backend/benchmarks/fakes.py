@@ -0,0 +1,439 @@
+"""
+Deterministic Stand-ins for Live Services
+
+Every external dependency of the QA and indexing paths gets a local replacement
+so benchmarks are reproducible, free and network-independent:
+
+- `ScriptedChatModel`: replies in each agent's expected output schema after a
+  configurable artificial latency (simulating provider round-trips), and reports
+  prefix-cache hits the way OpenAI does (`input_token_details.cache_read`).
+- `HashEmbeddings`: bag-of-words feature hashing, so similar texts get similar
+  vectors without any API call.
+- `InMemoryMetadataStore`: replaces the Neon `user_files` helpers.
+- The vector store is the in-memory `LocalVectorStore` and the checkpointer is
+  LangGraph's `InMemorySaver`.
+
+`install_stand_ins()` must run before `src.app.core.agents` is imported.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.app.core.agents.prompts import CONTEXT_CRITIC_SYSTEM_PROMPT, SUMMARIZATION_SYSTEM_PROMPT
+
+_CHUNK_ID_RE = re.compile(r"\[(P[^\[\]\n]{1,38})\]")
+_call_ids = itertools.count()
+
+# Leading-message prefixes seen before, emulating the provider's automatic prompt cache
+_seen_prefixes: set = set()
+_prefix_lock = threading.Lock()
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """A chat model that answers in each agent's output schema after `latency` seconds."""
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+    def _cached_tokens(self, messages: List[BaseMessage]) -> int:
+        """Tokens in the longest previously-seen run of leading messages."""
+        cached = 0
+        prefix = hashlib.blake2b(digest_size=16)
+        running = 0
+        with _prefix_lock:
+            for message in messages[:-1]:
+                prefix.update(str(message.content).encode())
+                running += _approx_tokens(str(message.content))
+                key = prefix.hexdigest()
+                if key in _seen_prefixes:
+                    cached = running
+                else:
+                    _seen_prefixes.add(key)
+        return cached
+
+    def _reply(self, system: str, messages: List[BaseMessage]) -> AIMessage:
+        last = messages[-1]
+        user_text = str(last.content)
+        # Context-heavy agents get the CONTEXT block and their role instructions as
+        # separate messages after a shared system prompt; read the whole transcript
+        transcript = "\n".join(str(m.content) for m in messages if not isinstance(m, SystemMessage))
+        role = system + "\n" + user_text
+
+        if "Search Strategist" in system:
+            question = user_text.rsplit("Question:\n", 1)[-1].strip()
+            return AIMessage(content=f"PLAN: Search directly for the question.\nQUESTIONS:\n- {question}")
+
+        if "Retrieval Agent" in system:
+            if isinstance(last, ToolMessage):
+                return AIMessage(content="Retrieved.")
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": "retrieval_tool", "args": {"query": user_text}, "id": f"call_{next(_call_ids)}"}],
+            )
+
+        if "Context Critic" in role:
+            context = transcript.split("CONTEXT:", 1)[-1].split(CONTEXT_CRITIC_SYSTEM_PROMPT, 1)[0].strip()
+            return AIMessage(content=f"RATIONALE:\n- All chunks: HIGHLY RELEVANT\n\nFILTERED_CONTEXT:\n{context}")
+
+        if "Answer Writer" in role:
+            context = transcript.split(SUMMARIZATION_SYSTEM_PROMPT, 1)[0]
+            ids = list(dict.fromkeys(_CHUNK_ID_RE.findall(context)))[:3]
+            if not ids:
+                return AIMessage(content="The provided documents do not contain information regarding this topic.")
+            return AIMessage(content=" ".join(f"Relevant fact number {n} [{cid}]." for n, cid in enumerate(ids, 1)))
+
+        if "Verification Agent" in role:
+            draft = user_text.split("Draft Answer:", 1)[-1].strip()
+            return AIMessage(content=draft)
+
+        # Document summaries and anything else
+        return AIMessage(content=user_text[:200])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+
+        system = next((str(m.content) for m in messages if isinstance(m, SystemMessage)), "")
+        reply = self._reply(system, messages)
+
+        prompt_tokens = sum(_approx_tokens(str(m.content)) for m in messages)
+        completion_tokens = _approx_tokens(str(reply.content))
+        reply.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "input_token_details": {"cache_read": self._cached_tokens(messages)},
+        }
+        return ChatResult(generations=[ChatGeneration(message=reply)])
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic feature-hashing embedder (no network, stable across runs)."""
+
+    def __init__(self, dimensions: int = 256) -> None:
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vec = np.zeros(self.dimensions, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vec[h % self.dimensions] += 1.0 if (h >> 63) else -1.0
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class InMemoryMetadataStore:
+    """Process-local replacement for the `user_files` helpers in `core/db.py`."""
+
+    def __init__(self) -> None:
+        self._rows: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+        self._document_ids: Dict[Tuple[str, str], int] = {}
+        self._tombstones: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def init_db(self) -> None:
+        return None
+
+    def allocate_document_id(self, user_id: str, filename: str) -> int:
+        with self._lock:
+            key = (user_id, filename)
+            if key not in self._document_ids:
+                existing = [r["id"] for r in self._rows if r["user_id"] == user_id and r["filename"] == filename]
+                self._document_ids[key] = existing[0] if existing else next(self._ids)
+            return self._document_ids[key]
+
+    def save_file_metadata(
+        self, user_id, filename, file_path, summary=None, centroid=None, doc_id=None, collection=None, **kwargs
+    ) -> None:
+        with self._lock:
+            # Upsert on (user_id, filename), like the unique constraint in Postgres
+            previous = [r for r in self._rows if r["user_id"] == user_id and r["filename"] == filename]
+            self._rows = [r for r in self._rows if r not in previous]
+            self._rows.append({
+                "id": doc_id if doc_id is not None else next(self._ids),
+                "user_id": user_id,
+                "filename": filename,
+                "file_path": file_path,
+                "summary": summary,
+                "centroid": centroid,
+                "collection": collection or (previous[0].get("collection") if previous else None),
+                "upload_timestamp": datetime.now(timezone.utc),
+                **kwargs,
+            })
+
+    def save_files_metadata(self, rows: list) -> None:
+        for row in rows:
+            self.save_file_metadata(**row)
+
+    def get_user_files(self, user_id: str, limit: int = 50, after: Any = None, prefix: Optional[str] = None) -> list:
+        with self._lock:
+            rows = [
+                r for r in self._rows
+                if r["user_id"] == user_id and (not prefix or r["filename"].startswith(prefix))
+            ]
+        rows.sort(key=lambda r: (r["upload_timestamp"], r["id"]), reverse=True)
+        if after is not None:
+            rows = [r for r in rows if (r["upload_timestamp"], r["id"]) < tuple(after)]
+        return rows[:limit]
+
+    def get_document_profiles(self, user_id: str) -> list:
+        latest: Dict[str, Dict[str, Any]] = {}
+        for row in self.get_user_files(user_id, limit=len(self._rows)):
+            if row["centroid"] is not None:
+                latest.setdefault(row["file_path"], row)
+        return list(latest.values())
+
+    def get_document_catalog(self, user_id: str) -> list:
+        with self._lock:
+            return [
+                {"id": r["id"], "filename": r["filename"], "collection": r.get("collection")}
+                for r in self._rows if r["user_id"] == user_id
+            ]
+
+    def set_collection(self, user_id: str, filenames: list, collection: Optional[str]) -> int:
+        with self._lock:
+            rows = [r for r in self._rows if r["user_id"] == user_id and r["filename"] in filenames]
+            for r in rows:
+                r["collection"] = collection
+            return len(rows)
+
+    def get_user_documents(self, user_id: str) -> list:
+        with self._lock:
+            return sorted((dict(r) for r in self._rows if r["user_id"] == user_id), key=lambda r: r["id"])
+
+    def get_all_documents(self) -> list:
+        with self._lock:
+            return [{"id": r["id"], "user_id": r["user_id"], "file_path": r["file_path"]} for r in self._rows]
+
+    # Deletion tombstones (see `core/deletion.py`); leases and backoff are not emulated
+
+    def tombstone_files(self, user_id: str, sources: list) -> int:
+        with self._lock:
+            before = len(self._rows)
+            self._rows = [
+                r for r in self._rows
+                if not (r["user_id"] == user_id and r["file_path"] in sources)
+            ]
+            for source in sources:
+                self._tombstones[(user_id, source)] = {
+                    "id": next(self._ids), "user_id": user_id, "source": source,
+                    "attempts": 0, "completed": False, "created_at": datetime.now(timezone.utc),
+                }
+            return before - len(self._rows)
+
+    def get_tombstoned_sources(self, user_id: str) -> list:
+        with self._lock:
+            return [source for uid, source in self._tombstones if uid == user_id]
+
+    def claim_tombstones(self, limit: int, lease_seconds: float) -> list:
+        with self._lock:
+            return [dict(t) for t in self._tombstones.values() if not t["completed"]][:limit]
+
+    def _mark(self, ids: list, **changes: Any) -> None:
+        with self._lock:
+            for t in self._tombstones.values():
+                if t["id"] in ids:
+                    t.update(changes)
+
+    @contextmanager
+    def lock_tombstones(self, user_id: str, ids: list = (), sources: list = (), drop: bool = False) -> Iterator[list]:
+        # The row lock is not emulated; the liveness and supersede checks are
+        with self._lock:
+            rows = [
+                t for (uid, source), t in self._tombstones.items()
+                if uid == user_id and (t["id"] in ids or source in sources)
+            ]
+            uploads = {r["file_path"]: r["upload_timestamp"] for r in self._rows if r["user_id"] == user_id}
+            superseded = [t for t in rows if uploads.get(t["source"], t["created_at"]) > t["created_at"]]
+            for t in superseded:
+                self._tombstones.pop((user_id, t["source"]), None)
+        live = [dict(t) for t in rows if t not in superseded]
+        yield live
+        with self._lock:
+            for t in live:
+                if drop:
+                    self._tombstones.pop((user_id, t["source"]), None)
+                elif (user_id, t["source"]) in self._tombstones:
+                    self._tombstones[(user_id, t["source"])]["completed"] = True
+
+    def fail_tombstones(self, ids: list, error: str, base_delay: float, max_delay: float) -> None:
+        self._mark(ids, last_error=error)
+
+    def reopen_tombstones(self, ids: list) -> None:
+        self._mark(ids, completed=False)
+
+    def get_expired_tombstones(self, retention_seconds: float, limit: int) -> list:
+        with self._lock:
+            return [dict(t) for t in self._tombstones.values() if t["completed"]][:limit]
+
+    def purge_tombstones(self, ids: list) -> None:
+        with self._lock:
+            self._tombstones = {k: t for k, t in self._tombstones.items() if t["id"] not in ids}
+
+    def count_pending_tombstones(self) -> int:
+        with self._lock:
+            return sum(1 for t in self._tombstones.values() if not t["completed"])
+
+    def get_user_file_paths(self, user_id: str) -> list:
+        return sorted({r["file_path"] for r in self.get_user_files(user_id, limit=len(self._rows))})
+
+    # One embedding version offline: nothing is ever planned or migrated
+    def get_embedding_namespaces(self) -> dict:
+        return {}
+
+    def register_embedding_namespace(self, namespace: str, version: str, replace: bool = False) -> None:
+        pass
+
+    def get_tenant_embedding(self, user_id: str) -> dict:
+        with self._lock:
+            rows = sorted((r for r in self._rows if r["user_id"] == user_id), key=lambda r: r["id"])
+        return {
+            "active_namespace": None,
+            "target_namespace": None,
+            "previous_namespace": None,
+            "document_namespace": rows[0].get("embedding_namespace", "") if rows else None,
+        }
+
+    def plan_embedding_migrations(self, target_namespace: str) -> int:
+        return 0
+
+    def claim_embedding_migration(self, lease_seconds: float, dual_read_seconds: float) -> None:
+        return None
+
+    def count_documents_to_embed(self) -> int:
+        return 0
+
+
+def _as_coroutine(fn: Any) -> Any:
+    async def call(*args: Any, **kwargs: Any) -> Any:
+        return fn(*args, **kwargs)
+    return call
+
+
+def install_stand_ins(llm_latency: float = 0.0, embedding_dimensions: int = 256) -> InMemoryMetadataStore:
+    """
+    Rewires the application onto the local stand-ins.
+
+    Returns:
+        InMemoryMetadataStore: The metadata store now backing the `core.db` helpers.
+    """
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    # Settings are validated on first use; live credentials are never touched
+    for key, value in {
+        "OPENAI_API_KEY": "offline",
+        "PINECONE_API_KEY": "offline",
+        "PINECONE_INDEX_NAME": "offline",
+        "DATABASE_URL": "postgresql://offline",
+        "VECTOR_BACKEND": "local",
+        "OPENAI_EMBEDDING_DIMENSIONS": str(embedding_dimensions),
+        # Bag-of-words hashing scores one shared keyword far below a neural embedder
+        "MIN_EVIDENCE_SCORE": "0.05",
+    }.items():
+        os.environ[key] = value
+
+    # The chat model factory must be swapped before the agents module builds its agents
+    from src.app.core.llm import factory
+
+    from src.app.core.metrics import usage_callback
+
+    # Same usage callback as the real factory, so token/cost/cache reporting is exercised
+    model = ScriptedChatModel(latency=llm_latency, callbacks=[usage_callback])
+    factory.create_chat_model = lambda temperature=0.0: model
+
+    from src.app import api
+    from src.app.core import db, db_async
+    from src.app.core.llm.batching import BatchingEmbeddings
+    from src.app.core.retrieval import local_store, routing, vector_store
+    from src.app.services import indexing_service
+
+    indexing_service.create_chat_model = factory.create_chat_model
+
+    embeddings = HashEmbeddings(embedding_dimensions)
+    store = local_store.LocalVectorStore(embeddings, path=None, quantization="int8")
+    embeddings = BatchingEmbeddings(embeddings)
+    vector_store._get_embeddings = lambda: embeddings
+    vector_store._get_vector_store = lambda: store
+
+    metadata = InMemoryMetadataStore()
+    for name in (
+        "init_db",
+        "allocate_document_id",
+        "save_file_metadata",
+        "save_files_metadata",
+        "get_document_catalog",
+        "set_collection",
+        "get_all_documents",
+        "get_user_documents",
+        "get_user_files",
+        "get_document_profiles",
+        "tombstone_files",
+        "get_tombstoned_sources",
+        "claim_tombstones",
+        "lock_tombstones",
+        "fail_tombstones",
+        "reopen_tombstones",
+        "get_expired_tombstones",
+        "purge_tombstones",
+        "count_pending_tombstones",
+        "get_user_file_paths",
+        "get_embedding_namespaces",
+        "register_embedding_namespace",
+        "get_tenant_embedding",
+        "plan_embedding_migrations",
+        "claim_embedding_migration",
+        "count_documents_to_embed",
+    ):
+        fn = getattr(metadata, name)
+        for module in (db, api, routing):
+            if hasattr(module, name):
+                setattr(module, name, fn)
+        if hasattr(db_async, name):
+            setattr(db_async, name, _as_coroutine(fn))
+
+    from src.app.core.agents import graph
+
+    saver = InMemorySaver()
+    graph.get_postgres_saver = lambda: saver
+    graph.get_qa_graph.cache_clear()
+
+    return metadata
@@ -0,0 +1,351 @@
+"""
+Offline End-to-End Benchmark Runner
+
+Drives the real ingestion and QA code paths on top of the deterministic stand-ins
+in `benchmarks.fakes`, under a configurable concurrency level, and reports:
+
+- p50/p95/p99 latency and throughput per scenario,
+- p50/p95 wall time per pipeline stage (from the `core.metrics` collector),
+- with `--trace-allocations`, traced allocation peak per scenario and net traced
+  allocations per pipeline stage (p50/p95 per request, in MB). tracemalloc is
+  process-wide, so use `--concurrency 1` for a clean per-stage attribution,
+- resident memory per scenario: RSS at its end and its growth over the scenario,
+  plus the process peak RSS so far (`ru_maxrss` never decreases, so this is the
+  peak of this and every earlier scenario),
+- worker cold start (`cold_start`): import, lifespan warm-up and first-request
+  latency, measured in fresh interpreters with and without warm-up.
+
+Results can be saved as a baseline; later runs compare against it and exit with
+status 1 when p95 latency or throughput regresses beyond the tolerance.
+
+    python -m benchmarks.run --scenario all --concurrency 8 --requests 40
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from fastapi import Request
+
+from .fakes import install_stand_ins
+
+TOPICS = [
+    "vendor contract payment terms invoice schedule penalties",
+    "employee handbook vacation policy remote work benefits",
+    "quarterly financial report revenue margin guidance",
+    "server maintenance manual backup restore procedure",
+    "product roadmap release milestones feature priorities",
+    "security audit findings encryption access control",
+]
+
+SCENARIOS = ("index", "qa", "api", "cold_start")
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    arr = np.asarray(samples)
+    return {f"p{p}": round(float(np.percentile(arr, p)), 5) for p in (50, 95, 99)}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _rss_mb() -> float | None:
+    """Current resident set size; None where /proc is unavailable (macOS)."""
+    try:
+        resident_pages = int(Path("/proc/self/statm").read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+def _make_pdf(path: Path, topic: str, pages: int) -> None:
+    import pymupdf as fitz  # already required by the PDF loader
+
+    doc = fitz.open()
+    for n in range(pages):
+        page = doc.new_page()
+        body = " ".join(f"Section {n}.{i}: {topic}." for i in range(25))
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), body, fontsize=9)
+    doc.save(str(path))
+    doc.close()
+
+
+class Recorder:
+    """Collects latencies and per-stage timings for one scenario."""
+
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.stages: Dict[str, List[float]] = {}
+        self.allocations: Dict[str, List[float]] = {}
+
+    def add(
+        self,
+        seconds: float,
+        stages: Dict[str, float] | None = None,
+        allocations: Dict[str, int] | None = None,
+    ) -> None:
+        self.latencies.append(seconds)
+        for stage, value in (stages or {}).items():
+            self.stages.setdefault(stage, []).append(value)
+        for stage, allocated in (allocations or {}).items():
+            self.allocations.setdefault(stage, []).append(allocated / 1e6)
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        report = {
+            "requests": len(self.latencies),
+            "throughput_rps": round(len(self.latencies) / wall, 3) if wall else 0.0,
+            "latency": _percentiles(self.latencies),
+            "stages": {
+                stage: {k: v for k, v in _percentiles(values).items() if k != "p99"}
+                for stage, values in sorted(self.stages.items())
+            },
+        }
+        if self.allocations:
+            report["stage_allocations_mb"] = {
+                stage: {k: v for k, v in _percentiles(values).items() if k != "p99"}
+                for stage, values in sorted(self.allocations.items())
+            }
+        return report
+
+
+def _run_threads(fn: Callable[[int], None], requests: int, concurrency: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fn, range(requests)))
+    return time.perf_counter() - start
+
+
+def bench_index(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    from src.app.core.config import current_user_id
+    from src.app.core.metrics import collect_timings
+    from src.app.services.indexing_service import index_pdf_file
+
+    recorder = Recorder()
+
+    def one(i: int) -> None:
+        user = f"bench-user-{i % args.tenants}"
+        current_user_id.set(user)
+        folder = workdir / "data" / "uploads" / user
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / f"doc-{i}.pdf"
+        _make_pdf(path, TOPICS[i % len(TOPICS)], args.pages)
+
+        with collect_timings() as timings:
+            start = time.perf_counter()
+            index_pdf_file(path)
+            recorder.add(time.perf_counter() - start, timings.stages, timings.allocations)
+
+    wall = _run_threads(one, args.requests, args.concurrency)
+    return recorder.report(wall)
+
+
+def bench_qa(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    from src.app.core.config import current_user_id
+    from src.app.services.qa_service import answer_question
+
+    recorder = Recorder()
+
+    def one(i: int) -> None:
+        user = f"bench-user-{i % args.tenants}"
+        current_user_id.set(user)
+        question = f"What does the document say about {TOPICS[i % len(TOPICS)].split()[1]}?"
+
+        start = time.perf_counter()
+        result = answer_question(question, thread_id=f"bench-{user}-{i % 4}", include_timings=True)
+        recorder.add(
+            time.perf_counter() - start, result["timings"]["stages"], result["timings"].get("allocations")
+        )
+
+    wall = _run_threads(one, args.requests, args.concurrency)
+    return recorder.report(wall)
+
+
+def bench_api(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    import httpx
+
+    from src.app import api
+
+    async def bench_user(request: Request) -> str:
+        return request.headers.get("x-bench-user", "bench-user-0")
+
+    api.app.dependency_overrides[api.verify_clerk_token] = bench_user
+    pdf = workdir / "api-upload.pdf"
+    _make_pdf(pdf, TOPICS[0], args.pages)
+    pdf_bytes = pdf.read_bytes()
+
+    recorder = Recorder()
+    routes: Dict[str, Recorder] = {"POST /index-pdf": Recorder(), "POST /qa": Recorder(), "GET /my-files": Recorder()}
+
+    async def one(client: httpx.AsyncClient, sem: asyncio.Semaphore, i: int) -> None:
+        headers = {"x-bench-user": f"api-user-{i % args.tenants}"}
+        op = i % 3
+        async with sem:
+            start = time.perf_counter()
+            if op == 0:
+                route = "POST /index-pdf"
+                files = {"file": (f"api-{i}.pdf", pdf_bytes, "application/pdf")}
+                resp = await client.post("/index-pdf", files=files, headers=headers)
+            elif op == 1:
+                route = "POST /qa"
+                resp = await client.post("/qa", json={"question": "What are the payment terms?"}, headers=headers)
+            else:
+                route = "GET /my-files"
+                resp = await client.get("/my-files", headers=headers)
+            elapsed = time.perf_counter() - start
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{route} failed: {resp.status_code} {resp.text[:300]}")
+        recorder.add(elapsed)
+        routes[route].add(elapsed)
+
+    async def main() -> float:
+        sem = asyncio.Semaphore(args.concurrency)
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(one(client, sem, i) for i in range(args.requests)))
+            return time.perf_counter() - start
+
+    wall = asyncio.run(main())
+    report = recorder.report(wall)
+    report["stages"] = {route: rec.report(wall)["latency"] for route, rec in routes.items()}
+    api.app.dependency_overrides.clear()
+    return report
+
+
+def bench_cold_start(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    backend = Path(__file__).resolve().parent.parent
+    env = {**os.environ, "PYTHONPATH": str(backend)}
+
+    report: Dict[str, Any] = {}
+    for mode, flags in (("warm_up", []), ("lazy", ["--no-warm-up"])):
+        runs: List[Dict[str, float]] = []
+        for _ in range(args.cold_starts):
+            start = time.perf_counter()
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.cold_start", "--llm-latency", str(args.llm_latency), *flags],
+                cwd=workdir, env=env, capture_output=True, text=True, check=True,
+            )
+            run = json.loads(out.stdout.strip().splitlines()[-1])
+            run["process_to_first_response_s"] = round(time.perf_counter() - start - run["second_request_s"], 4)
+            runs.append(run)
+        report[mode] = {key: _percentiles([r[key] for r in runs])["p50"] for key in runs[0]}
+
+    # `compare` keys off latency/throughput: use time-to-first-response with warm-up
+    first = report["warm_up"]["process_to_first_response_s"]
+    report["latency"] = {"p50": first, "p95": first, "p99": first}
+    report["throughput_rps"] = 0.0
+    report["requests"] = args.cold_starts * 2
+    return report
+
+
+BENCHES = {"index": bench_index, "qa": bench_qa, "api": bench_api, "cold_start": bench_cold_start}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Returns a human-readable line for every metric that regressed beyond `tolerance`."""
+    regressions: List[str] = []
+    for scenario, current in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        cur_p95, base_p95 = current["latency"]["p95"], base["latency"]["p95"]
+        if base_p95 and cur_p95 > base_p95 * (1 + tolerance):
+            regressions.append(f"{scenario}: p95 {cur_p95:.4f}s > baseline {base_p95:.4f}s")
+        cur_tp, base_tp = current["throughput_rps"], base["throughput_rps"]
+        if base_tp and cur_tp < base_tp * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {cur_tp:.2f} rps < baseline {base_tp:.2f} rps")
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline IntelliRAG benchmarks.")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tenants", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=3, help="Pages per synthetic PDF.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated seconds per LLM call.")
+    parser.add_argument("--cold-starts", type=int, default=3, help="Fresh-process boots per cold-start mode.")
+    parser.add_argument(
+        "--trace-allocations", action="store_true",
+        help="Report tracemalloc peaks and per-stage allocations (slower).",
+    )
+    parser.add_argument("--baseline", type=Path, default=None, help="Fail if results regress against this file.")
+    parser.add_argument("--save-baseline", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--output", type=Path, default=None, help="Write the JSON report here.")
+    return parser
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    repo_backend = Path.cwd()
+    workdir = Path(tempfile.mkdtemp(prefix="intellirag-bench-"))
+    # Routes write uploads relative to the working directory
+    os.chdir(workdir)
+
+    install_stand_ins(llm_latency=args.llm_latency)
+
+    # Indexing first so the QA scenario has a corpus to search
+    scenarios = list(SCENARIOS) if args.scenario == "all" else (
+        ["index", args.scenario] if args.scenario == "qa" else [args.scenario]
+    )
+
+    results: Dict[str, Any] = {}
+    for name in scenarios:
+        rss_start = _rss_mb()
+        if args.trace_allocations:
+            tracemalloc.start()
+        results[name] = BENCHES[name](args, workdir)
+        if args.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[name]["alloc_peak_mb"] = round(peak / 1e6, 2)
+            results[name]["alloc_retained_mb"] = round(current / 1e6, 2)
+        rss_end = _rss_mb()
+        if rss_end is not None:
+            results[name]["rss_end_mb"] = rss_end
+            results[name]["rss_growth_mb"] = round(rss_end - rss_start, 1)
+        results[name]["process_peak_rss_mb"] = _peak_rss_mb()
+
+    report = json.dumps(results, indent=2)
+    print(report)
+
+    if args.output:
+        (repo_backend / args.output).write_text(report)
+    if args.save_baseline:
+        (repo_backend / args.save_baseline).write_text(report)
+        print(f"Baseline saved to {args.save_baseline}", file=sys.stderr)
+
+    if args.baseline:
+        baseline = json.loads((repo_backend / args.baseline).read_text())
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("PERFORMANCE REGRESSIONS:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            return 1
+        print("No regressions against baseline.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
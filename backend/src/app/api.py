@@ -2,41 +2,87 @@
 Main API Entry Point Module (Secure & Multi-Tenant)
 """
 from pathlib import Path
-import shutil
+import base64
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
 import jwt
-from jwt import PyJWKClient
+from jwt import PyJWKClient, PyJWKSet
 from contextlib import asynccontextmanager
+from functools import lru_cache
 
-from fastapi import FastAPI, File, HTTPException, Request, UploadFile, status, Depends
+from typing import List, Optional
+
+from fastapi import FastAPI, File, Form, HTTPException, Query, Request, UploadFile, status, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from .models import QuestionRequest, QAResponse, FileListResponse, DeleteFilesRequest
-from .services.qa_service import answer_question
+from .models import (
+    QuestionRequest, QAResponse, FileListResponse, DeleteFilesRequest, SetCollectionRequest, ChunkListResponse,
+)
+from .services.qa_service import answer_question, invalidate_answers, build_qa_payload
 from .services.indexing_service import index_pdf_file
 from .core.config import get_settings, current_user_id
+from .core.metrics import HTTP_REQUEST_SECONDS, render_metrics
+from .core.profiling import list_profiles, profile_file, save_profile, start_profile, stop_profile
+from .core.llm.scheduler import LLMOverloadedError
+from .core.admission import AdmissionRejected, get_admission_controller
+from .core.agents.checkpointing import setup_checkpoint_schema
+from .core.warmup import shutdown, warm_up
+from .core.cache import cache_get, cache_set
 
-from .core.retrieval.vector_store import delete_user_vectors, delete_specific_vectors
-from .core.db import init_db, save_file_metadata, get_user_files, delete_user_file_metadata, delete_specific_user_files
+from .core.deletion import arequest_clear, arequest_delete, get_deletion_worker, purge_source, source_path
+from .core.embedding_migration import get_embedding_migrator
+from .core.retrieval.vector_store import fetch_chunks
+from .core.retrieval.routing import invalidate_document_profiles
+from .core.retrieval.scopes import ScopeError, invalidate_scopes, resolve_scope
+from .core.db import init_db
+from .core import db_async
 
 try:
     from openai import RateLimitError as OpenAIRateLimitError  
 except Exception:
     OpenAIRateLimitError = None  
 
-# Run startup events (like creating our Neon tables)
+# Startup: schema migrations belong to `python -m src.app.cli migrate`; workers only
+# warm their lazy singletons so the first request doesn't pay for them
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_db()
+    s = get_settings()
+    if s.migrate_on_startup:
+        init_db()
+        setup_checkpoint_schema(s.database_url)
+    if s.warm_up_on_startup:
+        extra = {"jwks": _prefetch_jwks} if s.clerk_issuer_url else {}
+        warm_up(extra)
+    if s.deletion_worker_enabled:
+        get_deletion_worker().start()
+    if s.embedding_migration_enabled:
+        get_embedding_migrator().start()
     yield
+    # Close pools and clients so worker restarts don't leak DB connections
+    await db_async.close_pool()
+    shutdown()
 
-app = FastAPI(title="IntelliRAG Multi-Tenant API", version="1.0.0", lifespan=lifespan)
+# orjson serializes the large QA payloads several times faster than the stdlib encoder
+app = FastAPI(
+    title="IntelliRAG Multi-Tenant API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 settings = get_settings()
+if settings.response_gzip_min_bytes:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.response_gzip_min_bytes)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[settings.frontend_origin],
@@ -47,6 +93,110 @@ app.add_middleware(
 
 security = HTTPBearer()
 
+# -----------------------------
+# LLM back-pressure
+# -----------------------------
+
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError):
+    # Shed by our own scheduler: the queue wait would have exceeded the deadline
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "The assistant is at capacity. Please retry shortly."},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many questions in progress. Please retry shortly.", "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+if OpenAIRateLimitError is not None:
+    @app.exception_handler(OpenAIRateLimitError)
+    async def llm_rate_limited_handler(request: Request, exc: Exception):
+        # The provider kept returning 429 after every scheduled retry
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"detail": "Upstream model rate limit reached. Please retry shortly."},
+            headers={"Retry-After": "5"},
+        )
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (e.g. "/my-files"), not raw path, to keep cardinality bounded
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        route=getattr(route, "path", "unmatched"),
+        method=request.method,
+        status=response.status_code,
+    )
+    return response
+
+def _is_admin(request: Request) -> bool:
+    """
+    ADMIN_KEY (X-Admin-Key header) gate for operator endpoints. Closed when ADMIN_KEY
+    is unset: metrics expose traffic, error and LLM cost figures, profiles hold stack
+    frames and request timelines, and X-Profile adds sampling overhead any caller
+    could otherwise trigger.
+    """
+    s = get_settings()
+    return bool(s.admin_key) and _admin_key_matches(request, s.admin_key)
+
+def _admin_key_matches(request: Request, admin_key: str) -> bool:
+    # Constant-time comparison: the key must not leak through response timing
+    supplied = request.headers.get("x-admin-key", "")
+    return hmac.compare_digest(supplied.encode("utf-8"), admin_key.encode("utf-8"))
+
+# FEATURE: Opt-in request profiling. Registered last, so it wraps the latency
+# middleware and saving the profile is not counted as request time
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    requested = request.headers.get("x-profile") == "1" and _is_admin(request)
+    profile = start_profile(request.url.path, requested=requested)
+    if profile is None:
+        return await call_next(request)
+
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Profile-Id"] = profile.id
+        return response
+    finally:
+        stop_profile(profile, status_code)
+        await run_in_threadpool(save_profile, profile)
+
+class SharedJWKClient(PyJWKClient):
+    """PyJWKClient whose fetched JWKS document is shared with the other workers."""
+
+    def fetch_data(self):
+        data = super().fetch_data()
+        cache_set("jwks", self.uri, json.dumps(data).encode("utf-8"), ttl=get_settings().jwks_cache_ttl)
+        return data
+
+    def get_jwk_set(self, refresh: bool = False) -> PyJWKSet:
+        # A forced refresh (unknown `kid` after key rotation) always goes to Clerk
+        if not refresh and (self.jwk_set_cache is None or self.jwk_set_cache.get() is None):
+            shared = cache_get("jwks", self.uri)
+            if shared is not None:
+                return PyJWKSet.from_dict(json.loads(shared))
+        return super().get_jwk_set(refresh=refresh)
+
+@lru_cache(maxsize=8)
+def _get_jwks_client(issuer: str) -> PyJWKClient:
+    # PyJWKClient caches the signing keys, so reuse one per issuer instead of
+    # downloading the JWKS document on every request
+    return SharedJWKClient(f"{issuer}/.well-known/jwks.json")
+
+def _prefetch_jwks() -> None:
+    _get_jwks_client(get_settings().clerk_issuer_url).get_signing_keys()
+
 def verify_clerk_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     """
     Middleware: Intercepts the JWT token, verifies the cryptographic signature against
@@ -62,7 +212,7 @@ def verify_clerk_token(credentials: HTTPAuthorizationCredentials = Depends(secur
         if s.clerk_issuer_url and issuer != s.clerk_issuer_url:
             raise ValueError("Token issuer mismatch. Unauthorized instance.")
 
-        jwks_client = PyJWKClient(f"{issuer}/.well-known/jwks.json")
+        jwks_client = _get_jwks_client(issuer)
         signing_key = jwks_client.get_signing_key_from_jwt(token)
   
         data = jwt.decode(
@@ -98,83 +248,171 @@ async def qa_endpoint(payload: QuestionRequest, user_id: str = Depends(verify_cl
     current_user_id.set(user_id)
     thread_id = payload.thread_id or f"session-{user_id}"
 
-    result = answer_question(
-        question=question, 
-        thread_id=thread_id, 
-        document_scope=payload.document_scope
-    )
+    # Resolve files and collection to document IDs once, before any work is queued
+    scope = payload.document_scope
+    filenames = [scope] if isinstance(scope, str) else scope
+    try:
+        document_scope = await run_in_threadpool(resolve_scope, user_id, filenames, payload.collection)
+    except ScopeError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
-    return QAResponse(
-        answer=result.get("answer", ""),
-        context=result.get("context", ""),
-        plan=result.get("plan"),
-        sub_questions=result.get("sub_questions"),
-        citations=result.get("citations"),
-        retrieval_traces=result.get("retrieval_traces"),
-        raw_context=result.get("raw_context"),
-        context_rationale=result.get("context_rationale"),
-        confidence=result.get("confidence", "low"),
-        thread_id=thread_id
-    )
+    # Admission control bounds per-user and global concurrency; the graph itself is
+    # synchronous, so it runs in the threadpool instead of blocking the event loop
+    async with get_admission_controller().slot(user_id, payload.priority):
+        result = await run_in_threadpool(
+            answer_question,
+            question=question,
+            thread_id=thread_id,
+            document_scope=document_scope,
+            include_timings=payload.include_timings,
+        )
+
+    # Project to the requested fields and serialize with orjson directly, skipping a
+    # redundant pydantic validation pass over the (potentially large) payload
+    body = build_qa_payload(result, thread_id, verbosity=payload.verbosity, fields=payload.fields)
+    return ORJSONResponse(body)
+
+# Upper bound on chunk IDs per /chunks request
+MAX_CHUNKS_PER_REQUEST = 50
+
+@app.get("/chunks", response_model=ChunkListResponse)
+async def get_chunks(ids: List[str] = Query(...), user_id: str = Depends(verify_clerk_token)):
+    """Full text for cited chunks (citations carry only a `vector_id` and snippet by default)."""
+    if len(ids) > MAX_CHUNKS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CHUNKS_PER_REQUEST} ids per request.")
+
+    current_user_id.set(user_id)
+    # Tenant-checked: chunks belonging to other users are silently dropped
+    fetched = await run_in_threadpool(fetch_chunks, ids)
+    return {
+        "chunks": [
+            {
+                "vector_id": doc.id,
+                "chunk_id": doc.metadata.get("chunk_id"),
+                "text": doc.page_content,
+                "source": doc.metadata.get("source"),
+                "page": doc.metadata.get("page"),
+                "page_label": doc.metadata.get("page_label"),
+            }
+            for doc, _ in fetched
+        ]
+    }
 
 @app.post("/index-pdf", status_code=status.HTTP_200_OK)
-async def index_pdf(file: UploadFile = File(...), user_id: str = Depends(verify_clerk_token)) -> dict:
+async def index_pdf(
+    file: UploadFile = File(...),
+    collection: Optional[str] = Form(None),
+    user_id: str = Depends(verify_clerk_token),
+) -> dict:
     if file.content_type not in ("application/pdf",):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
     current_user_id.set(user_id)
 
-    upload_dir = Path(f"data/uploads/{user_id}")
-    upload_dir.mkdir(parents=True, exist_ok=True)
-
-    file_path = upload_dir / file.filename
+    # The name becomes a path on disk (and the vectors' `source`); keep it in the user's directory
+    try:
+        file_path = Path(source_path(user_id, file.filename or ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    # A pending delete of the same file must finish before the new copy lands
+    await run_in_threadpool(purge_source, user_id, str(file_path))
     contents = await file.read()
     file_path.write_bytes(contents)
 
     try:
-        chunks_indexed = index_pdf_file(file_path)
-        # FEATURE: Save file metadata to Neon DB upon successful ingestion
-        save_file_metadata(user_id, file.filename, str(file_path))
+        # The ID is stamped on every vector, so it must exist before indexing
+        doc_id = await db_async.allocate_document_id(user_id, file.filename)
+        # Parsing and embedding are synchronous; keep them off the event loop
+        indexed = await run_in_threadpool(index_pdf_file, file_path, doc_id=doc_id)
+        chunks_indexed = indexed["chunks_indexed"]
+        # FEATURE: Save file metadata (and its routing profile) to Neon DB upon successful ingestion
+        await db_async.save_file_metadata(
+            user_id,
+            file.filename,
+            str(file_path),
+            indexed["summary"],
+            indexed["centroid"],
+            file_size=len(contents),
+            page_count=indexed["page_count"],
+            chunk_count=chunks_indexed,
+            content_hash=hashlib.sha256(contents).hexdigest(),
+            doc_id=doc_id,
+            collection=collection or None,
+            embedding_namespace=indexed["embedding_namespace"] or "",
+            next_centroid=indexed["next_centroid"],
+        )
+        invalidate_document_profiles(user_id)
+        invalidate_scopes(user_id)
+        invalidate_answers(user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Indexing failed: {str(e)}")
 
     return {
         "filename": file.filename,
         "chunks_indexed": chunks_indexed,
+        # 1-based page numbers left out of the index (image-only pages would need OCR)
+        "skipped_pages": indexed["skipped_pages"],
         "message": "PDF isolated, indexed, and secured successfully.",
     }
 
+MAX_FILES_PAGE_SIZE = 200
+
+def _encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["upload_timestamp"].isoformat(), row["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
 @app.get("/my-files", response_model=FileListResponse, status_code=status.HTTP_200_OK)
-async def list_my_files(user_id: str = Depends(verify_clerk_token)):
-    """Fetches a list of files that belong only to the authenticated user."""
-    files = get_user_files(user_id)
-    return {"files": files}
+async def list_my_files(
+    limit: int = Query(50, ge=1, le=MAX_FILES_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="`next_cursor` from the previous page."),
+    prefix: Optional[str] = Query(None, description="Only files whose name starts with this."),
+    user_id: str = Depends(verify_clerk_token),
+):
+    """Fetches one page of the authenticated user's files, newest first."""
+    after = _decode_cursor(cursor) if cursor else None
+    # One extra row tells us whether another page exists without a COUNT(*)
+    rows = await db_async.get_user_files(user_id, limit + 1, after, prefix)
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {"files": rows[:limit], "next_cursor": next_cursor}
+
+@app.put("/my-files/collection", status_code=status.HTTP_200_OK)
+async def set_files_collection(payload: SetCollectionRequest, user_id: str = Depends(verify_clerk_token)) -> dict:
+    """Moves files into a collection, or out of their collection when `collection` is null."""
+    if not payload.filenames:
+        return {"updated_count": 0}
+
+    updated = await db_async.set_collection(user_id, payload.filenames, payload.collection or None)
+    invalidate_scopes(user_id)
+    # Cached answers were computed under the old collection membership
+    invalidate_answers(user_id)
+    return {"updated_count": updated}
 
 @app.delete("/my-files", status_code=status.HTTP_200_OK)
 async def delete_selected_files(payload: DeleteFilesRequest, user_id: str = Depends(verify_clerk_token)) -> dict:
-    """Deletes specific files from disk, Neon, and Pinecone based on user selection."""
-    current_user_id.set(user_id)
+    """
+    Deletes specific files. The files disappear from listings and retrieval at once;
+    their vectors and bytes on disk are removed by the background deletion worker.
+    """
     filenames = payload.filenames
     
     if not filenames:
         return {"message": "No files selected.", "deleted_count": 0}
 
-    # 1. Delete from Server Disk
-    deleted_count = 0
-    upload_dir = Path(f"data/uploads/{user_id}")
-    
-    if upload_dir.exists():
-        for fname in filenames:
-            file_path = upload_dir / fname
-            if file_path.exists() and file_path.is_file():
-                file_path.unlink(missing_ok=True)
-                deleted_count += 1
-
-    # 2. Delete vectors from Pinecone
-    delete_specific_vectors(filenames)
-
-    # 3. Delete metadata from Neon Postgres
-    delete_specific_user_files(user_id, filenames)
+    try:
+        deleted_count = await arequest_delete(user_id, filenames)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    invalidate_document_profiles(user_id)
+    invalidate_scopes(user_id)
+    invalidate_answers(user_id)
 
     return {
         "message": f"Successfully deleted {deleted_count} file(s).",
@@ -183,24 +421,44 @@ async def delete_selected_files(payload: DeleteFilesRequest, user_id: str = Depe
 
 @app.delete("/admin/clear", status_code=status.HTTP_200_OK)
 async def admin_clear_all(user_id: str = Depends(verify_clerk_token)) -> dict:
-    current_user_id.set(user_id)
-    upload_dir = Path(f"data/uploads/{user_id}")
-    deleted_files = 0
-
-    if upload_dir.exists() and upload_dir.is_dir():
-        for p in upload_dir.glob("*"):
-            if p.is_file():
-                p.unlink(missing_ok=True)
-                deleted_files += 1
-        shutil.rmtree(upload_dir, ignore_errors=True)
-
-    delete_user_vectors()
-    
-    # Clean up the SQL Database entries as well
-    delete_user_file_metadata(user_id)
+    deleted_files = await arequest_clear(user_id)
+    invalidate_document_profiles(user_id)
+    invalidate_scopes(user_id)
+    invalidate_answers(user_id)
 
     return {
         "message": "Your private documents and vector index have been cleared.",
         "deleted_files": deleted_files,
     }
-    
\ No newline at end of file
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Prometheus scrape endpoint. Needs ADMIN_KEY to be configured (X-Admin-Key header)."""
+    if not _is_admin(request):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden.")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/profiles")
+async def list_profiles_endpoint(request: Request, limit: int = Query(50, ge=1, le=500)) -> dict:
+    """Recent request profiles, newest first. Needs ADMIN_KEY to be configured."""
+    if not _is_admin(request):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden.")
+    return {"profiles": await run_in_threadpool(list_profiles, limit)}
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile_endpoint(
+    profile_id: str,
+    request: Request,
+    format: str = Query("speedscope", pattern="^(speedscope|folded)$"),
+) -> FileResponse:
+    """
+    One stored profile: a speedscope file (open at https://www.speedscope.app) or
+    folded stacks for flamegraph.pl. Needs ADMIN_KEY to be configured.
+    """
+    if not _is_admin(request):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden.")
+    path = profile_file(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    media_type = "application/json" if format == "speedscope" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=path.name)
@@ -0,0 +1,196 @@
+"""
+Operations Command-Line Module
+
+One-off maintenance commands that should not run inside the web workers.
+Run from the `backend` directory, e.g.:
+
+    python -m src.app.cli migrate
+    python -m src.app.cli reconcile-deletions
+    python -m src.app.cli backfill-doc-ids
+    python -m src.app.cli export-tenant --user-id user_123 --out snapshots/user_123
+    python -m src.app.cli import-tenant --snapshot snapshots/user_123
+    python -m src.app.cli migrate-embeddings
+    python -m src.app.cli reproject-embeddings --dimensions 512 --target-index intellirag-512
+"""
+import argparse
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def _cmd_migrate(args: argparse.Namespace) -> None:
+    from .core.agents.checkpointing import setup_checkpoint_schema
+    from .core.config import get_settings
+    from .core.db import init_db
+
+    init_db()
+    setup_checkpoint_schema(get_settings().database_url)
+    print("Database schema is up to date.")
+
+
+def _cmd_reproject_embeddings(args: argparse.Namespace) -> None:
+    from .core.config import get_settings
+    from .core.db import register_embedding_namespace
+    from .core.retrieval.embedding_spaces import DEFAULT_NAMESPACE
+    from .core.retrieval.vector_store import reproject_vectors
+
+    migrated = reproject_vectors(args.dimensions, target_index=args.target_index, batch_size=args.batch_size)
+    # The default namespace now holds vectors of the new dimension
+    model = get_settings().openai_embedding_model_name
+    register_embedding_namespace(DEFAULT_NAMESPACE, f"{model}@{args.dimensions}", replace=True)
+    print(f"Re-projected {migrated} vector(s) to {args.dimensions} dimensions.")
+
+
+def _cmd_migrate_embeddings(args: argparse.Namespace) -> None:
+    from .core.config import get_settings
+    from .core.embedding_migration import plan_migrations, process_next
+    from .core.llm.scheduler import TokenBucket
+
+    planned = plan_migrations()
+    bucket = TokenBucket(args.chunks_per_minute or get_settings().embedding_migration_chunks_per_minute)
+    switched = chunks = 0
+    while (report := process_next(bucket)) is not None:
+        if "error" in report:
+            print(f"{report['user_id']}: {report['error']}")
+            continue
+        chunks += report["chunks"]
+        switched += report["switched"]
+    print(f"Planned {planned} tenant(s); re-embedded {chunks} chunk(s); switched {switched} tenant(s).")
+
+
+def _cmd_prune_checkpoints(args: argparse.Namespace) -> None:
+    from .core.agents.checkpointing import prune_checkpoints
+    from .core.config import get_settings
+
+    settings = get_settings()
+    deleted = prune_checkpoints(
+        settings.database_url,
+        ttl_days=args.ttl_days if args.ttl_days is not None else settings.checkpoint_ttl_days,
+        keep_last=args.keep_last if args.keep_last is not None else settings.checkpoint_keep_last,
+    )
+    print(", ".join(f"{table}: {count} deleted" for table, count in deleted.items()))
+
+
+def _cmd_reconcile_deletions(args: argparse.Namespace) -> None:
+    from .core.deletion import process_pending, reconcile
+
+    def drain() -> int:
+        processed = 0
+        while batch := process_pending():
+            processed += batch
+        return processed
+
+    processed = drain()
+    report = reconcile()
+    # Orphans found by the sweep were just tombstoned; clean them up in the same run
+    processed += drain()
+    print(f"Processed {processed} tombstone(s); " + ", ".join(f"{k}: {v}" for k, v in report.items()))
+
+
+def _cmd_backfill_doc_ids(args: argparse.Namespace) -> None:
+    from .core.db import get_all_documents
+    from .core.retrieval.vector_store import backfill_doc_ids
+
+    documents = get_all_documents()
+    updated = backfill_doc_ids(documents)
+    print(f"Stamped doc_id on {updated} vector(s) across {len(documents)} document(s).")
+
+
+def _cmd_export_tenant(args: argparse.Namespace) -> None:
+    from .core.retrieval.snapshot import export_tenant
+
+    report = export_tenant(args.user_id, args.out, include_files=args.include_files)
+    print(f"Exported to {args.out}: " + ", ".join(f"{k}: {v}" for k, v in report.items()))
+
+
+def _cmd_import_tenant(args: argparse.Namespace) -> None:
+    from .core.retrieval.snapshot import import_tenant, read_manifest
+    from .services.qa_service import invalidate_answers
+
+    user_id = args.user_id or read_manifest(args.snapshot)["user_id"]
+    report = import_tenant(
+        args.snapshot, user_id=user_id, workers=args.workers, batch_size=args.batch_size, force=args.force
+    )
+    if report["imported"]:
+        invalidate_answers(user_id)
+    print(", ".join(f"{k}: {v}" for k, v in report.items()))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="intellirag", description="IntelliRAG maintenance commands.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    migrate = sub.add_parser(
+        "migrate",
+        help="Create/upgrade the user_files and LangGraph checkpoint tables (run once per deploy).",
+    )
+    migrate.set_defaults(func=_cmd_migrate)
+
+    reproject = sub.add_parser(
+        "reproject-embeddings",
+        help="Truncate stored vectors to a smaller Matryoshka dimension.",
+    )
+    reproject.add_argument("--dimensions", type=int, required=True)
+    reproject.add_argument("--target-index", default=None, help="Pinecone index created with the new dimension.")
+    reproject.add_argument("--batch-size", type=int, default=100)
+    reproject.set_defaults(func=_cmd_reproject_embeddings)
+
+    migrate_embeddings = sub.add_parser(
+        "migrate-embeddings",
+        help="Move every tenant to the configured embedding version now (the API workers do it in the background).",
+    )
+    migrate_embeddings.add_argument("--chunks-per-minute", type=int, default=None)
+    migrate_embeddings.set_defaults(func=_cmd_migrate_embeddings)
+
+    prune = sub.add_parser(
+        "prune-checkpoints",
+        help="Apply the conversation checkpoint retention policy (TTL + keep-last).",
+    )
+    prune.add_argument("--ttl-days", type=int, default=None)
+    prune.add_argument("--keep-last", type=int, default=None)
+    prune.set_defaults(func=_cmd_prune_checkpoints)
+
+    reconcile = sub.add_parser(
+        "reconcile-deletions",
+        help="Drain the delete queue and sweep orphaned files/vectors into it.",
+    )
+    reconcile.set_defaults(func=_cmd_reconcile_deletions)
+
+    backfill = sub.add_parser(
+        "backfill-doc-ids",
+        help="Stamp integer document IDs on vectors indexed before document scopes existed.",
+    )
+    backfill.set_defaults(func=_cmd_backfill_doc_ids)
+
+    export = sub.add_parser(
+        "export-tenant",
+        help="Write a user's vectors, chunk texts and file metadata to a snapshot directory.",
+    )
+    export.add_argument("--user-id", required=True)
+    export.add_argument("--out", required=True)
+    export.add_argument("--include-files", action="store_true", help="Copy the uploaded PDFs too.")
+    export.set_defaults(func=_cmd_export_tenant)
+
+    load = sub.add_parser(
+        "import-tenant",
+        help="Bulk-load a snapshot into the configured index (re-embeds only on a model change).",
+    )
+    load.add_argument("--snapshot", required=True)
+    load.add_argument("--user-id", default=None, help="Import under another user (default: the snapshot's).")
+    load.add_argument("--workers", type=int, default=8)
+    load.add_argument("--batch-size", type=int, default=100)
+    load.add_argument(
+        "--force", action="store_true", help="Also re-import documents whose content hash is unchanged."
+    )
+    load.set_defaults(func=_cmd_import_tenant)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
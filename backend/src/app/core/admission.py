@@ -0,0 +1,222 @@
+"""
+Admission Control Module
+
+Every `/qa` call fans out into 5+N LLM calls and holds a worker thread for its
+whole duration. Without limits, one tenant firing questions in parallel can take
+every thread and every LLM scheduler slot, and everyone's tail latency collapses.
+
+`AdmissionController` sits in front of `answer_question` (one per worker process):
+
+- Global and per-user in-flight limits.
+- A bounded wait queue with a deadline; a request that cannot start in time (or
+  arrives to a full queue) is rejected with `AdmissionRejected`, which the API maps
+  to 429 + Retry-After.
+- Priority lanes: "interactive" requests are always dispatched before "bulk" ones,
+  and bulk work may only occupy `qa_bulk_max_in_flight` of the slots.
+- Per-user queue caps, and dispatch that skips over users already at their
+  in-flight limit, so a noisy neighbor's backlog never blocks other tenants.
+
+The controller runs on the worker's event loop and is not thread-safe.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator, Deque, Dict
+
+from .config import get_settings
+from .metrics import Counter, Gauge, Histogram, register
+
+LANES = ("interactive", "bulk")  # dispatch order
+
+QA_IN_FLIGHT = register(Gauge("intellirag_qa_in_flight", "QA requests currently executing, by lane."))
+QA_QUEUE_DEPTH = register(Gauge("intellirag_qa_queue_depth", "QA requests waiting for admission, by lane."))
+QA_QUEUE_WAIT_SECONDS = register(Histogram(
+    "intellirag_qa_queue_wait_seconds",
+    "Time QA requests waited for admission, by lane and outcome.",
+))
+QA_REJECTED = register(Counter("intellirag_qa_rejected_total", "QA requests rejected by admission control, by reason."))
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a request cannot be admitted; `retry_after` is a hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(f"Request rejected by admission control ({reason}).")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("user_id", "lane", "future")
+
+    def __init__(self, user_id: str, lane: str, future: asyncio.Future) -> None:
+        self.user_id, self.lane, self.future = user_id, lane, future
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_in_flight: int,
+        per_user_max_in_flight: int,
+        per_user_max_queued: int,
+        bulk_max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.per_user_max_in_flight = per_user_max_in_flight
+        self.per_user_max_queued = per_user_max_queued
+        self.bulk_max_in_flight = bulk_max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._in_flight: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._user_in_flight: Dict[str, int] = {}
+        self._user_queued: Dict[str, int] = {}
+        self._queues: Dict[str, Deque[_Waiter]] = {lane: deque() for lane in LANES}
+        # Moving average of request service time, used for Retry-After hints
+        self._service_ewma = 5.0
+
+    # ------------------------------------------------------------------
+    # Bookkeeping
+    # ------------------------------------------------------------------
+
+    def _total_in_flight(self) -> int:
+        return sum(self._in_flight.values())
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _eligible(self, user_id: str, lane: str) -> bool:
+        if self._total_in_flight() >= self.max_in_flight:
+            return False
+        if lane == "bulk" and self._in_flight["bulk"] >= self.bulk_max_in_flight:
+            return False
+        return self._user_in_flight.get(user_id, 0) < self.per_user_max_in_flight
+
+    def _start(self, user_id: str, lane: str) -> None:
+        self._in_flight[lane] += 1
+        self._user_in_flight[user_id] = self._user_in_flight.get(user_id, 0) + 1
+        QA_IN_FLIGHT.set(self._in_flight[lane], lane=lane)
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        queue = self._queues[waiter.lane]
+        if waiter in queue:
+            queue.remove(waiter)
+            remaining = self._user_queued.get(waiter.user_id, 1) - 1
+            if remaining:
+                self._user_queued[waiter.user_id] = remaining
+            else:
+                self._user_queued.pop(waiter.user_id, None)
+            QA_QUEUE_DEPTH.set(len(queue), lane=waiter.lane)
+
+    def _dispatch(self) -> None:
+        """Admits queued requests in lane priority order, skipping users at their limit."""
+        for lane in LANES:
+            for waiter in list(self._queues[lane]):
+                if self._total_in_flight() >= self.max_in_flight:
+                    return
+                if waiter.future.done() or not self._eligible(waiter.user_id, lane):
+                    continue
+                self._dequeue(waiter)
+                self._start(waiter.user_id, lane)
+                waiter.future.set_result(True)
+
+    def _retry_after(self) -> int:
+        backlog = self._queued() / max(1, self.max_in_flight) + 1
+        return max(1, math.ceil(self._service_ewma * backlog))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        QA_REJECTED.inc(reason=reason)
+        return AdmissionRejected(reason, self._retry_after())
+
+    def release(self, user_id: str, lane: str, service_seconds: float) -> None:
+        self._in_flight[lane] -= 1
+        remaining = self._user_in_flight.get(user_id, 1) - 1
+        if remaining:
+            self._user_in_flight[user_id] = remaining
+        else:
+            self._user_in_flight.pop(user_id, None)
+        QA_IN_FLIGHT.set(self._in_flight[lane], lane=lane)
+        self._service_ewma = 0.8 * self._service_ewma + 0.2 * service_seconds
+        self._dispatch()
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+
+    async def acquire(self, user_id: str, lane: str) -> None:
+        if lane not in self._queues:
+            raise ValueError(f"Unknown priority lane: {lane}")
+
+        # Fast path: free capacity and nobody from this lane is waiting ahead of us
+        if not self._queues[lane] and self._eligible(user_id, lane) and (
+            lane == "interactive" or not self._queues["interactive"]
+        ):
+            self._start(user_id, lane)
+            QA_QUEUE_WAIT_SECONDS.observe(0.0, lane=lane, outcome="admitted")
+            return
+
+        if self._queued() >= self.max_queue:
+            raise self._reject("queue_full")
+        if self._user_queued.get(user_id, 0) >= self.per_user_max_queued:
+            raise self._reject("user_queue_full")
+
+        waiter = _Waiter(user_id, lane, asyncio.get_running_loop().create_future())
+        self._queues[lane].append(waiter)
+        self._user_queued[user_id] = self._user_queued.get(user_id, 0) + 1
+        QA_QUEUE_DEPTH.set(len(self._queues[lane]), lane=lane)
+        # The waiters ahead of us may all be blocked by their own per-user limits;
+        # dispatching now admits us into a free slot instead of waiting for a release
+        self._dispatch()
+
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._dequeue(waiter)
+            if waiter.future.done():
+                # Admitted in the same tick the deadline fired; honor the admission
+                QA_QUEUE_WAIT_SECONDS.observe(time.monotonic() - start, lane=lane, outcome="admitted")
+                return
+            waiter.future.cancel()
+            QA_QUEUE_WAIT_SECONDS.observe(time.monotonic() - start, lane=lane, outcome="timeout")
+            raise self._reject("queue_timeout")
+        except asyncio.CancelledError:
+            # Client went away while queued; give the slot back if we had just been admitted
+            self._dequeue(waiter)
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(user_id, lane, 0.0)
+            else:
+                waiter.future.cancel()
+            raise
+
+        QA_QUEUE_WAIT_SECONDS.observe(time.monotonic() - start, lane=lane, outcome="admitted")
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, lane: str = "interactive") -> AsyncIterator[None]:
+        await self.acquire(user_id, lane)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(user_id, lane, time.monotonic() - start)
+
+
+@lru_cache(maxsize=1)
+def get_admission_controller() -> AdmissionController:
+    settings = get_settings()
+    return AdmissionController(
+        max_in_flight=settings.qa_max_in_flight,
+        per_user_max_in_flight=settings.qa_per_user_max_in_flight,
+        per_user_max_queued=settings.qa_per_user_max_queued,
+        bulk_max_in_flight=settings.qa_bulk_max_in_flight,
+        max_queue=settings.qa_max_queue,
+        queue_timeout=settings.qa_queue_timeout,
+    )
@@ -5,13 +5,18 @@ from __future__ import annotations
 
 import re
 
-from typing import Any, Dict, List
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
 
-from langchain.agents import create_agent
 from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 
+from ..config import get_settings
 from ..llm.factory import create_chat_model
+from ..retrieval.serialization import serialize_chunks_with_ids
+from ..retrieval.vector_store import embed_queries, expand_to_parents
+from ..retrieval.working_set import load_working_set, rerank_working_set, update_working_set
 from .prompts import (
+    SHARED_CONTEXT_SYSTEM_PROMPT,
     RETRIEVAL_SYSTEM_PROMPT,
     SUMMARIZATION_SYSTEM_PROMPT,
     VERIFICATION_SYSTEM_PROMPT,
@@ -19,7 +24,7 @@ from .prompts import (
     CONTEXT_CRITIC_SYSTEM_PROMPT # <-- Imported new prompt
 )
 from .state import QAState
-from .tools import retrieval_tool
+from .tools import RETRIEVAL_TOP_N, retrieval_tool, retrieve_with_citations
 
 
 def _extract_last_ai_content(messages: List[object]) -> str:
@@ -28,40 +33,72 @@ def _extract_last_ai_content(messages: List[object]) -> str:
             return str(msg.content)
     return ""
 
+
+def _context_messages(question: str, context: str, instructions: str, extra: str = "") -> List[HumanMessage]:
+    """
+    Builds the cache-friendly message layout shared by the context-heavy agents.
+
+    The first message (Question + CONTEXT) is byte-identical for every agent that
+    sees the same context in a turn, so together with the shared system prompt it
+    forms a stable prefix eligible for provider-side prompt caching. Only the
+    trailing message (role instructions + any per-agent payload) differs.
+    """
+    shared = f"Question:\n{question}\n\nCONTEXT:\n{context}"
+    tail = f"{instructions}\n\n{extra}".strip() if extra else instructions
+    return [HumanMessage(content=shared), HumanMessage(content=tail)]
+
 # ==============================================================================
 # Agent Initialization
 # ==============================================================================
+# Agents are built on first use and memoized, so importing this module stays cheap
+# (no LangChain agent graphs or model clients at import time). `warm_up()` builds
+# them ahead of the first request.
 
-retrieval_agent = create_agent(
-    model=create_chat_model(),
-    tools=[retrieval_tool],
-    system_prompt=RETRIEVAL_SYSTEM_PROMPT,
-)
+def _build_agent(tools: List[Any], system_prompt: str) -> Any:
+    from langchain.agents import create_agent
+
+    return create_agent(model=create_chat_model(), tools=tools, system_prompt=system_prompt)
+
+
+@lru_cache(maxsize=1)
+def get_retrieval_agent() -> Any:
+    return _build_agent([retrieval_tool], RETRIEVAL_SYSTEM_PROMPT)
+
+
+# The three context-heavy agents share one system prompt; their role prompts are
+# sent after the CONTEXT block (see `_context_messages`) to keep a cacheable prefix.
 
 # FEATURE 3: Initialize the Critic Agent
-context_critic_agent = create_agent(
-    model=create_chat_model(),
-    tools=[], # The critic just thinks, it doesn't search
-    system_prompt=CONTEXT_CRITIC_SYSTEM_PROMPT,
-)
+@lru_cache(maxsize=1)
+def get_context_critic_agent() -> Any:
+    return _build_agent([], SHARED_CONTEXT_SYSTEM_PROMPT)  # The critic just thinks, it doesn't search
 
-summarization_agent = create_agent(
-    model=create_chat_model(),
-    tools=[],
-    system_prompt=SUMMARIZATION_SYSTEM_PROMPT,
-)
 
-verification_agent = create_agent(
-    model=create_chat_model(),
-    tools=[],
-    system_prompt=VERIFICATION_SYSTEM_PROMPT,
-)
+@lru_cache(maxsize=1)
+def get_summarization_agent() -> Any:
+    return _build_agent([], SHARED_CONTEXT_SYSTEM_PROMPT)
 
-planning_agent = create_agent(
-    model=create_chat_model(),
-    tools=[], 
-    system_prompt=PLANNING_SYSTEM_PROMPT,
-)
+
+@lru_cache(maxsize=1)
+def get_verification_agent() -> Any:
+    return _build_agent([], SHARED_CONTEXT_SYSTEM_PROMPT)
+
+
+@lru_cache(maxsize=1)
+def get_planning_agent() -> Any:
+    return _build_agent([], PLANNING_SYSTEM_PROMPT)
+
+
+def build_agents() -> None:
+    """Eagerly constructs every agent (used by the startup warm-up)."""
+    for getter in (
+        get_planning_agent,
+        get_retrieval_agent,
+        get_context_critic_agent,
+        get_summarization_agent,
+        get_verification_agent,
+    ):
+        getter()
 
 # ==============================================================================
 # Graph Nodes
@@ -69,7 +106,14 @@ planning_agent = create_agent(
 
 def planning_node(state: QAState) -> QAState:
     question = state["question"]
-    result = planning_agent.invoke({"messages": [HumanMessage(content=question)]})
+    previous_question = state.get("previous_question")
+
+    # Give the planner the previous turn so it can resolve follow-ups ("and section 4?")
+    planner_input = (
+        f"Previous question:\n{previous_question}\n\nQuestion:\n{question}"
+        if previous_question else question
+    )
+    result = get_planning_agent().invoke({"messages": [HumanMessage(content=planner_input)]})
     raw_output = _extract_last_ai_content(result.get("messages", []))
     
     plan_match = re.search(r"PLAN:(.*?)QUESTIONS:", raw_output, re.DOTALL | re.IGNORECASE)
@@ -77,41 +121,161 @@ def planning_node(state: QAState) -> QAState:
     
     plan = plan_match.group(1).strip() if plan_match else "General search"
     sub_questions = questions_match if questions_match else [question]
-    return {**state, "plan": plan, "sub_questions": sub_questions}
+    # Only this node's keys: it shares a superstep with the speculative branch
+    return {"plan": plan, "sub_questions": sub_questions}
+
+
+def speculative_retrieval_node(state: QAState) -> Dict[str, Any]:
+    """
+    FEATURE: Speculative Retrieval
+    The raw question is usually the best first query, so it is searched in parallel
+    with planning instead of after it. The matched chunks' vectors are loaded too,
+    so `retrieval_node` can tell which sub-questions these results already cover.
+    """
+    try:
+        content, citations = retrieve_with_citations(state["question"], state.get("document_scope"))
+        load_working_set([meta.get("vector_id") for meta in citations.values() if meta.get("vector_id")])
+    except Exception:
+        # Speculation is an optimization; the regular retrieval path still runs
+        return {"speculative_context": None, "speculative_citations": None}
+    return {"speculative_context": content, "speculative_citations": citations}
+
+
+def _load_scoped_working_set(state: QAState) -> List[Tuple[Any, Any]]:
+    """Resolves the thread's working set, restricted to the active document scope."""
+    ids = state.get("working_set") or []
+    if not ids:
+        return []
+    try:
+        chunks = load_working_set(ids)
+    except Exception:
+        # The working set is an optimization; never fail a turn because of it
+        return []
+
+    document_scope = state.get("document_scope")
+    if document_scope:
+        allowed = set(document_scope)
+        chunks = [(doc, vec) for doc, vec in chunks if doc.metadata.get("doc_id") in allowed]
+    return chunks
+
+
+def _is_relevant(meta: Dict[str, Any], settings: Any) -> bool:
+    # Unscored chunks (working-set hits, MMR results) already passed their own bar
+    score = meta.get("score")
+    return score is None or score >= settings.min_evidence_score
+
+
+def has_sufficient_evidence(state: QAState) -> bool:
+    """True when at least one retrieved chunk clears the relevance threshold."""
+    settings = get_settings()
+    citations = state.get("citations") or {}
+    return any(_is_relevant(meta or {}, settings) for meta in citations.values())
+
+
+def _covers(query_vector: Any, chunks: List[Tuple[Any, Any]], settings: Any) -> bool:
+    """True when enough already-retrieved chunks score well against the query."""
+    if not chunks:
+        return False
+    hits = rerank_working_set(query_vector, chunks, settings.working_set_min_score, RETRIEVAL_TOP_N)
+    return len(hits) >= settings.working_set_min_hits
 
 
 def retrieval_node(state: QAState) -> QAState:
+    settings = get_settings()
     queries = state.get("sub_questions") or [state["question"]]
     all_context = []
     combined_citations = {}
     traces = [] 
 
-    for i, query in enumerate(queries):
-        result = retrieval_agent.invoke({"messages": [HumanMessage(content=query)]})
-        messages = result.get("messages", []) or []
-        tool_msgs = [m for m in messages if isinstance(m, ToolMessage)]
-
-        if tool_msgs:
+    # FEATURE: Conversation Working Set
+    # Re-rank follow-ups against chunks this thread already used before paying for
+    # a retrieval agent call and a vector search.
+    working_chunks = _load_scoped_working_set(state)
+
+    # Results of the speculative branch come first; sub-questions they already
+    # answer skip their own retrieval round trip
+    speculative = state.get("speculative_citations") or {}
+    speculative_chunks: List[Tuple[Any, Any]] = []
+    if speculative:
+        all_context.append(
+            f"=== RETRIEVAL CALL 0 (query: '{state['question']}') ===\n{state.get('speculative_context') or ''}"
+        )
+        combined_citations.update(speculative)
+        traces.append({
+            "call_number": 0,
+            "query": state["question"],
+            "chunks_count": len(speculative),
+            "sources": list({meta.get("source", "unknown") for meta in speculative.values()}),
+            "origin": "speculative",
+        })
+        try:
+            speculative_chunks = load_working_set([meta.get("vector_id") for meta in speculative.values()])
+        except Exception:
+            speculative_chunks = []
+
+    needs_vectors = working_chunks or speculative_chunks
+    query_vectors = embed_queries(queries) if needs_vectors else [None] * len(queries)
+
+    for i, (query, query_vector) in enumerate(zip(queries, query_vectors)):
+        covered = speculative and (
+            query.strip() == state["question"].strip()
+            or _covers(query_vector, speculative_chunks, settings)
+        )
+        if covered:
+            traces.append({
+                "call_number": i + 1,
+                "query": query,
+                "chunks_count": 0,
+                "sources": [],
+                "origin": "covered_by_speculative",
+            })
+            continue
+
+        hits = (
+            rerank_working_set(query_vector, working_chunks, settings.working_set_min_score, RETRIEVAL_TOP_N)
+            if working_chunks else []
+        )
+
+        if len(hits) >= settings.working_set_min_hits:
+            content, artifact = serialize_chunks_with_ids(expand_to_parents(hits))
+            origin = "working_set"
+        else:
+            result = get_retrieval_agent().invoke({"messages": [HumanMessage(content=query)]})
+            messages = result.get("messages", []) or []
+            tool_msgs = [m for m in messages if isinstance(m, ToolMessage)]
+            if not tool_msgs:
+                continue
             last_tool = tool_msgs[-1]
-            artifact = getattr(last_tool, "artifact", {})
-            structured_block = f"=== RETRIEVAL CALL {i+1} (query: '{query}') ===\n{last_tool.content}"
-            all_context.append(structured_block)
-            
-            if isinstance(artifact, dict):
-                combined_citations.update(artifact)
-                sources = list(set([meta.get("source", "unknown") for meta in artifact.values()]))
-                traces.append({
-                    "call_number": i + 1,
-                    "query": query,
-                    "chunks_count": len(artifact),
-                    "sources": sources
-                })
+            content, artifact = last_tool.content, getattr(last_tool, "artifact", {})
+            origin = "vector_store"
+
+        structured_block = f"=== RETRIEVAL CALL {i+1} (query: '{query}') ===\n{content}"
+        all_context.append(structured_block)
+        
+        if isinstance(artifact, dict):
+            combined_citations.update(artifact)
+            sources = list(set([meta.get("source", "unknown") for meta in artifact.values()]))
+            traces.append({
+                "call_number": i + 1,
+                "query": query,
+                "chunks_count": len(artifact),
+                "sources": sources,
+                "origin": origin,
+            })
+
+    # Low-score hits are not worth carrying into follow-up turns
+    working_set = update_working_set(
+        state.get("working_set") or [],
+        [meta.get("vector_id") for meta in combined_citations.values() if _is_relevant(meta, settings)],
+        settings.working_set_size,
+    )
 
     return {
         **state, 
         "context": "\n\n".join(all_context), 
         "citations": combined_citations,
-        "retrieval_traces": traces
+        "retrieval_traces": traces,
+        "working_set": working_set,
     }
 
 def context_critic_node(state: QAState) -> QAState:
@@ -127,9 +291,9 @@ def context_critic_node(state: QAState) -> QAState:
     if not raw_context.strip():
         return {**state, "raw_context": raw_context, "context_rationale": "No context retrieved."}
 
-    user_content = f"Question:\n{question}\n\nCONTEXT:\n{raw_context}"
+    messages = _context_messages(question, raw_context, CONTEXT_CRITIC_SYSTEM_PROMPT)
     
-    result = context_critic_agent.invoke({"messages": [HumanMessage(content=user_content)]})
+    result = get_context_critic_agent().invoke({"messages": messages})
     critic_output = _extract_last_ai_content(result.get("messages", []) or [])
 
     # Use Regex to safely extract the RATIONALE and the FILTERED_CONTEXT blocks
@@ -159,34 +323,57 @@ def summarization_node(state: QAState) -> QAState:
     question = state["question"]
     context = state.get("context") or ""
 
-    user_content = (
-        f"Question:\n{question}\n\n"
-        f"CONTEXT:\n{context}\n"
-    )
+    messages = _context_messages(question, context, SUMMARIZATION_SYSTEM_PROMPT)
 
-    result = summarization_agent.invoke({"messages": [HumanMessage(content=user_content)]})
+    result = get_summarization_agent().invoke({"messages": messages})
     draft_answer = _extract_last_ai_content(result.get("messages", []) or [])
 
     return {**state, "draft_answer": draft_answer}
 
 
+INSUFFICIENT_EVIDENCE_ANSWER = (
+    "I couldn't find information in your documents that answers this question. "
+    "Try rephrasing it, or upload a document that covers this topic."
+)
+
+
+def insufficient_evidence_node(state: QAState) -> QAState:
+    """
+    FEATURE: Early Exit
+    Deterministic terminal node for questions the corpus cannot answer. Skips the
+    critic, summarization and verification LLM calls entirely.
+    """
+    settings = get_settings()
+    scores = [m.get("score") for m in (state.get("citations") or {}).values() if m and m.get("score") is not None]
+    rationale = (
+        f"No retrieved chunk reached the relevance threshold "
+        f"(best score {max(scores):.3f} < {settings.min_evidence_score})."
+        if scores else "No context retrieved."
+    )
+    return {
+        **state,
+        "raw_context": state.get("context"),
+        "context": "",
+        "citations": {},
+        "context_rationale": rationale,
+        "draft_answer": None,
+        "answer": INSUFFICIENT_EVIDENCE_ANSWER,
+        "confidence": "low",
+        "previous_question": state["question"],
+    }
+
+
 def verification_node(state: QAState) -> QAState:
     question = state["question"]
     context = state.get("context") or ""
     draft_answer = state.get("draft_answer") or ""
 
-    user_content = f"""
-Question:
-{question}
-
-CONTEXT:
-{context}
-
-Draft Answer:
-{draft_answer}
-""".strip()
+    messages = _context_messages(
+        question, context, VERIFICATION_SYSTEM_PROMPT, extra=f"Draft Answer:\n{draft_answer}"
+    )
 
-    result = verification_agent.invoke({"messages": [HumanMessage(content=user_content)]})
+    result = get_verification_agent().invoke({"messages": messages})
     answer = _extract_last_ai_content(result.get("messages", []) or [])
 
-    return {**state, "answer": answer}
+    # End of turn: remember this question for the next turn's planner
+    return {**state, "answer": answer, "previous_question": question}
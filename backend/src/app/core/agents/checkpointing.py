@@ -0,0 +1,156 @@
+"""
+Checkpoint Policy Module
+
+LangGraph's PostgresSaver persists the full `QAState` for every checkpoint. For
+this pipeline that means the retrieved CONTEXT (twice, filtered and raw), the
+draft answer, and every citation with its full chunk text, for every turn of a
+thread that never ends (`session-{user_id}`).
+
+This module keeps the conversational memory while shrinking its footprint:
+
+1. `CompactPostgresSaver` strips bulky fields before they are written. Citations
+   are persisted by reference (chunk ID plus page/source), never with their text.
+2. `prune_checkpoints` enforces a retention policy: only the last N checkpoints of
+   each thread are kept, and threads idle for longer than the TTL are removed.
+3. `setup_checkpoint_schema` runs LangGraph's checkpoint migrations. It is invoked
+   by the `migrate` command, never on the request path.
+
+Writing only at turn boundaries is handled by invoking the graph with
+`durability="exit"` (see `graph.run_qa_flow`).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict
+
+import psycopg
+from psycopg.rows import dict_row
+from langgraph.checkpoint.postgres import PostgresSaver
+
+from ..db import MIGRATION_LOCK_ID
+
+# Large per-turn strings that are recomputed every turn and never read back from memory
+BULKY_STATE_FIELDS = ("context", "raw_context", "draft_answer", "speculative_context", "speculative_citations")
+
+# The citation keys kept in persisted state; everything else is fetchable by chunk ID
+CITATION_REFERENCE_KEYS = ("source", "page", "page_label")
+
+
+def compact_state_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns a copy of the channel values with bulky fields removed or referenced."""
+    compacted = dict(values)
+
+    for field in BULKY_STATE_FIELDS:
+        if compacted.get(field):
+            compacted[field] = None
+
+    citations = compacted.get("citations")
+    if isinstance(citations, dict):
+        compacted["citations"] = {
+            chunk_id: {key: (meta or {}).get(key) for key in CITATION_REFERENCE_KEYS}
+            for chunk_id, meta in citations.items()
+        }
+
+    return compacted
+
+
+class CompactPostgresSaver(PostgresSaver):
+    """A PostgresSaver that persists a compacted view of the graph state."""
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        compacted = {**checkpoint, "channel_values": compact_state_values(checkpoint["channel_values"])}
+        return super().put(config, compacted, metadata, new_versions)
+
+
+def setup_checkpoint_schema(database_url: str) -> None:
+    """Creates/migrates the LangGraph checkpoint tables over a one-off connection."""
+    # Autocommit is required: the migrations use CREATE INDEX CONCURRENTLY
+    with psycopg.connect(database_url, autocommit=True, prepare_threshold=0, row_factory=dict_row) as conn:
+        # Session-level lock: concurrent workers must not apply the same migration twice
+        conn.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID + 1,))
+        try:
+            PostgresSaver(conn).setup()
+        finally:
+            conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID + 1,))
+
+
+def prune_checkpoints(database_url: str, ttl_days: int | None = None, keep_last: int | None = None) -> Dict[str, int]:
+    """
+    Applies the checkpoint retention policy.
+
+    Args:
+        database_url (str): The Postgres connection string holding the checkpoint tables.
+        ttl_days (int | None): Delete whole threads whose newest checkpoint is older than this.
+        keep_last (int | None): Keep only the newest N checkpoints of every thread.
+
+    Returns:
+        Dict[str, int]: Row counts deleted per table.
+    """
+    deleted = {"checkpoints": 0, "checkpoint_writes": 0, "checkpoint_blobs": 0}
+
+    with psycopg.connect(database_url) as conn:
+        with conn.cursor() as cur:
+            if ttl_days:
+                cur.execute(
+                    """
+                    DELETE FROM checkpoints
+                    WHERE thread_id IN (
+                        SELECT thread_id FROM checkpoints
+                        GROUP BY thread_id
+                        HAVING MAX((checkpoint->>'ts')::timestamptz) < NOW() - make_interval(days => %s)
+                    )
+                    """,
+                    (ttl_days,),
+                )
+                deleted["checkpoints"] += cur.rowcount
+
+            if keep_last:
+                # Checkpoint IDs are time-ordered UUIDv6, so ordering by ID orders by time
+                cur.execute(
+                    """
+                    DELETE FROM checkpoints c
+                    USING (
+                        SELECT thread_id, checkpoint_ns, checkpoint_id,
+                               ROW_NUMBER() OVER (
+                                   PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                               ) AS rn
+                        FROM checkpoints
+                    ) ranked
+                    WHERE c.thread_id = ranked.thread_id
+                      AND c.checkpoint_ns = ranked.checkpoint_ns
+                      AND c.checkpoint_id = ranked.checkpoint_id
+                      AND ranked.rn > %s
+                    """,
+                    (keep_last,),
+                )
+                deleted["checkpoints"] += cur.rowcount
+
+            # Sweep pending writes and channel blobs no longer referenced by any checkpoint
+            cur.execute(
+                """
+                DELETE FROM checkpoint_writes w
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM checkpoints c
+                    WHERE c.thread_id = w.thread_id
+                      AND c.checkpoint_ns = w.checkpoint_ns
+                      AND c.checkpoint_id = w.checkpoint_id
+                )
+                """
+            )
+            deleted["checkpoint_writes"] = cur.rowcount
+
+            cur.execute(
+                """
+                DELETE FROM checkpoint_blobs b
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM checkpoints c
+                    WHERE c.thread_id = b.thread_id
+                      AND c.checkpoint_ns = b.checkpoint_ns
+                      AND c.checkpoint->'channel_versions'->>b.channel = b.version
+                )
+                """
+            )
+            deleted["checkpoint_blobs"] = cur.rowcount
+        conn.commit()
+
+    return deleted
@@ -0,0 +1,154 @@
+"""
+Citation Post-Processing Module
+
+The verified answer is cleaned before it is returned:
+
+1. Citations that do not match a retrieved chunk are dropped (hallucinated IDs),
+   and the whitespace they leave behind is collapsed.
+2. Within each sentence, citations are de-duplicated, capped at
+   `max_per_sentence`, and moved to the end of the sentence.
+3. A confidence label is derived from how many distinct valid chunks are cited.
+
+`CitationProcessor` does all three in a single left-to-right pass over one
+tokenization of the text. It accepts the answer incrementally (`feed`) so it can
+sit on a streaming token output: each call returns the sentences that are complete
+so far, and `finish` flushes the rest. `process_citations` is the one-shot form.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Iterable, List, Set, Tuple
+
+# A citation, a whitespace run, or any other run of text (a lone "[" is text)
+_TOKEN_RE = re.compile(r"(\[[^\[\]\n]{1,40}\])|(\s+)|([^\s\[]+|\[)")
+
+# The longest possible citation token: "[" + 40 chars + "]"
+_MAX_CITATION_LEN = 42
+
+_SENTENCE_END = ".!?"
+
+
+class CitationProcessor:
+    """Single-pass citation validator, per-sentence de-duplicator and confidence scorer."""
+
+    def __init__(self, allowed_ids: Iterable[str], max_per_sentence: int = 2) -> None:
+        self.allowed_ids: Set[str] = set(allowed_ids)
+        self.max_per_sentence = max_per_sentence
+
+        self._buffer = ""           # unconsumed input (possible partial citation / whitespace)
+        self._pending_ws = ""       # whitespace seen since the last kept token
+        self._last_char = ""        # last character of the cleaned text, citations included
+        self._sentence: List[str] = []
+        self._sentence_ids: List[str] = []
+        self._cited: Set[str] = set()
+        self._emitted_any = False
+
+    # ------------------------------------------------------------------
+    # Streaming interface
+    # ------------------------------------------------------------------
+
+    def feed(self, text: str) -> str:
+        """Consumes more answer text; returns the newly completed, cleaned sentences."""
+        self._buffer += text
+        safe = self._safe_length(self._buffer)
+        ready, self._buffer = self._buffer[:safe], self._buffer[safe:]
+        return self._consume(ready)
+
+    def finish(self) -> Tuple[str, str]:
+        """Flushes the remaining text. Returns (remaining cleaned text, confidence)."""
+        out = self._consume(self._buffer)
+        self._buffer = ""
+        out += self._close_sentence()
+        return out, self.confidence
+
+    @property
+    def confidence(self) -> str:
+        if len(self._cited) >= 3:
+            return "high"
+        if self._cited:
+            return "medium"
+        return "low"
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _safe_length(buffer: str) -> int:
+        """Length of the prefix that can be tokenized without seeing more input."""
+        end = len(buffer)
+        # A trailing "[..." may still become a citation
+        bracket = buffer.rfind("[", max(0, end - _MAX_CITATION_LEN))
+        if bracket != -1 and not any(c in "]\n" for c in buffer[bracket + 1:]):
+            end = bracket
+        # A trailing whitespace run may still grow (and turn into a sentence break)
+        while end and buffer[end - 1].isspace():
+            end -= 1
+        return end
+
+    def _consume(self, text: str) -> str:
+        out: List[str] = []
+        for citation, space, word in _TOKEN_RE.findall(text):
+            if space:
+                self._pending_ws += space
+                continue
+
+            if citation:
+                cid = citation[1:-1]
+                if cid not in self.allowed_ids:
+                    # Dropped: whitespace on both sides merges into one run
+                    continue
+
+            if self._pending_ws:
+                if self._last_char in _SENTENCE_END:
+                    out.append(self._close_sentence())
+                elif self._sentence:
+                    # Runs of 2+ whitespace characters collapse to a single space
+                    self._sentence.append(" " if len(self._pending_ws) > 1 else self._pending_ws)
+                self._pending_ws = ""
+
+            if citation:
+                if cid not in self._sentence_ids:
+                    self._sentence_ids.append(cid)
+                # The citation is removed from the sentence text, but its neighbors stay
+                self._sentence.append("")
+                self._last_char = "]"
+            else:
+                self._sentence.append(word)
+                self._last_char = word[-1]
+        return "".join(out)
+
+    def _close_sentence(self) -> str:
+        if not self._sentence:
+            return ""
+        text = "".join(self._sentence)
+        if self._sentence_ids:
+            kept = self._sentence_ids[: self.max_per_sentence]
+            self._cited.update(kept)
+            text = (text.rstrip() + " " + "".join(f"[{cid}]" for cid in kept)).strip()
+
+        self._sentence, self._sentence_ids = [], []
+        if not text:
+            return ""
+        prefix = " " if self._emitted_any else ""
+        self._emitted_any = True
+        return prefix + text
+
+
+def process_citations(answer: str, allowed_ids: Iterable[str], max_per_sentence: int = 2) -> Tuple[str, str]:
+    """
+    Cleans a complete answer in one pass.
+
+    Returns:
+        Tuple[str, str]: The cleaned answer and its confidence ("high", "medium", "low").
+    """
+    allowed = set(allowed_ids)
+    answer = (answer or "").strip()
+    if not allowed or not answer:
+        return answer, "low"
+
+    processor = CitationProcessor(allowed, max_per_sentence=max_per_sentence)
+    head = processor.feed(answer)
+    tail, confidence = processor.finish()
+    return head + tail, confidence
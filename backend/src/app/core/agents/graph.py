@@ -4,8 +4,7 @@ LangGraph Orchestrator Module (PostgreSQL Memory Edition)
 from __future__ import annotations
 
 from functools import lru_cache
-from typing import Any
-import re
+from typing import Any, Dict, List
 import os
 
 from psycopg_pool import ConnectionPool
@@ -14,67 +13,22 @@ from langgraph.constants import END, START
 from langgraph.graph import StateGraph
 from langgraph.checkpoint.postgres import PostgresSaver
 
+from .checkpointing import CompactPostgresSaver
+from .citations import process_citations
 from .agents import (
     planning_node, 
+    speculative_retrieval_node,
     retrieval_node, 
     context_critic_node, 
     summarization_node, 
-    verification_node
+    verification_node,
+    insufficient_evidence_node,
+    has_sufficient_evidence,
 )
 from .state import QAState
-from ..config import get_settings
-
-_CITATION_RE = re.compile(r"\[([^\[\]\n]{1,40})\]")
-
-
-def _extract_citation_ids(text: str) -> list[str]:
-    return _CITATION_RE.findall(text or "")
-
-
-def _dedupe_and_limit_per_sentence(answer: str, max_per_sentence: int = 2) -> str:
-    answer = (answer or "").strip()
-    if not answer:
-        return answer
-    sentences = re.split(r"(?<=[.!?])\s+", answer)
-    cleaned: list[str] = []
-
-    for s in sentences:
-        ids = _extract_citation_ids(s)
-        if not ids:
-            cleaned.append(s)
-            continue
-        unique: list[str] = []
-        for cid in ids:
-            if cid not in unique:
-                unique.append(cid)
-            if len(unique) >= max_per_sentence:
-                break
-        s_no = _CITATION_RE.sub("", s).rstrip()
-        s_fixed = (s_no + " " + "".join(f"[{cid}]" for cid in unique)).strip()
-        cleaned.append(s_fixed)
-    return " ".join(cleaned).strip()
-
-
-def _remove_unknown_citations(answer: str, allowed_ids: set[str]) -> str:
-    if not answer:
-        return answer
-    def repl(m: re.Match[str]) -> str:
-        cid = m.group(1)
-        return f"[{cid}]" if cid in allowed_ids else ""
-
-    cleaned = _CITATION_RE.sub(repl, answer)
-    cleaned = re.sub(r"\s{2,}", " ", cleaned).strip()
-    return cleaned
-
-
-def _compute_confidence(answer: str, allowed_ids: set[str]) -> str:
-    ids = [cid for cid in _extract_citation_ids(answer) if cid in allowed_ids]
-    unique = set(ids)
-    if len(unique) >= 3:
-        return "high"
-    if len(unique) >= 1:
-        return "medium"
-    return "low"
+from ..config import current_document_scope, get_settings
+from ..metrics import instrument_node
+from ..retrieval.working_set import update_working_set
 
 
 @lru_cache(maxsize=1)
@@ -82,38 +36,64 @@ def get_postgres_saver() -> PostgresSaver:
     """
     Singleton factory for the PostgresSaver.
     We create a connection pool to Neon.tech and pass it to LangGraph.
+
+    The checkpoint schema is NOT created here; run `python -m src.app.cli migrate`
+    once per deploy (see `checkpointing.setup_checkpoint_schema`).
     """
     settings = get_settings()
     
     # FIX: Added kwargs={"autocommit": True} right here 
     # This prevents the "CREATE INDEX CONCURRENTLY" transaction error!
+    # Sized per worker so N workers together stay under the database's connection limit
     pool = ConnectionPool(
         conninfo=settings.database_url, 
-        max_size=10, 
+        min_size=1,
+        max_size=settings.db_pool_size, 
         kwargs={"autocommit": True}, 
         open=False
     )
     pool.open()
     
-    saver = PostgresSaver(pool)
-    saver.setup() 
-    return saver
+    # Persist a compacted state (no context blobs, citations by reference)
+    return CompactPostgresSaver(pool)
+
+def _route_after_retrieval(state: QAState) -> str:
+    return "context_critic" if has_sufficient_evidence(state) else "insufficient_evidence"
+
 
 def create_qa_graph() -> Any:
     builder = StateGraph(QAState)
 
-    builder.add_node("planning", planning_node) 
-    builder.add_node("retrieval", retrieval_node)
-    builder.add_node("context_critic", context_critic_node)
-    builder.add_node("summarization", summarization_node)
-    builder.add_node("verification", verification_node)
+    # Every node is wrapped so its wall time and LLM usage are attributed to it
+    builder.add_node("planning", instrument_node("planning", planning_node))
+    builder.add_node("retrieval", instrument_node("retrieval", retrieval_node))
+    builder.add_node("context_critic", instrument_node("context_critic", context_critic_node))
+    builder.add_node("summarization", instrument_node("summarization", summarization_node))
+    builder.add_node("verification", instrument_node("verification", verification_node))
+    builder.add_node(
+        "insufficient_evidence", instrument_node("insufficient_evidence", insufficient_evidence_node)
+    )
 
     builder.add_edge(START, "planning")
-    builder.add_edge("planning", "retrieval")
-    builder.add_edge("retrieval", "context_critic")
+    if get_settings().speculative_retrieval_enabled:
+        # Fan out: search for the raw question while the planner runs, join before retrieval
+        builder.add_node(
+            "speculative_retrieval", instrument_node("speculative_retrieval", speculative_retrieval_node)
+        )
+        builder.add_edge(START, "speculative_retrieval")
+        builder.add_edge(["planning", "speculative_retrieval"], "retrieval")
+    else:
+        builder.add_edge("planning", "retrieval")
+    # Early exit: no chunk above the relevance threshold means nothing to summarize
+    builder.add_conditional_edges(
+        "retrieval",
+        _route_after_retrieval,
+        {"context_critic": "context_critic", "insufficient_evidence": "insufficient_evidence"},
+    )
     builder.add_edge("context_critic", "summarization")
     builder.add_edge("summarization", "verification")
     builder.add_edge("verification", END)
+    builder.add_edge("insufficient_evidence", END)
 
     # We now fetch the PostgresSaver singleton instead of MemorySaver
     memory = get_postgres_saver()
@@ -125,9 +105,36 @@ def get_qa_graph() -> Any:
     return create_qa_graph()
 
 
-def run_qa_flow(question: str, thread_id: str, document_scope: str | None = None) -> QAState:
+def _thread_config(thread_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def thread_memory(thread_id: str) -> Dict[str, Any]:
+    """The conversation memory a new turn of the thread starts from (empty for a new thread)."""
+    values = get_qa_graph().get_state(_thread_config(thread_id)).values or {}
+    return {"previous_question": values.get("previous_question"), "working_set": values.get("working_set") or []}
+
+
+def record_turn(thread_id: str, question: str, result: Dict[str, Any]) -> None:
+    """
+    Advances the thread's memory for a turn answered without running the graph (an
+    answer cache hit), as the terminal node would have.
+    """
+    memory = thread_memory(thread_id)
+    cited = [meta.get("vector_id") for meta in (result.get("citations") or {}).values() if meta]
+    get_qa_graph().update_state(
+        _thread_config(thread_id),
+        {
+            "previous_question": question,
+            "working_set": update_working_set(memory["working_set"], cited, get_settings().working_set_size),
+        },
+        as_node="verification",
+    )
+
+
+def run_qa_flow(question: str, thread_id: str, document_scope: List[int] | None = None) -> QAState:
     graph = get_qa_graph()
-    config = {"configurable": {"thread_id": thread_id}}
+    config = _thread_config(thread_id)
 
     initial_state: QAState = {
         "question": question,
@@ -135,6 +142,8 @@ def run_qa_flow(question: str, thread_id: str, document_scope: str | None = None
         "sub_questions": [],
         "context": None,
         "citations": None,
+        "speculative_context": None,
+        "speculative_citations": None,
         "retrieval_traces": [],
         "raw_context": None, 
         "context_rationale": None,
@@ -144,18 +153,22 @@ def run_qa_flow(question: str, thread_id: str, document_scope: str | None = None
         "document_scope": document_scope,
     }
 
-    final_state: QAState = graph.invoke(initial_state, config=config)
+    # Every vector search in this turn (agent tool calls included) is held to the scope
+    token = current_document_scope.set(tuple(document_scope) if document_scope else None)
+    try:
+        # Checkpoint only at the turn boundary instead of after every node
+        final_state: QAState = graph.invoke(
+            initial_state, config=config, durability=get_settings().checkpoint_durability
+        )
+    finally:
+        current_document_scope.reset(token)
 
     citations_map = final_state.get("citations") or {}
-    allowed_ids = set(citations_map.keys())
 
-    answer = (final_state.get("answer") or "").strip()
-
-    if allowed_ids:
-        answer = _remove_unknown_citations(answer, allowed_ids)
-        answer = _dedupe_and_limit_per_sentence(answer, max_per_sentence=2)
-
-    confidence = _compute_confidence(answer, allowed_ids)
+    # One pass: drop unknown IDs, dedupe/cap per sentence, score confidence
+    answer, confidence = process_citations(
+        final_state.get("answer") or "", citations_map.keys(), max_per_sentence=2
+    )
 
     final_state["answer"] = answer
     final_state["confidence"] = confidence
@@ -5,8 +5,27 @@ This module centralizes the system prompts for the multi-agent RAG pipeline.
 These prompts utilize advanced structural constraints, zero-hallucination protocols,
 and strict formatting anchors to ensure deterministic behavior and seamless 
 regex parsing in the downstream Python orchestrator.
+
+Prompt caching note: the three context-heavy agents (Critic, Answer Writer, Auditor)
+share SHARED_CONTEXT_SYSTEM_PROMPT and receive the Question + CONTEXT block as their
+first message. Their role-specific prompts below are sent AFTER that block, so every
+call for a turn starts with a byte-identical prefix that the provider can cache.
 """
 
+# ==============================================================================
+# 0. Shared Context Prefix (Critic, Answer Writer, Auditor)
+# ==============================================================================
+SHARED_CONTEXT_SYSTEM_PROMPT = """
+<role>
+You are one stage of IntelliRAG's evidence pipeline. You will receive a User Question and a CONTEXT block of retrieved document chunks labeled with IDs (e.g., [P1-C123]), followed by the instructions for your specific stage.
+</role>
+
+<directives>
+1. Treat the CONTEXT as the only source of truth.
+2. Follow the stage instructions in the final message exactly, including their output format.
+</directives>
+""".strip()
+
 # ==============================================================================
 # 1. Retrieval Agent Prompt
 # ==============================================================================
@@ -137,4 +156,19 @@ QUESTIONS:
 - <Sub-question 1>
 - <Sub-question 2>
 </output_schema>
-""".strip()
\ No newline at end of file
+""".strip()
+
+# ==============================================================================
+# 6. Document Profile Prompt (Ingestion)
+# ==============================================================================
+DOCUMENT_SUMMARY_SYSTEM_PROMPT = """
+<role>
+You are the Librarian. You write a compact profile of a document so that a search router can decide whether the document is relevant to a question.
+</role>
+
+<directives>
+1. Write 2-4 plain sentences covering the document's subject, type (e.g., contract, manual, report), and the key entities, products, or time periods it covers.
+2. Prefer specific nouns and identifiers over generic descriptions.
+3. Do not use markdown, bullet points, or introductory filler.
+</directives>
+""".strip()
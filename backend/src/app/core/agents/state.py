@@ -13,7 +13,8 @@ class QAState(TypedDict):
     # 1. Input State
     # --------------------------------------------------------------------------
     question: str
-    document_scope: NotRequired[str | None]
+    # Resolved document IDs the question is restricted to (None: all of the user's documents)
+    document_scope: NotRequired[List[int] | None]
 
     # --------------------------------------------------------------------------
     # 2. Planning State
@@ -21,6 +22,12 @@ class QAState(TypedDict):
     plan: NotRequired[str | None]
     sub_questions: NotRequired[List[str]]
 
+    # --------------------------------------------------------------------------
+    # 2b. Speculative Retrieval (runs in parallel with planning)
+    # --------------------------------------------------------------------------
+    speculative_context: NotRequired[str | None]
+    speculative_citations: NotRequired[Dict[str, dict] | None]
+
     # --------------------------------------------------------------------------
     # 3. Retrieval State
     # --------------------------------------------------------------------------
@@ -38,7 +45,16 @@ class QAState(TypedDict):
     context_rationale: NotRequired[str | None]
 
     # --------------------------------------------------------------------------
-    # 5. Generation & Verification State
+    # 5. Conversation Memory (persisted across turns of a thread)
+    # --------------------------------------------------------------------------
+    # Vector IDs of recently cited chunks, most recent first
+    working_set: NotRequired[List[str]]
+
+    # The previous turn's question, used by the planner for coreference resolution
+    previous_question: NotRequired[str | None]
+
+    # --------------------------------------------------------------------------
+    # 6. Generation & Verification State
     # --------------------------------------------------------------------------
     draft_answer: str | None
     answer: str | None
@@ -12,14 +12,23 @@ context window efficiency and prevent the LLM from processing redundant informat
 
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from langchain_core.documents import Document
 from langchain_core.tools import tool
 
+from ..config import get_settings
+from ..metrics import NEAR_DUPLICATES
+from ..retrieval.minhash import diversify
 from ..retrieval.serialization import serialize_chunks_with_ids
-from ..retrieval.vector_store import retrieve
+from ..retrieval.vector_store import expand_to_parents, retrieve
 
+# Over-fetch strategy: Pull 12 documents from the database to ensure we have a rich 
+# pool of candidates, anticipating that some might be duplicates.
+RETRIEVAL_FETCH_K = 12
+# Truncation limit: Only pass the top 6 unique documents to the LLM to fit optimally 
+# within the context window and prevent "lost in the middle" syndrome.
+RETRIEVAL_TOP_N = 6
 
 def _doc_dedupe_key(doc: Document) -> str:
     """
@@ -80,7 +89,7 @@ def _dedupe_docs(docs: List[Document]) -> List[Document]:
 # while simultaneously passing a structured object (artifact - our citations map) 
 # invisibly to the LangGraph state for backend processing.
 @tool(response_format="content_and_artifact")
-def retrieval_tool(query: str, document_scope: Optional[str] = None):
+def retrieval_tool(query: str):
     """
     Retrieves and formats highly relevant document chunks from the vector store.
 
@@ -88,11 +97,12 @@ def retrieval_tool(query: str, document_scope: Optional[str] = None):
     language query into a vector search, sanitizes the results, and formats them 
     with citation IDs required by the Summarization Agent.
 
+    The document scope is not an argument: the one resolved for the question is
+    enforced by `retrieve` at the database level (a `doc_id` filter), so the LLM can
+    neither widen nor forget it.
+
     Args:
         query (str): The search query (either the main question or a decomposed sub-query).
-        document_scope (Optional[str]): If provided, enforces metadata filtering at the 
-            database level (e.g., {"source": {"$eq": document_scope}}). This guarantees 
-            the LLM only sees data from the currently active PDF.
 
     Returns:
         Tuple[str, dict]: 
@@ -100,24 +110,36 @@ def retrieval_tool(query: str, document_scope: Optional[str] = None):
             - artifact (dict): A mapping dictionary of chunk IDs to their metadata, 
               used later by the Verification Node and the UI.
     """
-    # Over-fetch strategy: Pull 12 documents from the database to ensure we have a rich 
-    # pool of candidates, anticipating that some might be duplicates.
-    fetch_k = 12
-    # Truncation limit: Only pass the top 6 unique documents to the LLM to fit optimally 
-    # within the context window and prevent "lost in the middle" syndrome.
-    top_n = 6
+    return retrieve_with_citations(query)
+
 
+def retrieve_with_citations(
+    query: str, document_scope: Optional[Sequence[int]] = None
+) -> Tuple[str, Dict[str, dict]]:
+    """The body of `retrieval_tool`, callable directly by graph nodes (no agent turn)."""
     # Execute the vector search (Pinecone similarity search)
-    docs = retrieve(query, k=fetch_k, document_scope=document_scope)
+    docs = retrieve(query, k=RETRIEVAL_FETCH_K, document_scope=document_scope)
 
     # Sanitize the result pool
     docs = _dedupe_docs(docs)
+
+    # Near-duplicates (repeated clauses, copies under another name) would otherwise
+    # take several top-N slots; MinHash signatures ride along in the metadata
+    settings = get_settings()
+    if settings.near_duplicate_suppression_enabled:
+        diverse = diversify(docs, settings.near_duplicate_query_threshold)
+        if len(diverse) < len(docs):
+            NEAR_DUPLICATES.inc(len(docs) - len(diverse), stage="query")
+        docs = diverse
+
+    # Swap matched child chunks for their parent sections (one per parent)
+    docs = expand_to_parents(docs)
     
     # Slice to strictly enforce our top_n token budget
-    docs = docs[:top_n]
+    docs = docs[:RETRIEVAL_TOP_N]
 
     # Convert the raw LangChain Document objects into our proprietary citation-aware format
     context, citations = serialize_chunks_with_ids(docs)
     
     # Return both the text for the LLM and the mapping dictionary for the StateGraph
-    return context, citations
\ No newline at end of file
+    return context, citations
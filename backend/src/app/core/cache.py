@@ -0,0 +1,230 @@
+"""
+Shared Cache Module
+
+Small key/value caches (query embeddings, answers, the Clerk JWKS document) are
+only effective if every worker can see them. Under gunicorn/uvicorn with N workers,
+a process-local dict gives each worker a cold, duplicated copy.
+
+`get_cache()` returns the backend selected by `CACHE_BACKEND`:
+
+- "memory" (default): a bounded, process-local LRU. Right for a single worker.
+- "shared": an SQLite database on a tmpfs path (`/dev/shm` by default), visible to
+  every worker on the host with no extra infrastructure.
+- "redis": any Redis-compatible server at `CACHE_URL` (requires the `redis` package).
+
+Values are bytes; callers serialize (JSON / raw float32) themselves. Counters
+(`incr`/`counter`) are kept apart from the bounded entries and are never evicted:
+they version other entries, and a counter that silently fell back to 0 would
+bring stale entries back.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Protocol, Tuple
+
+from .config import get_settings
+from .metrics import record_cache
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[bytes]: ...
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None: ...
+    def delete(self, key: str) -> None: ...
+    def incr(self, key: str) -> int: ...
+    def counter(self, key: str) -> int: ...
+    def close(self) -> None: ...
+
+
+class MemoryCache:
+    """Process-local LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        self._max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def close(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+
+
+class SharedMemoryCache:
+    """
+    Host-wide cache in an SQLite file, normally on tmpfs so it lives in RAM.
+
+    WAL mode lets every worker read concurrently; writes are short single-row
+    upserts. Size is bounded by evicting the oldest entries past `max_entries`;
+    counters live in their own table, outside that bound.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10_000) -> None:
+        self._path = path
+        self._max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, updated REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_updated ON cache (updated)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return bytes(value)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO cache (key, value, expires, updated) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+            "expires = excluded.expires, updated = excluded.updated",
+            (key, value, now + ttl if ttl else None, now),
+        )
+        self._writes += 1
+        if self._writes % 256 == 0:
+            conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                (self._max_entries,),
+            )
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        row = self._conn().execute(
+            "INSERT INTO counters (key, value) VALUES (?, 1) "
+            "ON CONFLICT (key) DO UPDATE SET value = value + 1 RETURNING value",
+            (key,),
+        ).fetchone()
+        return int(row[0])
+
+    def counter(self, key: str) -> int:
+        row = self._conn().execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RedisCache:
+    """Any Redis-compatible server (Redis, Valkey, KeyDB, Dragonfly)."""
+
+    def __init__(self, url: str, prefix: str = "intellirag:") -> None:
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("CACHE_BACKEND=redis requires the `redis` package.") from exc
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self._prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self._client.set(self._prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self._prefix + key)
+
+    def incr(self, key: str) -> int:
+        # No TTL: under the usual volatile-* eviction policies counters are never evicted
+        return int(self._client.incr(self._prefix + key))
+
+    def counter(self, key: str) -> int:
+        raw = self._client.get(self._prefix + key)
+        return int(raw) if raw else 0
+
+    def close(self) -> None:
+        self._client.close()
+
+
+@lru_cache(maxsize=1)
+def get_cache() -> CacheBackend:
+    settings = get_settings()
+    if settings.cache_backend == "shared":
+        return SharedMemoryCache(settings.shared_cache_path, max_entries=settings.cache_max_entries)
+    if settings.cache_backend == "redis":
+        if not settings.cache_url:
+            raise RuntimeError("CACHE_BACKEND=redis requires CACHE_URL.")
+        return RedisCache(settings.cache_url)
+    return MemoryCache(max_entries=settings.cache_max_entries)
+
+
+def cache_get(namespace: str, key: str) -> Optional[bytes]:
+    """Namespaced lookup that also feeds the cache hit/miss metrics."""
+    value = get_cache().get(f"{namespace}:{key}")
+    record_cache(namespace, hit=value is not None)
+    return value
+
+
+def cache_set(namespace: str, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+    get_cache().set(f"{namespace}:{key}", value, ttl)
+
+
+def close_cache() -> None:
+    if get_cache.cache_info().currsize:
+        get_cache().close()
+        get_cache.cache_clear()
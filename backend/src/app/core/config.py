@@ -8,21 +8,176 @@ from contextvars import ContextVar
 # ContextVars allow us to safely store the user_id for the duration of an HTTP request 
 # without having to rewrite every single Python function signature to accept a user_id parameter.
 current_user_id: ContextVar[str] = ContextVar("current_user_id", default="")
+# The question's resolved document scope (integer document IDs); None means the whole tenant
+current_document_scope: ContextVar[tuple | None] = ContextVar("current_document_scope", default=None)
 
 class Settings(BaseSettings):
     openai_api_key: str
     openai_model_name: str = "gpt-4o-mini"
     openai_embedding_model_name: str = "text-embedding-3-large"
+    # Matryoshka truncation (e.g. 256/512/1024). None keeps the model's native size.
+    openai_embedding_dimensions: int | None = None
     
     pinecone_api_key: str
     pinecone_index_name: str
+
+    # Vector backend: "pinecone" (default) or "local" for offline/air-gapped use
+    vector_backend: str = "pinecone"
+    local_vector_store_path: str = "data/vector_store"
+    # Local store compression: "none", "int8" (4x smaller) or "binary" (32x smaller)
+    local_vector_quantization: str = "int8"
+    local_vector_rescore_factor: int = 4
     
     # NEW: Used to verify that the Auth Token actually came from your Clerk application
     clerk_issuer_url: str | None = None
     database_url: str
     
+    # Conversation memory: "exit" checkpoints once per turn, "async"/"sync" after every node
+    checkpoint_durability: str = "exit"
+    checkpoint_ttl_days: int = 30
+    checkpoint_keep_last: int = 5
+
+    # USD per 1M tokens, used for the cost estimates in /metrics and `timings`
+    llm_prompt_price_per_million: float = 0.15
+    llm_cached_prompt_price_per_million: float = 0.075
+    llm_completion_price_per_million: float = 0.60
+
+    # Shared LLM client: quotas for the scheduler's token buckets, concurrency and shedding
+    llm_rpm_limit: int = 500
+    llm_tpm_limit: int = 200_000
+    llm_max_concurrency: int = 16
+    llm_max_connections: int = 32
+    llm_queue_timeout: float = 20.0
+    llm_max_retries: int = 4
+    llm_retry_base_delay: float = 0.5
+    llm_estimated_completion_tokens: int = 400
+
+    # /qa admission control (per worker): in-flight limits, bounded queue, bulk lane cap
+    qa_max_in_flight: int = 8
+    qa_per_user_max_in_flight: int = 2
+    qa_per_user_max_queued: int = 4
+    qa_bulk_max_in_flight: int = 2
+    qa_max_queue: int = 64
+    qa_queue_timeout: float = 15.0
+
     retrieval_k: int = 4
+    # Early exit: answer "not found" without the critic/summarizer/verifier when no
+    # retrieved chunk reaches this cosine similarity (0 only exits on empty retrieval)
+    min_evidence_score: float = 0.25
+    # Search for the raw question in parallel with planning (LangGraph fan-out)
+    speculative_retrieval_enabled: bool = True
+
+    # Parent-child chunking: children are embedded, parents are what the LLM reads.
+    # Chunk text lives in a local append-only store (shared volume for multi-host setups)
+    chunk_store_enabled: bool = True
+    chunk_store_path: str = "data/chunk_store"
+    chunk_store_compact_ratio: float = 0.5
+    parent_chunk_size: int = 1600
+    child_chunk_size: int = 400
+    child_chunk_overlap: int = 50
+
+    # Page triage before chunking: skip empty/scanned pages, strip running
+    # headers/footers and collapse near-duplicate pages
+    page_triage_enabled: bool = True
+    page_triage_min_chars: int = 16
+    page_triage_boilerplate_lines: int = 2
+    page_triage_boilerplate_min_pages: int = 4
+    page_triage_boilerplate_ratio: float = 0.5
+    page_triage_duplicate_threshold: float = 0.9
+
+    # MinHash near-duplicate suppression: chunks at or above the estimated Jaccard
+    # similarity are not embedded (within a document) or not returned (per query)
+    near_duplicate_suppression_enabled: bool = True
+    near_duplicate_ingest_threshold: float = 0.9
+    near_duplicate_query_threshold: float = 0.8
+
+    # Query-embedding micro-batching: concurrent queries share one API request once
+    # `embedding_max_in_flight` requests are already outstanding
+    embedding_batch_max_size: int = 64
+    embedding_max_in_flight: int = 4
+
+    # Conversation working set: answer follow-ups from recently cited chunks when they cover it
+    working_set_size: int = 24
+    working_set_min_score: float = 0.45
+    working_set_min_hits: int = 2
+
+    # Document routing: narrow each search to the top-M documents by centroid similarity
+    document_routing_enabled: bool = True
+    document_routing_top_m: int = 3
+    document_routing_cache_ttl: int = 60
+    # Document scopes: the per-user filename -> document ID catalogue is cached this long
+    document_scope_cache_ttl: int = 300
+    # Deployment: worker processes per host share the DB connection budget and LLM quotas
+    web_concurrency: int = 1
+    db_max_connections: int = 100
+    db_reserved_connections: int = 10
+    db_pool_max_size: int = 10
+    db_async_pool_max_size: int = 10
+    # Server-side prepared statements on the async pool; disable behind a
+    # transaction-mode PgBouncer that does not support them
+    db_prepare_statements: bool = True
+
+    # Caches for query embeddings, answers and JWKS: "memory" (per worker),
+    # "shared" (host-wide SQLite on tmpfs) or "redis" (any Redis-compatible URL)
+    cache_backend: str = "memory"
+    cache_url: str | None = None
+    shared_cache_path: str = "/dev/shm/intellirag-cache.sqlite"
+    cache_max_entries: int = 10_000
+    embedding_cache_ttl: int = 86_400
+    # Answers are reused for an identical first-turn question over an unchanged corpus;
+    # follow-ups depend on the thread's memory and always run the graph. 0 disables;
+    # ignored with the per-process "memory" backend when several workers run.
+    answer_cache_ttl: int = 0
+    jwks_cache_ttl: int = 300
+
+    # Deletion pipeline: tombstones are written in the request, cleanup runs in the background
+    deletion_worker_enabled: bool = True
+    deletion_batch_size: int = 100
+    deletion_poll_interval: float = 5.0
+    deletion_lease_seconds: float = 300.0
+    deletion_retry_base_delay: float = 5.0
+    deletion_retry_max_delay: float = 900.0
+    # Reconciler: orphan sweep cadence (0 = only via `cli reconcile-deletions`) and grace period
+    deletion_reconcile_interval: float = 3600.0
+    deletion_orphan_grace_seconds: float = 900.0
+    tombstone_retention_seconds: float = 86_400.0
+    tombstone_cache_ttl: int = 300
+
+    # Embedding versions: each (model, dimension) pair lives in its own vector namespace
+    # "model@dimension" of the vectors written before namespaces existed (default namespace);
+    # when unset, `migrate` records the version configured at that moment
+    legacy_embedding_version: str | None = None
+    embedding_namespace_cache_ttl: int = 30
+    # Background migrator moving tenants to the configured version
+    embedding_migration_enabled: bool = True
+    embedding_migration_poll_interval: float = 30.0
+    embedding_migration_plan_interval: float = 300.0
+    embedding_migration_batch_size: int = 256
+    embedding_migration_chunks_per_minute: int = 30_000
+    embedding_migration_documents_per_claim: int = 20
+    embedding_migration_lease_seconds: float = 600.0
+    # After a switch, short searches are topped up from the previous namespace this long
+    embedding_dual_read_seconds: float = 3_600.0
+
+    # Request profiling: wall-clock stacks and a stage timeline for /qa and /index-pdf,
+    # taken on `X-Profile: 1` or for a percentage of requests (see core.profiling)
+    profiling_enabled: bool = False
+    profiling_sample_percent: float = 0.0
+    profiling_interval_ms: float = 5.0
+    profiling_max_seconds: float = 120.0
+    profiling_max_concurrent: int = 2
+    profiling_path: str = "data/profiles"
+    profiling_keep_last: int = 200
+
+    # Startup: run the (idempotent, advisory-locked) schema migration in each worker.
+    # The deploy pipeline has no `migrate` step, so this stays on by default; turn it
+    # off where `python -m src.app.cli migrate` runs before the workers start
+    migrate_on_startup: bool = True
+    warm_up_on_startup: bool = True
+    # Gzip responses at least this large when the client accepts it (0 disables)
+    response_gzip_min_bytes: int = 2048
     frontend_origin: str = "http://localhost:3000"
+    # X-Admin-Key for /metrics and /admin/*; those endpoints answer 403 while it is unset
     admin_key: str | None = None
 
     model_config = SettingsConfigDict(
@@ -32,6 +187,41 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
+    def _db_pool_share(self, max_size: int) -> int:
+        # Each worker runs two pools (checkpoints, request-path metadata)
+        budget = max(1, self.db_max_connections - self.db_reserved_connections)
+        return max(1, min(max_size, budget // (2 * max(1, self.web_concurrency))))
+
+    @property
+    def db_pool_size(self) -> int:
+        """Per-worker pool size that keeps all workers within the database's connection limit."""
+        return self._db_pool_share(self.db_pool_max_size)
+
+    @property
+    def db_async_pool_size(self) -> int:
+        """Per-worker size of the async metadata pool used by the API routes."""
+        return self._db_pool_share(self.db_async_pool_max_size)
+
+    @property
+    def embedding_dimension(self) -> int:
+        """The vector size every index must match for the configured embedding model."""
+        if self.openai_embedding_dimensions:
+            return self.openai_embedding_dimensions
+        return NATIVE_EMBEDDING_DIMENSIONS.get(self.openai_embedding_model_name, 3072)
+
+    @property
+    def embedding_version(self) -> str:
+        """Names the vector space ("model@dimension"); vectors of different versions are not comparable."""
+        return f"{self.openai_embedding_model_name}@{self.embedding_dimension}"
+
+
+# Output size of each OpenAI embedding model when no `dimensions` truncation is requested
+NATIVE_EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+
 _settings: Settings | None = None
 
 def get_settings() -> Settings:
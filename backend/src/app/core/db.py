@@ -1,15 +1,25 @@
 """
 Database Helper Module for File Management
 """
+from contextlib import contextmanager
+from typing import Iterator
+
 import psycopg
 from psycopg.rows import dict_row
 from .config import get_settings
+from .metrics import instrumented
+
+# pg_advisory_lock key serializing schema migrations across workers and deploys
+MIGRATION_LOCK_ID = 7_242_100
 
+@instrumented("db.init_db")
 def init_db():
     """Creates the user_files table if it doesn't exist yet."""
     settings = get_settings()
     with psycopg.connect(settings.database_url) as conn:
         with conn.cursor() as cur:
+            # Workers booting together run this at once; released at commit
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_ID,))
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS user_files (
                     id SERIAL PRIMARY KEY,
@@ -19,50 +29,765 @@ def init_db():
                     upload_timestamp TIMESTAMPTZ DEFAULT NOW()
                 );
             """)
+            # Document profile used by the retrieval router (summary + embedding centroid)
+            cur.execute("ALTER TABLE user_files ADD COLUMN IF NOT EXISTS summary TEXT;")
+            cur.execute("ALTER TABLE user_files ADD COLUMN IF NOT EXISTS centroid BYTEA;")
+            # Ingest-time stats, so listings never touch disk or the vector store
+            cur.execute("ALTER TABLE user_files ADD COLUMN IF NOT EXISTS file_size BIGINT;")
+            cur.execute("ALTER TABLE user_files ADD COLUMN IF NOT EXISTS page_count INTEGER;")
+            cur.execute("ALTER TABLE user_files ADD COLUMN IF NOT EXISTS chunk_count INTEGER;")
+            cur.execute("ALTER TABLE user_files ADD COLUMN IF NOT EXISTS content_hash TEXT;")
+            # Folder-like label; a question can be scoped to every document in a collection
+            cur.execute("ALTER TABLE user_files ADD COLUMN IF NOT EXISTS collection TEXT;")
+            # Newest embedding namespace holding the document's vectors ('' is the default
+            # namespace); next_centroid is the routing profile in a pending target namespace
+            cur.execute(
+                "ALTER TABLE user_files ADD COLUMN IF NOT EXISTS embedding_namespace TEXT NOT NULL DEFAULT '';"
+            )
+            cur.execute("ALTER TABLE user_files ADD COLUMN IF NOT EXISTS next_centroid BYTEA;")
+            # One row per (user, filename): keep the newest of any duplicates from
+            # before the constraint existed, then enforce it
+            cur.execute("""
+                DELETE FROM user_files a USING user_files b
+                WHERE a.user_id = b.user_id AND a.filename = b.filename
+                  AND (a.upload_timestamp, a.id) < (b.upload_timestamp, b.id);
+            """)
+            # text_pattern_ops lets the same index serve `filename LIKE 'prefix%'`
+            cur.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS user_files_user_filename
+                ON user_files (user_id, filename text_pattern_ops);
+            """)
+            # Keyset pagination: newest first, id as the tie-breaker
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS user_files_user_uploaded
+                ON user_files (user_id, upload_timestamp DESC, id DESC);
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS user_files_user_collection
+                ON user_files (user_id, collection) WHERE collection IS NOT NULL;
+            """)
+            # Document IDs reserved per (user, filename) before indexing, so concurrent
+            # uploads of the same new file stamp their vectors with the same ID. Kept
+            # after a delete: a later upload of the same name reuses the ID.
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS document_ids (
+                    user_id TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, filename)
+                );
+            """)
+            # Deletion pipeline: one tombstone per deleted source, cleaned up asynchronously
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS file_tombstones (
+                    id SERIAL PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    created_at TIMESTAMPTZ DEFAULT NOW(),
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TIMESTAMPTZ DEFAULT NOW(),
+                    last_error TEXT,
+                    completed_at TIMESTAMPTZ,
+                    UNIQUE (user_id, source)
+                );
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS file_tombstones_pending
+                ON file_tombstones (next_attempt_at) WHERE completed_at IS NULL;
+            """)
+            # Embedding versions: which model@dimension each vector namespace holds, and
+            # which namespace each tenant reads from / is being migrated to
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_namespaces (
+                    namespace TEXT PRIMARY KEY,
+                    version TEXT NOT NULL,
+                    created_at TIMESTAMPTZ DEFAULT NOW()
+                );
+            """)
+            cur.execute(
+                "INSERT INTO embedding_namespaces (namespace, version) VALUES ('', %s) ON CONFLICT DO NOTHING",
+                (settings.legacy_embedding_version or settings.embedding_version,)
+            )
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS tenant_embeddings (
+                    user_id TEXT PRIMARY KEY,
+                    active_namespace TEXT NOT NULL DEFAULT '',
+                    target_namespace TEXT,
+                    previous_namespace TEXT,
+                    switched_at TIMESTAMPTZ,
+                    lease_until TIMESTAMPTZ,
+                    last_error TEXT,
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                );
+            """)
         conn.commit()
 
-def save_file_metadata(user_id: str, filename: str, file_path: str):
-    """Saves a new uploaded file to the database."""
+# SQL shared with the async request-path layer (`db_async`)
+
+# The no-op update makes a conflicting insert wait for, then return, the winner's ID
+ALLOCATE_DOCUMENT_ID_SQL = """
+    INSERT INTO document_ids (user_id, filename, id)
+    VALUES (%(user_id)s, %(filename)s, COALESCE(
+        (SELECT id FROM user_files WHERE user_id = %(user_id)s AND filename = %(filename)s),
+        nextval(pg_get_serial_sequence('user_files', 'id'))
+    ))
+    ON CONFLICT (user_id, filename) DO UPDATE SET user_id = EXCLUDED.user_id
+    RETURNING id
+"""
+
+SAVE_FILE_METADATA_SQL = """
+    INSERT INTO user_files (
+        id, user_id, filename, file_path, summary, centroid,
+        file_size, page_count, chunk_count, content_hash, collection,
+        embedding_namespace, next_centroid
+    )
+    VALUES (COALESCE(%(doc_id)s, nextval(pg_get_serial_sequence('user_files', 'id'))),
+            %(user_id)s, %(filename)s, %(file_path)s, %(summary)s, %(centroid)s,
+            %(file_size)s, %(page_count)s, %(chunk_count)s, %(content_hash)s, %(collection)s,
+            %(embedding_namespace)s, %(next_centroid)s)
+    ON CONFLICT (user_id, filename) DO UPDATE SET
+        file_path = EXCLUDED.file_path,
+        summary = EXCLUDED.summary,
+        centroid = EXCLUDED.centroid,
+        file_size = EXCLUDED.file_size,
+        page_count = EXCLUDED.page_count,
+        chunk_count = EXCLUDED.chunk_count,
+        content_hash = EXCLUDED.content_hash,
+        collection = COALESCE(EXCLUDED.collection, user_files.collection),
+        embedding_namespace = EXCLUDED.embedding_namespace,
+        next_centroid = EXCLUDED.next_centroid,
+        upload_timestamp = NOW()
+"""
+
+SET_COLLECTION_SQL = "UPDATE user_files SET collection = %s WHERE user_id = %s AND filename = ANY(%s)"
+
+USER_FILE_PATHS_SQL = "SELECT DISTINCT file_path FROM user_files WHERE user_id = %s"
+
+DELETE_USER_FILES_SQL = "DELETE FROM user_files WHERE user_id = %s AND file_path = ANY(%s)"
+
+INSERT_TOMBSTONES_SQL = """
+    INSERT INTO file_tombstones (user_id, source)
+    SELECT %s, unnest(%s::text[])
+    ON CONFLICT (user_id, source) DO UPDATE SET
+        created_at = NOW(), attempts = 0, next_attempt_at = NOW(),
+        last_error = NULL, completed_at = NULL
+"""
+
+def file_metadata_params(
+    user_id: str,
+    filename: str,
+    file_path: str,
+    summary: str | None = None,
+    centroid: bytes | None = None,
+    file_size: int | None = None,
+    page_count: int | None = None,
+    chunk_count: int | None = None,
+    content_hash: str | None = None,
+    doc_id: int | None = None,
+    collection: str | None = None,
+    embedding_namespace: str = "",
+    next_centroid: bytes | None = None,
+) -> dict:
+    """Parameters of `SAVE_FILE_METADATA_SQL`, with the defaults of `save_file_metadata`."""
+    return {
+        "user_id": user_id, "filename": filename, "file_path": file_path, "summary": summary,
+        "centroid": centroid, "file_size": file_size, "page_count": page_count,
+        "chunk_count": chunk_count, "content_hash": content_hash, "doc_id": doc_id,
+        "collection": collection, "embedding_namespace": embedding_namespace,
+        "next_centroid": next_centroid,
+    }
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def user_files_query(
+    user_id: str, limit: int, after: tuple | None = None, prefix: str | None = None
+) -> tuple:
+    """The keyset-paginated `get_user_files` query and its parameters."""
+    clauses = ["user_id = %s"]
+    params: list = [user_id]
+    if after is not None:
+        clauses.append("(upload_timestamp, id) < (%s, %s)")
+        params.extend(after)
+    if prefix:
+        clauses.append("filename LIKE %s")
+        params.append(_escape_like(prefix) + "%")
+    params.append(limit)
+    sql = f"""
+        SELECT id, filename, upload_timestamp, summary, collection,
+               file_size, page_count, chunk_count, content_hash
+        FROM user_files
+        WHERE {" AND ".join(clauses)}
+        ORDER BY upload_timestamp DESC, id DESC
+        LIMIT %s
+    """
+    return sql, params
+
+@instrumented("db.allocate_document_id")
+def allocate_document_id(user_id: str, filename: str) -> int:
+    """
+    The integer document ID stamped on a file's vectors as `doc_id`.
+
+    Re-uploads keep the existing row's ID; new files draw the next value of the
+    `user_files.id` sequence, which `save_file_metadata(doc_id=...)` then inserts.
+    The ID is reserved in `document_ids` in the same statement, so two concurrent
+    uploads of one new filename get the same ID.
+    """
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(ALLOCATE_DOCUMENT_ID_SQL, {"user_id": user_id, "filename": filename})
+            return cur.fetchone()[0]
+
+@instrumented("db.save_file_metadata")
+def save_file_metadata(
+    user_id: str,
+    filename: str,
+    file_path: str,
+    summary: str | None = None,
+    centroid: bytes | None = None,
+    file_size: int | None = None,
+    page_count: int | None = None,
+    chunk_count: int | None = None,
+    content_hash: str | None = None,
+    doc_id: int | None = None,
+    collection: str | None = None,
+    embedding_namespace: str = "",
+    next_centroid: bytes | None = None,
+):
+    """
+    Saves an uploaded file (and its routing profile); re-uploads replace the existing
+    row but keep its ID, and keep its collection unless a new one is given.
+    `embedding_namespace` is the newest namespace the vectors were written to.
+    """
+    params = file_metadata_params(
+        user_id, filename, file_path, summary, centroid, file_size, page_count,
+        chunk_count, content_hash, doc_id, collection, embedding_namespace, next_centroid,
+    )
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(SAVE_FILE_METADATA_SQL, params)
+        conn.commit()
+
+@instrumented("db.save_files_metadata")
+def save_files_metadata(rows: list):
+    """
+    Batch form of `save_file_metadata` (bulk imports): one pipelined round trip and
+    one transaction for all rows, each a dict of `save_file_metadata` arguments.
+    """
+    if not rows:
+        return
     settings = get_settings()
     with psycopg.connect(settings.database_url) as conn:
         with conn.cursor() as cur:
+            cur.executemany(SAVE_FILE_METADATA_SQL, [file_metadata_params(**row) for row in rows])
+        conn.commit()
+
+@instrumented("db.get_user_files")
+def get_user_files(
+    user_id: str,
+    limit: int = 50,
+    after: tuple | None = None,
+    prefix: str | None = None,
+) -> list:
+    """
+    Fetches one page of a user's files, newest first.
+
+    Args:
+        limit: Page size.
+        after: Keyset cursor, the (upload_timestamp, id) of the last row already seen.
+        prefix: Optional case-sensitive filename prefix.
+    """
+    sql, params = user_files_query(user_id, limit, after, prefix)
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        # dict_row allows us to access column names like dictionary keys
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+@instrumented("db.get_document_profiles")
+def get_document_profiles(user_id: str) -> list:
+    """Fetches the routing centroid of each of a user's documents (one row per filename)."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
             cur.execute(
-                "INSERT INTO user_files (user_id, filename, file_path) VALUES (%s, %s, %s)",
-                (user_id, filename, file_path)
+                """
+                SELECT id, file_path, centroid
+                FROM user_files
+                WHERE user_id = %s AND centroid IS NOT NULL
+                """,
+                (user_id,)
             )
+            return cur.fetchall()
+
+# ---------------------------------------------------------
+# FEATURE: Document Scopes
+# ---------------------------------------------------------
+
+@instrumented("db.get_document_catalog")
+def get_document_catalog(user_id: str) -> list:
+    """Every document of a user as {id, filename, collection}, for scope resolution."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                "SELECT id, filename, collection FROM user_files WHERE user_id = %s",
+                (user_id,)
+            )
+            return cur.fetchall()
+
+@instrumented("db.set_collection")
+def set_collection(user_id: str, filenames: list, collection: str | None) -> int:
+    """Moves files into a collection (None removes them from theirs). Returns rows updated."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(SET_COLLECTION_SQL, (collection, user_id, list(filenames)))
+            updated = cur.rowcount
         conn.commit()
+    return updated
 
-def get_user_files(user_id: str) -> list:
-    """Fetches all files owned by a specific user."""
+@instrumented("db.get_user_documents")
+def get_user_documents(user_id: str) -> list:
+    """Every document row of a user except the centroid, oldest first (tenant snapshots)."""
     settings = get_settings()
     with psycopg.connect(settings.database_url) as conn:
-        # dict_row allows us to access column names like dictionary keys
         with conn.cursor(row_factory=dict_row) as cur:
             cur.execute(
-                "SELECT id, filename, upload_timestamp FROM user_files WHERE user_id = %s ORDER BY upload_timestamp DESC",
+                """
+                SELECT id, filename, file_path, summary, collection, upload_timestamp,
+                       file_size, page_count, chunk_count, content_hash
+                FROM user_files
+                WHERE user_id = %s
+                ORDER BY id
+                """,
                 (user_id,)
             )
             return cur.fetchall()
 
-def delete_user_file_metadata(user_id: str):
-    """Deletes all database records for a specific user when they clear their data."""
+def get_all_documents() -> list:
+    """Every document of every user as {id, user_id, file_path} (maintenance commands only)."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute("SELECT id, user_id, file_path FROM user_files ORDER BY id")
+            return cur.fetchall()
+
+# ---------------------------------------------------------
+# FEATURE: Deletion Tombstones
+# ---------------------------------------------------------
+
+@instrumented("db.tombstone_files")
+def tombstone_files(user_id: str, sources: list) -> int:
+    """
+    Removes the metadata rows for `sources` and records a tombstone for each, in one
+    transaction. Re-tombstoning a source resets its cleanup state.
+
+    Returns:
+        int: The number of `user_files` rows removed.
+    """
+    if not sources:
+        return 0
+
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(DELETE_USER_FILES_SQL, (user_id, sources))
+            removed = cur.rowcount
+            cur.execute(INSERT_TOMBSTONES_SQL, (user_id, sources))
+        conn.commit()
+    return removed
+
+@instrumented("db.get_tombstoned_sources")
+def get_tombstoned_sources(user_id: str) -> list:
+    """Sources deleted by a user whose tombstone has not been purged yet."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT source FROM file_tombstones WHERE user_id = %s", (user_id,))
+            return [row[0] for row in cur.fetchall()]
+
+@instrumented("db.claim_tombstones")
+def claim_tombstones(limit: int, lease_seconds: float) -> list:
+    """
+    Claims up to `limit` due tombstones for cleanup.
+
+    Claimed rows are leased by pushing `next_attempt_at` forward, and SKIP LOCKED keeps
+    concurrent workers from claiming the same rows.
+    """
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                UPDATE file_tombstones
+                SET next_attempt_at = NOW() + make_interval(secs => %s)
+                WHERE id IN (
+                    SELECT id FROM file_tombstones
+                    WHERE completed_at IS NULL AND next_attempt_at <= NOW()
+                    ORDER BY next_attempt_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, user_id, source, attempts
+                """,
+                (lease_seconds, limit)
+            )
+            rows = cur.fetchall()
+        conn.commit()
+    return rows
+
+# Superseded: the source was uploaded again after it was tombstoned
+LOCK_TOMBSTONES_SQL = """
+    SELECT t.id, t.user_id, t.source, EXISTS (
+        SELECT 1 FROM user_files f
+        WHERE f.user_id = t.user_id AND f.file_path = t.source AND f.upload_timestamp > t.created_at
+    ) AS superseded
+    FROM file_tombstones t
+    WHERE t.user_id = %s AND (t.id = ANY(%s) OR t.source = ANY(%s))
+    FOR UPDATE OF t
+"""
+
+@contextmanager
+def lock_tombstones(user_id: str, ids: list = (), sources: list = (), drop: bool = False) -> Iterator[list]:
+    """
+    Locks a user's tombstones (by ID or source) for the duration of their cleanup, so
+    the background worker and a re-upload's purge never clean the same source at once.
+
+    Yields the tombstones still to clean: rows removed since they were claimed are
+    absent, and rows superseded by a later upload of the same source are deleted
+    without cleanup. When the block succeeds, the yielded tombstones are marked
+    completed (or deleted, with `drop`) in the same transaction; when it raises,
+    nothing changes.
+    """
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(LOCK_TOMBSTONES_SQL, (user_id, list(ids), list(sources)))
+            rows = cur.fetchall()
+            superseded = [row["id"] for row in rows if row["superseded"]]
+            if superseded:
+                cur.execute("DELETE FROM file_tombstones WHERE id = ANY(%s)", (superseded,))
+            live = [row for row in rows if not row["superseded"]]
+            yield live
+            live_ids = [row["id"] for row in live]
+            if live_ids and drop:
+                cur.execute("DELETE FROM file_tombstones WHERE id = ANY(%s)", (live_ids,))
+            elif live_ids:
+                cur.execute(
+                    "UPDATE file_tombstones SET completed_at = NOW(), last_error = NULL WHERE id = ANY(%s)",
+                    (live_ids,)
+                )
+        conn.commit()
+
+@instrumented("db.fail_tombstones")
+def fail_tombstones(ids: list, error: str, base_delay: float, max_delay: float):
+    """Records a failed cleanup attempt and schedules a retry with exponential backoff."""
+    if not ids:
+        return
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE file_tombstones SET
+                    attempts = attempts + 1,
+                    last_error = %s,
+                    next_attempt_at = NOW() + make_interval(secs => LEAST(%s, %s * power(2, attempts)))
+                WHERE id = ANY(%s)
+                """,
+                (error[:1000], max_delay, base_delay, ids)
+            )
+        conn.commit()
+
+@instrumented("db.get_expired_tombstones")
+def get_expired_tombstones(retention_seconds: float, limit: int) -> list:
+    """Completed tombstones older than the retention window (ready to verify and purge)."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT id, user_id, source FROM file_tombstones
+                WHERE completed_at < NOW() - make_interval(secs => %s)
+                ORDER BY completed_at
+                LIMIT %s
+                """,
+                (retention_seconds, limit)
+            )
+            return cur.fetchall()
+
+@instrumented("db.reopen_tombstones")
+def reopen_tombstones(ids: list):
+    """Puts completed tombstones back in the cleanup queue (leftovers were found)."""
+    if not ids:
+        return
     settings = get_settings()
     with psycopg.connect(settings.database_url) as conn:
         with conn.cursor() as cur:
-            cur.execute("DELETE FROM user_files WHERE user_id = %s", (user_id,))
+            cur.execute(
+                "UPDATE file_tombstones SET completed_at = NULL, next_attempt_at = NOW() WHERE id = ANY(%s)",
+                (ids,)
+            )
         conn.commit()
 
-def delete_specific_user_files(user_id: str, filenames: list):
-    """Deletes specific files for a user from the Neon database."""
-    if not filenames:
+@instrumented("db.purge_tombstones")
+def purge_tombstones(ids: list):
+    """Deletes verified tombstones for good."""
+    if not ids:
         return
-        
     settings = get_settings()
     with psycopg.connect(settings.database_url) as conn:
         with conn.cursor() as cur:
-            # We use ANY(%s) to match the list of filenames safely in PostgreSQL
+            cur.execute("DELETE FROM file_tombstones WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+
+@instrumented("db.count_pending_tombstones")
+def count_pending_tombstones() -> int:
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM file_tombstones WHERE completed_at IS NULL")
+            return cur.fetchone()[0]
+
+@instrumented("db.get_user_file_paths")
+def get_user_file_paths(user_id: str) -> list:
+    """All indexed source paths for a user (used by delete-all and the reconciler)."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(USER_FILE_PATHS_SQL, (user_id,))
+            return [row[0] for row in cur.fetchall()]
+
+# ---------------------------------------------------------
+# FEATURE: Embedding Namespaces
+# ---------------------------------------------------------
+
+def get_embedding_namespaces() -> dict:
+    """Registered namespaces and the model@dimension version each holds."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT namespace, version FROM embedding_namespaces")
+            return dict(cur.fetchall())
+
+def register_embedding_namespace(namespace: str, version: str, replace: bool = False):
+    """Records the version a namespace holds; `replace` after rewriting its vectors in place."""
+    conflict = "DO UPDATE SET version = EXCLUDED.version" if replace else "DO NOTHING"
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"INSERT INTO embedding_namespaces (namespace, version) VALUES (%s, %s) ON CONFLICT {conflict}",
+                (namespace, version)
+            )
+        conn.commit()
+
+@instrumented("db.get_tenant_embedding")
+def get_tenant_embedding(user_id: str) -> dict:
+    """
+    The tenant's namespaces. Tenants without a row (never migrated) report the
+    namespace of their first document instead, or None when they have none.
+    """
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT t.active_namespace, t.target_namespace, t.previous_namespace,
+                       (SELECT f.embedding_namespace FROM user_files f
+                        WHERE f.user_id = u.user_id ORDER BY f.id LIMIT 1) AS document_namespace
+                FROM (VALUES (%s)) AS u(user_id)
+                LEFT JOIN tenant_embeddings t ON t.user_id = u.user_id
+                """,
+                (user_id,)
+            )
+            return cur.fetchone()
+
+@instrumented("db.plan_embedding_migrations")
+def plan_embedding_migrations(target_namespace: str) -> int:
+    """
+    Targets every tenant with documents outside `target_namespace` for migration.
+
+    Returns:
+        int: The number of tenants whose migration was started.
+    """
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO tenant_embeddings (user_id, active_namespace, target_namespace)
+                SELECT user_id, (array_agg(embedding_namespace ORDER BY id))[1], %s
+                FROM user_files
+                GROUP BY user_id
+                HAVING bool_or(embedding_namespace <> %s)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    target_namespace = EXCLUDED.target_namespace,
+                    last_error = NULL,
+                    updated_at = NOW()
+                WHERE tenant_embeddings.active_namespace <> EXCLUDED.target_namespace
+                  AND tenant_embeddings.target_namespace IS DISTINCT FROM EXCLUDED.target_namespace
+                  -- The previous cutover's namespace must be cleaned up first
+                  AND tenant_embeddings.previous_namespace IS NULL
+                """,
+                (target_namespace, target_namespace)
+            )
+            started = cur.rowcount
+        conn.commit()
+    return started
+
+def claim_embedding_migration(lease_seconds: float, dual_read_seconds: float) -> dict | None:
+    """Leases one tenant with a migration, or an expired dual-read window, to finish (SKIP LOCKED)."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                UPDATE tenant_embeddings
+                SET lease_until = NOW() + make_interval(secs => %s)
+                WHERE user_id = (
+                    SELECT user_id FROM tenant_embeddings
+                    WHERE (target_namespace IS NOT NULL
+                           OR (previous_namespace IS NOT NULL
+                               AND switched_at < NOW() - make_interval(secs => %s)))
+                      AND (lease_until IS NULL OR lease_until < NOW())
+                    ORDER BY updated_at
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING user_id, active_namespace, target_namespace, previous_namespace
+                """,
+                (lease_seconds, dual_read_seconds)
+            )
+            row = cur.fetchone()
+        conn.commit()
+    return row
+
+def release_embedding_migration(user_id: str, error: str | None = None):
+    """Ends a lease; after a failure the lease is kept, so the retry waits for it to expire."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE tenant_embeddings
+                SET lease_until = CASE WHEN %s::text IS NULL THEN NULL ELSE lease_until END,
+                    last_error = %s, updated_at = NOW()
+                WHERE user_id = %s
+                """,
+                (error, error, user_id)
+            )
+        conn.commit()
+
+def get_documents_to_embed(user_id: str, namespace: str, limit: int) -> list:
+    """A user's documents whose vectors are not in `namespace` yet, oldest first."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT id, filename, file_path, embedding_namespace
+                FROM user_files
+                WHERE user_id = %s AND embedding_namespace <> %s
+                ORDER BY id
+                LIMIT %s
+                """,
+                (user_id, namespace, limit)
+            )
+            return cur.fetchall()
+
+def mark_document_embedded(doc_id: int, namespace: str, centroid: bytes | None, pending: bool):
+    """Records a document's vectors in `namespace`; a pending namespace gets `next_centroid`."""
+    column = "next_centroid" if pending else "centroid"
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"UPDATE user_files SET embedding_namespace = %s, {column} = %s WHERE id = %s",
+                (namespace, centroid, doc_id)
+            )
+        conn.commit()
+
+@instrumented("db.switch_embedding_namespace")
+def switch_embedding_namespace(user_id: str, target_namespace: str) -> bool:
+    """
+    Atomically makes `target_namespace` the tenant's active namespace, together with
+    the routing centroids computed for it. Refuses while documents are still missing.
+
+    Returns:
+        bool: True if the tenant was switched.
+    """
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT 1 FROM tenant_embeddings WHERE user_id = %s AND target_namespace = %s FOR UPDATE",
+                (user_id, target_namespace)
+            )
+            if cur.fetchone() is None:
+                return False
+            cur.execute(
+                "SELECT 1 FROM user_files WHERE user_id = %s AND embedding_namespace <> %s LIMIT 1",
+                (user_id, target_namespace)
+            )
+            if cur.fetchone() is not None:
+                return False
+            cur.execute(
+                """
+                UPDATE user_files SET centroid = next_centroid, next_centroid = NULL
+                WHERE user_id = %s AND next_centroid IS NOT NULL
+                """,
+                (user_id,)
+            )
+            cur.execute(
+                """
+                UPDATE tenant_embeddings SET
+                    previous_namespace = active_namespace,
+                    active_namespace = target_namespace,
+                    target_namespace = NULL,
+                    switched_at = NOW(),
+                    updated_at = NOW()
+                WHERE user_id = %s
+                """,
+                (user_id,)
+            )
+        conn.commit()
+    return True
+
+def finish_dual_read(user_id: str):
+    """Forgets the previous namespace, promoting centroids of uploads that raced the switch."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE user_files f SET centroid = f.next_centroid, next_centroid = NULL
+                FROM tenant_embeddings t
+                WHERE t.user_id = f.user_id AND f.user_id = %s
+                  AND f.next_centroid IS NOT NULL AND f.embedding_namespace = t.active_namespace
+                """,
+                (user_id,)
+            )
+            cur.execute(
+                "UPDATE tenant_embeddings SET previous_namespace = NULL, updated_at = NOW() WHERE user_id = %s",
+                (user_id,)
+            )
+        conn.commit()
+
+def count_documents_to_embed() -> int:
+    """Documents not yet in their tenant's target namespace, across all tenants."""
+    settings = get_settings()
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
             cur.execute(
-                "DELETE FROM user_files WHERE user_id = %s AND filename = ANY(%s)",
-                (user_id, filenames)
+                """
+                SELECT COUNT(*) FROM user_files f
+                JOIN tenant_embeddings t ON t.user_id = f.user_id
+                WHERE t.target_namespace IS NOT NULL AND f.embedding_namespace <> t.target_namespace
+                """
             )
-        conn.commit()
\ No newline at end of file
+            return cur.fetchone()[0]
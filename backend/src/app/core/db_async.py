@@ -0,0 +1,136 @@
+"""
+Async Database Module (request path)
+
+The `core.db` helpers open a fresh synchronous connection per call, so an `async`
+route calling them either blocks the event loop or occupies a threadpool slot
+for the whole round trip. The helpers the routes need are mirrored here on
+`psycopg`'s async API:
+
+- one `AsyncConnectionPool` per worker process, opened lazily inside the event
+  loop and sized with the checkpoint pool against the database connection budget;
+- `prepare_threshold=0`, so every statement is prepared server-side on first use
+  and re-executed by name on the pooled connections (`DB_PREPARE_STATEMENTS`);
+- pipeline mode for multi-statement operations, which sends them in one round trip
+  inside one transaction;
+- set-based batch writes (`= ANY(...)` / `unnest`) and pipelined `executemany`.
+
+The SQL itself lives in `core.db`, shared with the synchronous helpers used by
+background workers and maintenance commands.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import List
+
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from . import db
+from .config import get_settings
+from .metrics import instrumented
+
+_pool: AsyncConnectionPool | None = None
+_pool_lock: asyncio.Lock | None = None
+
+
+async def get_pool() -> AsyncConnectionPool:
+    """The worker's pool, created and opened on first use inside the running loop."""
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            settings = get_settings()
+            pool = AsyncConnectionPool(
+                conninfo=settings.database_url,
+                min_size=1,
+                max_size=settings.db_async_pool_size,
+                kwargs={"prepare_threshold": 0 if settings.db_prepare_statements else None},
+                open=False,
+            )
+            await pool.open()
+            _pool = pool
+    return _pool
+
+
+async def close_pool() -> None:
+    global _pool, _pool_lock
+    if _pool is not None:
+        await _pool.close()
+    _pool = None
+    _pool_lock = None
+
+
+@instrumented("db.get_user_files")
+async def get_user_files(
+    user_id: str,
+    limit: int = 50,
+    after: tuple | None = None,
+    prefix: str | None = None,
+) -> list:
+    """Async `db.get_user_files`: one keyset page of a user's files, newest first."""
+    sql, params = db.user_files_query(user_id, limit, after, prefix)
+    async with (await get_pool()).connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+
+
+@instrumented("db.get_user_file_paths")
+async def get_user_file_paths(user_id: str) -> list:
+    async with (await get_pool()).connection() as conn:
+        cur = await conn.execute(db.USER_FILE_PATHS_SQL, (user_id,))
+        return [row[0] for row in await cur.fetchall()]
+
+
+@instrumented("db.allocate_document_id")
+async def allocate_document_id(user_id: str, filename: str) -> int:
+    async with (await get_pool()).connection() as conn:
+        cur = await conn.execute(db.ALLOCATE_DOCUMENT_ID_SQL, {"user_id": user_id, "filename": filename})
+        return (await cur.fetchone())[0]
+
+
+@instrumented("db.save_file_metadata")
+async def save_file_metadata(user_id: str, filename: str, file_path: str, *args, **kwargs) -> None:
+    """Async `db.save_file_metadata` (same arguments)."""
+    params = db.file_metadata_params(user_id, filename, file_path, *args, **kwargs)
+    async with (await get_pool()).connection() as conn:
+        await conn.execute(db.SAVE_FILE_METADATA_SQL, params)
+
+
+@instrumented("db.save_files_metadata")
+async def save_files_metadata(rows: List[dict]) -> None:
+    """Batch upsert of file rows in one pipelined round trip and one transaction."""
+    if not rows:
+        return
+    async with (await get_pool()).connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.executemany(db.SAVE_FILE_METADATA_SQL, [db.file_metadata_params(**row) for row in rows])
+
+
+@instrumented("db.set_collection")
+async def set_collection(user_id: str, filenames: list, collection: str | None) -> int:
+    async with (await get_pool()).connection() as conn:
+        cur = await conn.execute(db.SET_COLLECTION_SQL, (collection, user_id, list(filenames)))
+        return cur.rowcount
+
+
+@instrumented("db.tombstone_files")
+async def tombstone_files(user_id: str, sources: list) -> int:
+    """
+    Async `db.tombstone_files`: the row delete and the tombstone upsert are pipelined
+    (one round trip) and committed together.
+
+    Returns:
+        int: The number of `user_files` rows removed.
+    """
+    if not sources:
+        return 0
+    async with (await get_pool()).connection() as conn:
+        async with conn.pipeline():
+            deleted = await conn.execute(db.DELETE_USER_FILES_SQL, (user_id, sources))
+            await conn.execute(db.INSERT_TOMBSTONES_SQL, (user_id, sources))
+        return deleted.rowcount
@@ -0,0 +1,343 @@
+"""
+Deletion Pipeline Module
+
+A document lives in three stores: the uploaded PDF on disk, its vectors in the
+vector index and its metadata row in Postgres. Deleting them one after another in
+the request leaves the stores inconsistent whenever a step fails, and a slow
+vector delete blocks the response.
+
+Deletes therefore go through a tombstone:
+
+1. `request_delete` / `request_clear` remove the metadata rows and record a
+   tombstone per source in ONE Postgres transaction, then return. From that moment
+   retrieval excludes the source (`tombstoned_sources` feeds a `$nin` filter), so
+   stale vectors are never searchable even while they still exist. The set is only
+   cached where every worker sees the invalidation (a shared cache, or one worker).
+2. `DeletionWorker` (a background thread per worker process) claims due tombstones
+   in batches, deletes their vectors with one filtered call per user and unlinks
+   the files. Failures are retried with exponential backoff; claims use
+   `FOR UPDATE SKIP LOCKED`, so several workers can run the loop safely. Cleanup
+   holds a row lock on the tombstones and skips any that a re-upload removed or
+   superseded in the meantime, so it never deletes a newer copy of the file.
+3. `reconcile` sweeps what the loop cannot see: uploaded files and (local backend)
+   vectors with no metadata row, and completed tombstones whose vectors turn out
+   to still exist. Verified tombstones are purged after a retention window, and the
+   chunk store is compacted once enough of it is dead records.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Set
+
+from . import db, db_async
+from .cache import cache_get, cache_set, get_cache
+from .config import get_settings
+from .metrics import Counter, Gauge, register
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ROOT = Path("data/uploads")
+
+DELETIONS = register(Counter("intellirag_deletions_total", "Tombstoned sources processed, by outcome."))
+TOMBSTONES_PENDING = register(Gauge("intellirag_tombstones_pending", "Tombstones awaiting cleanup."))
+
+
+def source_path(user_id: str, filename: str) -> str:
+    """
+    The `source` metadata value stamped on a user's uploaded file at indexing time.
+
+    Raises:
+        ValueError: When `filename` is not a single path component. The cleanup
+            unlinks this path verbatim, so it must stay inside the user's directory.
+    """
+    if not filename or filename in (".", "..") or any(sep in filename for sep in ("/", "\\", "\0")):
+        raise ValueError(f"Invalid filename: {filename!r}")
+    return str(UPLOAD_ROOT / user_id / filename)
+
+
+# ---------------------------------------------------------
+# FEATURE: Retrieval Exclusion
+# ---------------------------------------------------------
+
+def _tombstones_cacheable() -> bool:
+    # A per-process cache is only invalidated in the worker that took the DELETE;
+    # other workers would keep serving the deleted document until the TTL expires
+    settings = get_settings()
+    return settings.cache_backend != "memory" or settings.web_concurrency <= 1
+
+
+def tombstoned_sources(user_id: str) -> Set[str]:
+    """The user's deleted sources; cached (and invalidated on every new tombstone) when shared."""
+    if not _tombstones_cacheable():
+        return set(db.get_tombstoned_sources(user_id))
+    blob = cache_get("tombstones", user_id)
+    if blob is not None:
+        return set(json.loads(blob))
+    sources = db.get_tombstoned_sources(user_id)
+    cache_set("tombstones", user_id, json.dumps(sources).encode(), ttl=get_settings().tombstone_cache_ttl)
+    return set(sources)
+
+
+def _invalidate(user_id: str) -> None:
+    get_cache().delete(f"tombstones:{user_id}")
+
+
+# ---------------------------------------------------------
+# Request path
+# ---------------------------------------------------------
+
+def request_delete(user_id: str, filenames: List[str]) -> int:
+    """
+    Tombstones specific files. Returns immediately; cleanup happens in the background.
+
+    Returns:
+        int: The number of sources tombstoned.
+    """
+    sources = sorted({source_path(user_id, name) for name in filenames})
+    return _tombstone(user_id, sources)
+
+
+def request_clear(user_id: str) -> int:
+    """Tombstones every document the user has, indexed or merely uploaded."""
+    sources = set(db.get_user_file_paths(user_id))
+    upload_dir = UPLOAD_ROOT / user_id
+    if upload_dir.is_dir():
+        sources.update(str(p) for p in upload_dir.iterdir() if p.is_file())
+    return _tombstone(user_id, sorted(sources))
+
+
+def _tombstone(user_id: str, sources: List[str]) -> int:
+    if not sources:
+        return 0
+    db.tombstone_files(user_id, sources)
+    _invalidate(user_id)
+    get_deletion_worker().kick()
+    return len(sources)
+
+
+async def arequest_delete(user_id: str, filenames: List[str]) -> int:
+    """`request_delete` for async routes: the tombstone write goes through `db_async`."""
+    sources = sorted({source_path(user_id, name) for name in filenames})
+    return await _atombstone(user_id, sources)
+
+
+async def arequest_clear(user_id: str) -> int:
+    """`request_clear` for async routes."""
+    sources = set(await db_async.get_user_file_paths(user_id))
+    upload_dir = UPLOAD_ROOT / user_id
+    if upload_dir.is_dir():
+        sources.update(str(p) for p in upload_dir.iterdir() if p.is_file())
+    return await _atombstone(user_id, sorted(sources))
+
+
+async def _atombstone(user_id: str, sources: List[str]) -> int:
+    if not sources:
+        return 0
+    await db_async.tombstone_files(user_id, sources)
+    _invalidate(user_id)
+    get_deletion_worker().kick()
+    return len(sources)
+
+
+def purge_source(user_id: str, source: str) -> None:
+    """
+    Synchronously finishes a pending delete before the same file is uploaded again,
+    so the background cleanup can never remove the new upload's file or vectors.
+
+    Reads the tombstone from Postgres, never from a cache: a delete handled by
+    another worker moments ago must still be seen here.
+    """
+    with db.lock_tombstones(user_id, sources=[source], drop=True) as pending:
+        if pending:
+            _cleanup(user_id, [source], remove_files=False)
+    if pending:
+        _invalidate(user_id)
+
+
+# ---------------------------------------------------------
+# Background cleanup
+# ---------------------------------------------------------
+
+def _cleanup(user_id: str, sources: List[str], remove_files: bool = True) -> None:
+    from .retrieval.vector_store import delete_source_vectors
+
+    delete_source_vectors(user_id, sources)
+    if not remove_files:
+        return
+    for source in sources:
+        Path(source).unlink(missing_ok=True)
+    upload_dir = UPLOAD_ROOT / user_id
+    if upload_dir.is_dir() and not any(upload_dir.iterdir()):
+        upload_dir.rmdir()
+
+
+def process_pending(batch_size: int | None = None) -> int:
+    """
+    Cleans up one batch of due tombstones.
+
+    Returns:
+        int: The number of tombstones claimed (0 when the queue is drained).
+    """
+    settings = get_settings()
+    rows = db.claim_tombstones(batch_size or settings.deletion_batch_size, settings.deletion_lease_seconds)
+    if not rows:
+        return 0
+
+    by_user: Dict[str, List[dict]] = defaultdict(list)
+    for row in rows:
+        by_user[row["user_id"]].append(row)
+
+    for user_id, user_rows in by_user.items():
+        ids = [row["id"] for row in user_rows]
+        try:
+            # Re-checked under lock: a re-upload may have removed or superseded them
+            with db.lock_tombstones(user_id, ids=ids) as live:
+                if live:
+                    _cleanup(user_id, [row["source"] for row in live])
+        except Exception as exc:
+            logger.warning("Cleanup of %d tombstone(s) for %s failed: %s", len(ids), user_id, exc)
+            db.fail_tombstones(
+                ids, str(exc), settings.deletion_retry_base_delay, settings.deletion_retry_max_delay
+            )
+            DELETIONS.inc(len(ids), outcome="retry")
+            continue
+        DELETIONS.inc(len(live), outcome="completed")
+        if len(live) < len(ids):
+            DELETIONS.inc(len(ids) - len(live), outcome="superseded")
+    return len(rows)
+
+
+# ---------------------------------------------------------
+# FEATURE: Orphan Reconciler
+# ---------------------------------------------------------
+
+def _is_settled(path: Path, grace_seconds: float) -> bool:
+    # Files younger than the grace period may belong to an upload still being indexed
+    try:
+        return time.time() - path.stat().st_mtime > grace_seconds
+    except FileNotFoundError:
+        return True
+
+
+def reconcile() -> Dict[str, int]:
+    """
+    Sweeps orphans into the pipeline and purges verified tombstones.
+
+    Returns:
+        Dict[str, int]: Counts of orphaned files/vectors tombstoned, tombstones
+            reopened or purged, and whether the chunk store was compacted.
+    """
+    from .retrieval.vector_store import count_source_vectors, list_indexed_sources
+
+    settings = get_settings()
+    grace = settings.deletion_orphan_grace_seconds
+    report = {"orphan_files": 0, "orphan_vectors": 0, "reopened": 0, "purged": 0}
+
+    # 1. Uploaded files with no metadata row (failed ingestion, crashed delete)
+    live: Dict[str, Set[str]] = {}
+    orphans: Dict[str, Set[str]] = defaultdict(set)
+    if UPLOAD_ROOT.is_dir():
+        for user_dir in UPLOAD_ROOT.iterdir():
+            if not user_dir.is_dir():
+                continue
+            user_id = user_dir.name
+            live[user_id] = set(db.get_user_file_paths(user_id))
+            for path in user_dir.iterdir():
+                if path.is_file() and str(path) not in live[user_id] and _is_settled(path, grace):
+                    orphans[user_id].add(str(path))
+    report["orphan_files"] = sum(len(s) for s in orphans.values())
+
+    # 2. Vectors with no metadata row (local backend only; Pinecone is verified per tombstone)
+    for user_id, source in list_indexed_sources() or ():
+        if not user_id or not source:
+            continue
+        if user_id not in live:
+            live[user_id] = set(db.get_user_file_paths(user_id))
+        if source not in live[user_id] and source not in orphans[user_id] and _is_settled(Path(source), grace):
+            orphans[user_id].add(source)
+            report["orphan_vectors"] += 1
+
+    for user_id, sources in orphans.items():
+        pending = sorted(sources - tombstoned_sources(user_id))
+        if pending:
+            _tombstone(user_id, pending)
+
+    # 3. Verify completed tombstones before forgetting them
+    expired = db.get_expired_tombstones(settings.tombstone_retention_seconds, settings.deletion_batch_size)
+    reopen, purge = [], []
+    for row in expired:
+        leftover = count_source_vectors(row["user_id"], row["source"]) or Path(row["source"]).exists()
+        (reopen if leftover else purge).append(row)
+    db.reopen_tombstones([row["id"] for row in reopen])
+    db.purge_tombstones([row["id"] for row in purge])
+    for user_id in {row["user_id"] for row in purge}:
+        _invalidate(user_id)
+    report["reopened"], report["purged"] = len(reopen), len(purge)
+
+    # 4. Reclaim chunk-store space held by deleted and superseded records
+    from .retrieval.chunk_store import get_chunk_store
+
+    report["chunk_store_compacted"] = 0
+    if settings.chunk_store_enabled:
+        store = get_chunk_store()
+        if store.garbage_ratio >= settings.chunk_store_compact_ratio:
+            store.compact()
+            report["chunk_store_compacted"] = 1
+
+    TOMBSTONES_PENDING.set(db.count_pending_tombstones())
+    return report
+
+
+class DeletionWorker:
+    """Background thread that drains the tombstone queue and runs the reconciler."""
+
+    def __init__(self, poll_interval: float, reconcile_interval: float) -> None:
+        self.poll_interval = poll_interval
+        self.reconcile_interval = reconcile_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._last_reconcile = time.monotonic()
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="deletion-worker", daemon=True)
+            self._thread.start()
+
+    def kick(self) -> None:
+        """Wakes the loop right away (a new tombstone was written)."""
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                while process_pending() and not self._stop.is_set():
+                    pass
+                if self.reconcile_interval and time.monotonic() - self._last_reconcile >= self.reconcile_interval:
+                    self._last_reconcile = time.monotonic()
+                    reconcile()
+            except Exception:
+                logger.exception("Deletion worker iteration failed.")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+
+@lru_cache(maxsize=1)
+def get_deletion_worker() -> DeletionWorker:
+    settings = get_settings()
+    return DeletionWorker(settings.deletion_poll_interval, settings.deletion_reconcile_interval)
@@ -0,0 +1,224 @@
+"""
+Embedding Migration Module
+
+Changing the embedding model or dimension used to strand every indexed vector:
+queries embedded with the new version cannot be compared with documents embedded
+with the old one, and re-ingesting every PDF re-parses and re-summarizes them too.
+
+Each version lives in its own vector namespace (see `retrieval.embedding_spaces`)
+and tenants move between them independently:
+
+1. `plan_migrations` targets every tenant whose documents are not yet in the
+   namespace of the configured version. From then on, new uploads are written to
+   both namespaces.
+2. `EmbeddingMigrator` (a background thread per worker process) leases one tenant
+   at a time, re-embeds its chunks from the stored chunk text in large batches,
+   rate-limited by a chunks-per-minute token bucket, and upserts them into the
+   target namespace under the same vector IDs.
+3. Once no document is missing, the tenant's active namespace and routing
+   centroids are switched in ONE Postgres transaction. Searches that come up short
+   are topped up from the previous namespace until the dual-read window closes;
+   then the tenant's vectors there are deleted.
+
+Leases use `FOR UPDATE SKIP LOCKED`, so every worker process can run the loop.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from . import db
+from .config import get_settings
+from .llm.scheduler import TokenBucket
+from .metrics import Counter, Gauge, register
+from .retrieval.chunk_store import get_chunk_store
+from .retrieval.embedding_spaces import current_namespace, invalidate_tenant_spaces, version_for
+from .retrieval.routing import compute_centroid, encode_centroid, invalidate_document_profiles
+from .retrieval.vector_store import (
+    _upsert_embeddings,
+    document_vectors,
+    get_embeddings_for,
+    get_namespace_store,
+)
+
+logger = logging.getLogger(__name__)
+
+MIGRATED_CHUNKS = register(Counter(
+    "intellirag_embedding_migrated_chunks_total", "Chunks re-embedded into a new embedding namespace."
+))
+MIGRATION_THROUGHPUT = register(Gauge(
+    "intellirag_embedding_migration_chunks_per_second", "Re-embedding throughput of the last migrated document."
+))
+MIGRATION_PENDING = register(Gauge(
+    "intellirag_embedding_migration_pending_documents", "Documents not yet in their tenant's target namespace."
+))
+MIGRATION_SWITCHES = register(Counter("intellirag_embedding_switches_total", "Tenant namespace changes, by phase."))
+
+
+def plan_migrations() -> int:
+    """
+    Starts a migration for every tenant not on the configured embedding version.
+    Cached tenant namespaces expire within `embedding_namespace_cache_ttl`; uploads
+    in that window land in the old namespace only and are migrated like the rest.
+    """
+    return db.plan_embedding_migrations(current_namespace())
+
+
+def _throttle(bucket: TokenBucket, amount: int) -> None:
+    # Batches larger than a minute's budget still go through, one full bucket at a time
+    amount = min(amount, bucket.capacity)
+    wait = bucket.wait_time(amount, time.monotonic())
+    if wait:
+        time.sleep(wait)
+    bucket.consume(amount, time.monotonic())
+
+
+def migrate_document(user_id: str, row: dict, namespace: str, bucket: TokenBucket) -> Tuple[int, np.ndarray | None]:
+    """
+    Re-embeds one document's chunks into `namespace`, keeping vector IDs and metadata.
+
+    Returns:
+        Tuple[int, np.ndarray | None]: Chunks migrated and the centroid in the new space.
+    """
+    settings = get_settings()
+    records = document_vectors(get_namespace_store(row["embedding_namespace"]), user_id, row["file_path"])
+    if not records:
+        return 0, None
+
+    # Vectors written with a chunk store keep their text there, not in the index
+    stored = {}
+    if settings.chunk_store_enabled:
+        stored = get_chunk_store().get_many(vid for vid, text, _, _ in records if not text)
+    embeddings = get_embeddings_for(version_for(namespace))
+    target = get_namespace_store(namespace)
+    batch_size = settings.embedding_migration_batch_size
+
+    started = time.monotonic()
+    centroid_input = []
+    for i in range(0, len(records), batch_size):
+        batch = records[i : i + batch_size]
+        _throttle(bucket, len(batch))
+        texts = [text or stored.get(vid, {}).get("text", "") for vid, text, _, _ in batch]
+        vectors = embeddings.embed_documents(texts)
+        _upsert_embeddings(
+            target,
+            [text for _, text, _, _ in batch],
+            vectors,
+            [{k: v for k, v in metadata.items() if k != "score"} for _, _, metadata, _ in batch],
+            [vid for vid, _, _, _ in batch],
+        )
+        MIGRATED_CHUNKS.inc(len(batch))
+        centroid_input.extend(vectors)
+
+    MIGRATION_THROUGHPUT.set(len(records) / max(time.monotonic() - started, 1e-6))
+    return len(records), compute_centroid(centroid_input)
+
+
+def process_tenant(claim: dict, bucket: TokenBucket) -> Dict[str, Any]:
+    """
+    Advances one leased tenant: migrates a batch of documents and switches once none
+    is missing, or, after the dual-read window, sweeps stragglers into the active
+    namespace and drops the previous one.
+    """
+    settings = get_settings()
+    user_id = claim["user_id"]
+    limit = settings.embedding_migration_documents_per_claim
+    report: Dict[str, Any] = {"user_id": user_id, "documents": 0, "chunks": 0, "switched": False}
+
+    target = claim["target_namespace"]
+    # Stragglers: uploads that used stale cached namespaces around the switch
+    namespace = target if target is not None else claim["active_namespace"]
+    rows = db.get_documents_to_embed(user_id, namespace, limit)
+    for row in rows:
+        chunks, centroid = migrate_document(user_id, row, namespace, bucket)
+        db.mark_document_embedded(row["id"], namespace, encode_centroid(centroid), pending=target is not None)
+        report["documents"] += 1
+        report["chunks"] += chunks
+    if len(rows) == limit:
+        return report
+
+    if target is not None:
+        if db.switch_embedding_namespace(user_id, target):
+            MIGRATION_SWITCHES.inc(phase="switch")
+            report["switched"] = True
+    else:
+        previous = claim["previous_namespace"]
+        get_namespace_store(previous).delete(filter={"user_id": user_id})
+        db.finish_dual_read(user_id)
+        MIGRATION_SWITCHES.inc(phase="finish")
+    invalidate_tenant_spaces(user_id)
+    invalidate_document_profiles(user_id)
+    return report
+
+
+def process_next(bucket: TokenBucket) -> Dict[str, Any] | None:
+    """Leases and advances one tenant. Returns None when no tenant needs work."""
+    settings = get_settings()
+    claim = db.claim_embedding_migration(
+        settings.embedding_migration_lease_seconds, settings.embedding_dual_read_seconds
+    )
+    if claim is None:
+        return None
+    try:
+        report = process_tenant(claim, bucket)
+    except Exception as e:
+        logger.exception("Embedding migration failed for user %s.", claim["user_id"])
+        db.release_embedding_migration(claim["user_id"], error=str(e))
+        return {"user_id": claim["user_id"], "error": str(e)}
+    db.release_embedding_migration(claim["user_id"])
+    return report
+
+
+class EmbeddingMigrator:
+    """Background thread that plans migrations and drains them at a bounded rate."""
+
+    def __init__(self, poll_interval: float, plan_interval: float, chunks_per_minute: int) -> None:
+        self.poll_interval = poll_interval
+        self.plan_interval = plan_interval
+        self._bucket = TokenBucket(chunks_per_minute)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._last_plan: float | None = None
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="embedding-migrator", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self._last_plan is None or time.monotonic() - self._last_plan >= self.plan_interval:
+                    self._last_plan = time.monotonic()
+                    plan_migrations()
+                while not self._stop.is_set():
+                    report = process_next(self._bucket)
+                    if report is None or "error" in report:
+                        break
+                MIGRATION_PENDING.set(db.count_documents_to_embed())
+            except Exception:
+                logger.exception("Embedding migrator iteration failed.")
+            self._stop.wait(self.poll_interval)
+
+
+@lru_cache(maxsize=1)
+def get_embedding_migrator() -> EmbeddingMigrator:
+    settings = get_settings()
+    return EmbeddingMigrator(
+        settings.embedding_migration_poll_interval,
+        settings.embedding_migration_plan_interval,
+        settings.embedding_migration_chunks_per_minute,
+    )
@@ -0,0 +1,147 @@
+"""
+Request Micro-Batching Module
+
+Under load, many independent requests call the same model at once: every QA turn
+embeds its sub-questions, and concurrent turns do so in parallel. Each call pays
+its own HTTP round-trip and counts against the provider's request-rate limit.
+
+`MicroBatcher` coalesces those calls without adding latency when the system is
+idle. A caller that finds a free slot sends its item immediately; callers arriving
+while `max_in_flight` calls are already outstanding queue up, and the next free
+caller sends everything queued as one batched request. Batches therefore only form
+when the queue actually backs up.
+
+The chat-completions API has no multi-prompt endpoint, so batching is applied to
+embedding requests (`BatchingEmbeddings`); chat calls instead share a cacheable
+prompt prefix (see `core/agents/prompts.py`).
+"""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, Generic, List, Sequence, Tuple, TypeVar
+
+from langchain_core.embeddings import Embeddings
+
+from ..metrics import Histogram, register
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+BATCH_SIZE = register(Histogram(
+    "intellirag_llm_batch_size",
+    "Items per coalesced provider request.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+))
+
+
+class MicroBatcher(Generic[T, R]):
+    """Coalesces concurrent `submit` calls into batched `batch_fn` calls."""
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[T]], List[R]],
+        *,
+        name: str,
+        max_batch_size: int = 64,
+        max_in_flight: int = 4,
+    ) -> None:
+        self._batch_fn = batch_fn
+        self._name = name
+        self._max_batch_size = max_batch_size
+        self._max_in_flight = max_in_flight
+        self._pending: List[Tuple[T, Future]] = []
+        self._in_flight = 0
+        # Guards the queue and slot count; notified when results land or a slot frees
+        self._cond = threading.Condition(threading.Lock())
+
+    def submit_many(self, items: Sequence[T]) -> List[R]:
+        futures: List[Future] = []
+        with self._cond:
+            for item in items:
+                future: Future = Future()
+                self._pending.append((item, future))
+                futures.append(future)
+
+        while True:
+            with self._cond:
+                if all(f.done() for f in futures):
+                    break
+                # Take a free slot while work is queued; otherwise wait for our results
+                # or for a leader to hand its slot back
+                lead = bool(self._pending) and self._in_flight < self._max_in_flight
+                if lead:
+                    self._in_flight += 1
+                else:
+                    self._cond.wait()
+            if lead:
+                self._drain(futures)
+        return [f.result() for f in futures]
+
+    def submit(self, item: T) -> R:
+        return self.submit_many([item])[0]
+
+    def _drain(self, own: List[Future]) -> None:
+        # The leader sends queued batches (its own and others', oldest first) only
+        # until its own items are answered, then hands the slot to a waiting caller,
+        # so no request thread serves other callers' batches indefinitely.
+        try:
+            while True:
+                with self._cond:
+                    if not self._pending or all(f.done() for f in own):
+                        return
+                    batch = self._pending[: self._max_batch_size]
+                    del self._pending[: self._max_batch_size]
+
+                BATCH_SIZE.observe(len(batch), batcher=self._name)
+                try:
+                    results = self._batch_fn([item for item, _ in batch])
+                    if len(results) != len(batch):
+                        raise RuntimeError(
+                            f"{self._name}: batch of {len(batch)} items returned {len(results)} results"
+                        )
+                except Exception as exc:
+                    for _, future in batch:
+                        future.set_exception(exc)
+                except BaseException as exc:
+                    # Interrupts still propagate, but never strand the batch's callers
+                    for _, future in batch:
+                        future.set_exception(exc)
+                    raise
+                else:
+                    for (_, future), result in zip(batch, results):
+                        future.set_result(result)
+                with self._cond:
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Wraps an embedding client so concurrent query embeddings share API requests.
+
+    Bulk document embedding (ingestion) is already batched by the client and is
+    passed straight through.
+    """
+
+    def __init__(self, inner: Embeddings, max_batch_size: int = 64, max_in_flight: int = 4) -> None:
+        self.inner = inner
+        self._batcher: MicroBatcher[str, List[float]] = MicroBatcher(
+            inner.embed_documents,
+            name="embedding.query",
+            max_batch_size=max_batch_size,
+            max_in_flight=max_in_flight,
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self._batcher.submit_many(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._batcher.submit(text)
@@ -8,13 +8,63 @@ specifics of the model provider (e.g., OpenAI).
 This architectural choice ensures consistent configuration (like model targets and API keys) 
 across the entire LangGraph pipeline and makes swapping providers or mocking the LLM for 
 unit testing incredibly straightforward.
+
+Every agent shares one client per temperature, backed by a single pooled HTTP connection
+pool, and every completion is admitted by the process-wide `LLMScheduler` (RPM/TPM
+budgets, per-tenant fairness, 429 backoff, load shedding).
 """
 
+from functools import lru_cache
+from typing import Any, List, Optional
+
+import httpx
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
 from langchain_openai import ChatOpenAI
 
 from ..config import get_settings
+from ..metrics import usage_callback
+from .scheduler import call_with_retry, estimate_tokens
+
+
+def _total_tokens(result: ChatResult) -> Optional[int]:
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+class ScheduledChatOpenAI(ChatOpenAI):
+    """ChatOpenAI whose requests are admitted by the shared `LLMScheduler`."""
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        generate = super()._generate
+        return call_with_retry(
+            lambda: generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            estimated_tokens=estimate_tokens(messages, get_settings().llm_estimated_completion_tokens),
+            usage=_total_tokens,
+        )
+
+
+@lru_cache(maxsize=1)
+def _get_http_client() -> httpx.Client:
+    """One keep-alive connection pool for every chat client in the process."""
+    settings = get_settings()
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_connections,
+        ),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
 
 
+@lru_cache(maxsize=None)
 def create_chat_model(temperature: float = 0.0) -> ChatOpenAI:
     """
     Instantiates and configures a LangChain ChatOpenAI client.
@@ -34,16 +84,22 @@ def create_chat_model(temperature: float = 0.0) -> ChatOpenAI:
 
     Returns:
         ChatOpenAI: A fully configured LangChain chat model instance ready to be 
-            bound to tools or invoked by our specific graph nodes.
+            bound to tools or invoked by our specific graph nodes. Instances are
+            cached, so all agents share the same client and connection pool.
     """
     # Fetch environment-aware configuration (e.g., loaded from .env or OS env vars).
     # Using a centralized getter ensures we always use validated settings.
     settings = get_settings()
     
     # Initialize the LangChain wrapper with our validated credentials.
-    return ChatOpenAI(
+    return ScheduledChatOpenAI(
         model=settings.openai_model_name,
         api_key=settings.openai_api_key,
         temperature=temperature,
+        http_client=_get_http_client(),
+        # Retries (429s and transient errors) happen in call_with_retry, under the scheduler
+        max_retries=0,
+        # Records prompt/completion tokens and estimated cost per agent
+        callbacks=[usage_callback],
     )
     
\ No newline at end of file
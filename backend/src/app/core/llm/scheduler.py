@@ -0,0 +1,272 @@
+"""
+LLM Request Scheduling Module
+
+All chat-completion calls in the process go through one `LLMScheduler`, which
+keeps traffic inside the account's OpenAI quotas instead of discovering them via
+429 responses:
+
+- Two token buckets, sized to the requests-per-minute and tokens-per-minute limits.
+  Each call reserves one request and an estimate of its tokens; the estimate is
+  reconciled against the provider's reported usage when the call completes.
+- A cap on concurrent in-flight calls.
+- Per-tenant fairness: waiting calls are queued per user and served round-robin,
+  so one tenant's burst cannot starve everyone else.
+- Load shedding: a call that cannot be admitted within `llm_queue_timeout` seconds
+  fails fast with `LLMOverloadedError` rather than piling up behind the quota.
+
+When the provider still answers 429, `call_with_retry` pauses the whole scheduler
+for the advertised `Retry-After` and retries with jittered exponential backoff.
+Transient failures (timeouts, dropped connections, 5xx) get the same backoff but
+do not pause other callers. The OpenAI client's own retries are disabled.
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, Optional, TypeVar
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+from ..config import current_user_id, get_settings
+from ..metrics import Counter, Histogram, current_stage, register
+
+T = TypeVar("T")
+
+LLM_QUEUE_SECONDS = register(Histogram(
+    "intellirag_llm_queue_seconds",
+    "Time LLM calls waited for a scheduler slot.",
+))
+LLM_SHED = register(Counter(
+    "intellirag_llm_shed_total",
+    "LLM calls rejected because the queue wait exceeded the deadline.",
+))
+LLM_RETRIES = register(Counter(
+    "intellirag_llm_retries_total",
+    "LLM calls retried after a provider 429, timeout, connection error or 5xx.",
+))
+
+
+class LLMOverloadedError(RuntimeError):
+    """Raised when an LLM call cannot be scheduled before its queue deadline."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__("LLM capacity exhausted; request shed.")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """A bucket refilled continuously at `capacity` units per minute. Not thread-safe."""
+
+    def __init__(self, capacity: float) -> None:
+        self.capacity = float(capacity)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0.0 if they already are)."""
+        self._refill(now)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= amount
+
+    def refund(self, amount: float) -> None:
+        # Negative refunds (under-estimates) push the level into debt
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _Ticket:
+    __slots__ = ("tenant", "tokens", "seq")
+
+    def __init__(self, tenant: str, tokens: int, seq: int) -> None:
+        self.tenant, self.tokens, self.seq = tenant, tokens, seq
+
+
+class LLMScheduler:
+    """Admits LLM calls under RPM/TPM/concurrency limits with per-tenant round-robin."""
+
+    def __init__(
+        self,
+        rpm: int,
+        tpm: int,
+        max_concurrency: int,
+        queue_timeout: float,
+    ) -> None:
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._max_concurrency = max_concurrency
+        self._queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[_Ticket]] = {}
+        self._last_served: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._served = itertools.count(1)
+        self._in_flight = 0
+        self._paused_until = 0.0
+
+    def _next_tenant(self) -> Optional[str]:
+        # Least-recently-served tenant first; ties go to the oldest waiting call
+        if not self._queues:
+            return None
+        return min(
+            self._queues,
+            key=lambda t: (self._last_served.get(t, 0), self._queues[t][0].seq),
+        )
+
+    def _wait_time(self, ticket: _Ticket, now: float) -> float:
+        queue = self._queues[ticket.tenant]
+        if queue[0] is not ticket or self._next_tenant() != ticket.tenant:
+            return float("inf")  # not our turn; woken when the head is served
+        if self._in_flight >= self._max_concurrency:
+            return float("inf")  # woken by `release`
+        return max(
+            self._paused_until - now,
+            self._requests.wait_time(1, now),
+            self._tokens.wait_time(ticket.tokens, now),
+            0.0,
+        )
+
+    def _remove(self, ticket: _Ticket) -> None:
+        queue = self._queues.get(ticket.tenant)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.tenant]
+
+    def acquire(self, tenant: str, tokens: int) -> _Ticket:
+        """Blocks until the call may proceed, or raises `LLMOverloadedError` at the deadline."""
+        start = time.monotonic()
+        deadline = start + self._queue_timeout
+        ticket = _Ticket(tenant, int(min(tokens, self._tokens.capacity)), next(self._seq))
+
+        with self._cond:
+            self._queues.setdefault(tenant, deque()).append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._wait_time(ticket, now)
+                    if wait <= 0.0:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0.0:
+                        LLM_SHED.inc()
+                        retry_after = wait if wait != float("inf") else self._queue_timeout
+                        raise LLMOverloadedError(retry_after=retry_after)
+                    self._cond.wait(min(wait, remaining))
+            except BaseException:
+                self._remove(ticket)
+                self._cond.notify_all()
+                raise
+
+            self._remove(ticket)
+            self._requests.consume(1, now)
+            self._tokens.consume(ticket.tokens, now)
+            self._in_flight += 1
+            self._last_served[tenant] = next(self._served)
+            self._cond.notify_all()
+
+        LLM_QUEUE_SECONDS.observe(time.monotonic() - start)
+        return ticket
+
+    def release(self, ticket: _Ticket, actual_tokens: Optional[int] = None) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if actual_tokens is not None:
+                self._tokens.refund(ticket.tokens - actual_tokens)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Holds every waiting call for `seconds` (used after a provider 429)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+@lru_cache(maxsize=1)
+def get_llm_scheduler() -> LLMScheduler:
+    settings = get_settings()
+    # Quotas are per account: each worker gets an equal share
+    workers = max(1, settings.web_concurrency)
+    return LLMScheduler(
+        rpm=max(1, settings.llm_rpm_limit // workers),
+        tpm=max(1, settings.llm_tpm_limit // workers),
+        max_concurrency=settings.llm_max_concurrency,
+        queue_timeout=settings.llm_queue_timeout,
+    )
+
+
+def _retry_after(exc: RateLimitError) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# Worth retrying; APITimeoutError is an APIConnectionError
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+
+def call_with_retry(
+    fn: Callable[[], T],
+    estimated_tokens: int,
+    usage: Callable[[T], Optional[int]] = lambda _: None,
+) -> T:
+    """
+    Runs one provider call under the scheduler, retrying 429s and transient
+    failures with backoff.
+
+    Args:
+        fn: Performs the actual request.
+        estimated_tokens: Prompt + expected completion tokens reserved up front.
+        usage: Extracts the real total token count from the result for reconciliation.
+    """
+    settings = get_settings()
+    scheduler = get_llm_scheduler()
+    tenant = current_user_id.get() or "anonymous"
+
+    for attempt in range(settings.llm_max_retries + 1):
+        ticket = scheduler.acquire(tenant, estimated_tokens)
+        try:
+            result = fn()
+        except RETRYABLE_ERRORS as exc:
+            scheduler.release(ticket)
+            if attempt == settings.llm_max_retries:
+                raise
+            # Full jitter keeps retries from re-synchronizing into another burst
+            backoff = random.uniform(0, min(30.0, settings.llm_retry_base_delay * 2 ** attempt))
+            # Only a 429 is about the shared quota; other failures pause just this call
+            server_hint = _retry_after(exc) if isinstance(exc, RateLimitError) else None
+            if server_hint is not None:
+                scheduler.pause(server_hint)
+            LLM_RETRIES.inc(agent=current_stage.get())
+            time.sleep(max(backoff, server_hint or 0.0))
+            continue
+        except BaseException:
+            scheduler.release(ticket)
+            raise
+
+        scheduler.release(ticket, actual_tokens=usage(result))
+        return result
+
+    raise AssertionError("unreachable")
+
+
+def estimate_tokens(messages: Any, completion_tokens: int) -> int:
+    """Cheap up-front estimate (~4 characters per token) used for TPM reservations."""
+    chars = sum(len(str(getattr(m, "content", m))) for m in messages)
+    return chars // 4 + completion_tokens
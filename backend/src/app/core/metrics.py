@@ -0,0 +1,303 @@
+"""
+Instrumentation Module
+
+A small, dependency-free metrics layer cheap enough to leave on in production.
+It feeds two consumers:
+
+1. A process-wide registry of counters and histograms rendered in the Prometheus
+   text exposition format by the `/metrics` endpoint.
+2. An optional per-request `timings` block. Like `current_user_id`, the active
+   collector lives in a ContextVar, so deeply nested code (graph nodes, retrieval,
+   DB helpers) can record into it without threading a parameter through every call.
+
+Recording costs one `perf_counter()` pair and a dict update under a lock. While
+`tracemalloc` is tracing (the offline benchmarks' `--trace-allocations`), `timed`
+also records each stage's net traced allocation delta.
+"""
+
+from __future__ import annotations
+
+import inspect
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Latency buckets in seconds, spanning sub-millisecond cache hits to multi-second LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name, self.help_text = name, help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return "\n".join(lines)
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> str:
+        return super().render().replace(f"# TYPE {self.name} counter", f"# TYPE {self.name} gauge")
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name, self.help_text, self.buckets = name, help_text, buckets
+        # label key -> [bucket counts..., sum, count]
+        self._values: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, row in self._values.items():
+                for bound, count in zip(self.buckets, row):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_format_labels(key, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {row[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {row[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {row[-1]}")
+        return "\n".join(lines)
+
+
+# ==============================================================================
+# Registry
+# ==============================================================================
+
+STAGE_SECONDS = Histogram("intellirag_stage_seconds", "Wall time per pipeline stage (graph node, retrieval, embedding, db).")
+HTTP_REQUEST_SECONDS = Histogram("intellirag_http_request_seconds", "HTTP request latency by route and status.")
+LLM_TOKENS = Counter("intellirag_llm_tokens_total", "LLM tokens by agent and kind (prompt/cached_prompt/completion).")
+LLM_COST_USD = Counter("intellirag_llm_cost_usd_total", "Estimated LLM spend in USD by agent.")
+RETRIEVAL_HITS = Counter("intellirag_retrieval_hits_total", "Chunks returned by vector searches.")
+CACHE_REQUESTS = Counter("intellirag_cache_requests_total", "Cache lookups by cache name and result (hit/miss).")
+NEAR_DUPLICATES = Counter("intellirag_near_duplicates_total", "Near-duplicate chunks dropped, by stage (ingest/query).")
+
+_REGISTRY = [
+    STAGE_SECONDS, HTTP_REQUEST_SECONDS, LLM_TOKENS, LLM_COST_USD, RETRIEVAL_HITS, CACHE_REQUESTS, NEAR_DUPLICATES,
+]
+
+
+def register(metric: Any) -> Any:
+    """Adds a metric defined elsewhere to the `/metrics` exposition."""
+    _REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    return "\n".join(m.render() for m in _REGISTRY) + "\n"
+
+
+# ==============================================================================
+# Per-request collection
+# ==============================================================================
+
+class RequestTimings:
+    """Accumulates the `timings` block for a single request."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self.llm: Dict[str, Dict[str, float]] = {}
+        # Net traced bytes per stage; only filled while tracemalloc is tracing
+        self.allocations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float, allocated: Optional[int] = None) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            if allocated is not None:
+                self.allocations[stage] = self.allocations.get(stage, 0) + allocated
+
+    def add_llm(self, agent: str, **amounts: float) -> None:
+        with self._lock:
+            row = self.llm.setdefault(agent, {})
+            for k, v in amounts.items():
+                row[k] = row.get(k, 0) + v
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {
+                "stages": {k: round(v, 4) for k, v in self.stages.items()},
+                "llm": {agent: dict(row) for agent, row in self.llm.items()},
+            }
+            if self.allocations:
+                out["allocations"] = dict(self.allocations)
+            return out
+
+
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+# The graph node currently executing; used to attribute LLM usage to an agent
+current_stage: ContextVar[str] = ContextVar("current_stage", default="unknown")
+
+# The request profile being captured, if any (see `core.profiling`)
+current_profile: ContextVar[Optional[Any]] = ContextVar("current_profile", default=None)
+
+
+@contextmanager
+def collect_timings() -> Iterator[RequestTimings]:
+    timings = RequestTimings()
+    token = current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        current_timings.reset(token)
+
+
+def record_stage(stage: str, seconds: float, allocated: Optional[int] = None, **labels: Any) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage, **labels)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add_stage(stage, seconds, allocated)
+
+
+@contextmanager
+def timed(stage: str, **labels: Any) -> Iterator[None]:
+    profile = current_profile.get()
+    lane = profile.enter() if profile is not None else None
+    # Process-wide counter: concurrent requests' allocations land in the delta too
+    traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        allocated = None
+        if traced is not None and tracemalloc.is_tracing():
+            allocated = tracemalloc.get_traced_memory()[0] - traced
+        record_stage(stage, end - start, allocated, **labels)
+        if profile is not None:
+            profile.exit(lane, stage, start, end)
+
+
+def instrumented(stage: str) -> Callable:
+    """Decorator form of `timed` for plain functions and coroutines (e.g. DB helpers)."""
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with timed(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_node(name: str, fn: Callable) -> Callable:
+    """Wraps a graph node so its wall time and LLM usage are attributed to `name`."""
+    @wraps(fn)
+    def wrapper(state: Any) -> Any:
+        token = current_stage.set(name)
+        try:
+            with timed(f"node.{name}"):
+                return fn(state)
+        finally:
+            current_stage.reset(token)
+    return wrapper
+
+
+def record_cache(cache: str, hit: bool, count: int = 1) -> None:
+    CACHE_REQUESTS.inc(count, cache=cache, result="hit" if hit else "miss")
+
+
+# ==============================================================================
+# LLM usage
+# ==============================================================================
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """LangChain callback that records token usage and estimated cost per agent."""
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        from .config import get_settings
+
+        prompt_tokens = cached_tokens = completion_tokens = 0
+        for generations in response.generations or []:
+            for gen in generations:
+                usage = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+                # Prompt tokens served from the provider's prefix cache (subset of input_tokens)
+                cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+
+        if not (prompt_tokens or completion_tokens):
+            return
+
+        settings = get_settings()
+        cost = (
+            (prompt_tokens - cached_tokens) * settings.llm_prompt_price_per_million
+            + cached_tokens * settings.llm_cached_prompt_price_per_million
+            + completion_tokens * settings.llm_completion_price_per_million
+        ) / 1_000_000
+
+        agent = current_stage.get()
+        LLM_TOKENS.inc(prompt_tokens, agent=agent, kind="prompt")
+        LLM_TOKENS.inc(cached_tokens, agent=agent, kind="cached_prompt")
+        LLM_TOKENS.inc(completion_tokens, agent=agent, kind="completion")
+        LLM_COST_USD.inc(cost, agent=agent)
+
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add_llm(
+                agent,
+                prompt_tokens=prompt_tokens,
+                cached_prompt_tokens=cached_tokens,
+                completion_tokens=completion_tokens,
+                cost_usd=round(cost, 6),
+            )
+
+
+usage_callback = UsageCallbackHandler()
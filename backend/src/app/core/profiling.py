@@ -0,0 +1,392 @@
+"""
+Request Profiling Module
+
+Stage timings say *which* stage of a slow request took long, not *why*: regex
+parsing in a graph node, string building while serializing chunks, pydantic
+validation and waiting on I/O all look the same from outside. This module captures
+one /qa or /index-pdf call in full, on demand:
+
+- a wall-clock stack profile: while the request is being profiled, a sampler
+  thread reads the stacks (`sys._current_frames()`) of the threads doing its
+  work every `PROFILING_INTERVAL_MS`. Threadpool and graph threads count as the
+  request's while they are inside one of its `timed` stages; the event-loop
+  thread counts while the running asyncio task belongs to the request (the task
+  that started the profile, or any task that has entered one of its stages);
+- a task timeline: every `timed` stage becomes a span on the lane (asyncio task or
+  thread) that ran it.
+
+A profile is taken when the caller sends `X-Profile: 1` with the `X-Admin-Key`
+(ignored while `ADMIN_KEY` is unset) or for `PROFILING_SAMPLE_PERCENT` of
+requests. It is written as a speedscope file (https://www.speedscope.app) plus
+folded stacks for `flamegraph.pl`; both are served by `GET /admin/profiles/{id}`,
+which also needs the admin key.
+
+With `PROFILING_ENABLED` off, or for requests that are not sampled, nothing
+runs: no sampler thread exists and `timed` only pays one ContextVar lookup.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter as TallyCounter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import current_user_id, get_settings
+from .metrics import Counter, current_profile, register
+
+logger = logging.getLogger(__name__)
+
+PROFILES = register(Counter("intellirag_profiles_total", "Requests profiled, by route."))
+
+PROFILED_ROUTES = ("/qa", "/index-pdf")
+MAX_STACK_DEPTH = 128
+LOOP_LANE = "event-loop"
+
+_PROFILE_ID = re.compile(r"^[0-9A-Za-z-]+$")
+
+FrameKey = Tuple[str, str, int]
+
+
+class RequestProfile:
+    """Samples and spans collected for one request."""
+
+    def __init__(self, route: str) -> None:
+        self.started_at = time.time()
+        # Sortable by start time (UTC, milliseconds), which is how listings order them
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(self.started_at))
+        self.id = f"{stamp}{int(self.started_at * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}"
+        self.route = route
+        self.user_id = ""
+        self.status: Optional[int] = None
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.truncated = False
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+
+        self.frames: List[FrameKey] = []
+        self._frame_ids: Dict[FrameKey, int] = {}
+        # lane -> [(seconds since start, weight, frame IDs root first)]
+        self.samples: Dict[str, List[Tuple[float, float, Tuple[int, ...]]]] = {}
+        # (lane, stage, start, end) in perf_counter seconds
+        self.spans: List[Tuple[str, str, float, float]] = []
+        # Threads currently inside one of this request's stages, with their nesting depth
+        self._depth: Dict[int, int] = {}
+        self._thread_names: Dict[int, str] = {}
+        # asyncio tasks working for this request, so loop samples from concurrent
+        # requests are not mixed (Task.get_context() only exists from Python 3.12)
+        self._tasks: weakref.WeakSet = weakref.WeakSet()
+        task = asyncio.current_task()
+        if task is not None:
+            self._tasks.add(task)
+        self._lock = threading.Lock()
+        self._token: Any = None
+
+    # ------------------------------------------------------------------
+    # Recording (called from `metrics.timed` in the request's context)
+    # ------------------------------------------------------------------
+
+    def enter(self) -> str:
+        """Marks the calling thread or task as working for this request; returns its lane."""
+        if not self.user_id:
+            self.user_id = current_user_id.get()
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            with self._lock:
+                self._tasks.add(task)
+            return task.get_name()
+        ident = threading.get_ident()
+        # Pool threads share one name ("AnyIO worker thread"); lanes must not
+        name = f"{threading.current_thread().name} {ident}"
+        with self._lock:
+            self._depth[ident] = self._depth.get(ident, 0) + 1
+            self._thread_names[ident] = name
+        return name
+
+    def exit(self, lane: str, stage: str, start: float, end: float) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            self.spans.append((lane, stage, start, end))
+            if ident in self._depth:
+                self._depth[ident] -= 1
+                if not self._depth[ident]:
+                    del self._depth[ident]
+
+    # ------------------------------------------------------------------
+    # Sampling (called from the sampler thread)
+    # ------------------------------------------------------------------
+
+    def _owns_loop(self) -> bool:
+        task = asyncio.current_task(self.loop)
+        if task is None:
+            return False
+        if task in self._tasks:
+            return True
+        # On 3.12+ the task's context also covers tasks that have not entered a stage yet
+        get_context = getattr(task, "get_context", None)
+        return get_context is not None and get_context().get(current_profile) is self
+
+    def _frame_id(self, key: FrameKey) -> int:
+        index = self._frame_ids.get(key)
+        if index is None:
+            index = self._frame_ids[key] = len(self.frames)
+            self.frames.append(key)
+        return index
+
+    def _stack(self, frame: Any) -> Tuple[int, ...]:
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            stack.append(self._frame_id((getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def sample(self, frames: Dict[int, Any], now: float, weight: float) -> None:
+        with self._lock:
+            # A sampler tick may race with `stop_profile`; the stopped profile is final
+            if self.end is not None:
+                return
+            if now - self.start > get_settings().profiling_max_seconds:
+                self.truncated = True
+                return
+            lanes = [(ident, self._thread_names[ident]) for ident in self._depth if ident != self.loop_thread]
+            if self._owns_loop():
+                lanes.append((self.loop_thread, LOOP_LANE))
+            at = now - self.start
+            for ident, lane in lanes:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples.setdefault(lane, []).append((at, weight, self._stack(frame)))
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "route": self.route,
+            "user_id": self.user_id,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_seconds": round((self.end or time.perf_counter()) - self.start, 4),
+            "samples": sum(len(s) for s in self.samples.values()),
+            "spans": len(self.spans),
+            "truncated": self.truncated,
+        }
+
+    def to_speedscope(self) -> Dict[str, Any]:
+        """One sampled profile per lane, then one evented timeline per lane."""
+        duration = (self.end or time.perf_counter()) - self.start
+        frames = [{"name": name, "file": file, "line": line} for name, file, line in self.frames]
+        stage_frames: Dict[str, int] = {}
+
+        def stage_frame(stage: str) -> int:
+            if stage not in stage_frames:
+                stage_frames[stage] = len(frames)
+                frames.append({"name": stage})
+            return stage_frames[stage]
+
+        profiles = []
+        for lane, samples in sorted(self.samples.items()):
+            profiles.append({
+                "type": "sampled",
+                "name": f"{lane} (stacks)",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": duration,
+                "samples": [list(stack) for _, _, stack in samples],
+                "weights": [weight for _, weight, _ in samples],
+            })
+
+        by_lane: Dict[str, List[Tuple[str, float, float]]] = {}
+        for lane, stage, start, end in self.spans:
+            by_lane.setdefault(lane, []).append((stage, start - self.start, end - self.start))
+        for lane, spans in sorted(by_lane.items()):
+            profiles.append({
+                "type": "evented",
+                "name": f"{lane} (timeline)",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": duration,
+                "events": _nested_events(spans, stage_frame),
+            })
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.route} {self.id}",
+            "exporter": "intellirag",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def to_folded(self) -> str:
+        """Folded stacks ("lane;outer;inner count") for flamegraph.pl / inferno."""
+        tally: TallyCounter = TallyCounter()
+        for lane, samples in self.samples.items():
+            for _, _, stack in samples:
+                tally[";".join([lane] + [self.frames[i][0] for i in stack])] += 1
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(tally.items()))
+
+
+def _nested_events(spans: List[Tuple[str, float, float]], frame_of: Any) -> List[Dict[str, Any]]:
+    """Open/close events for spans on one lane, clamped so they nest properly."""
+    events: List[Dict[str, Any]] = []
+    stack: List[Tuple[float, int]] = []
+    for stage, start, end in sorted(spans, key=lambda s: (s[1], -s[2])):
+        while stack and stack[-1][0] <= start:
+            closed_at, frame = stack.pop()
+            events.append({"type": "C", "frame": frame, "at": closed_at})
+        if stack:
+            end = min(end, stack[-1][0])
+        frame = frame_of(stage)
+        events.append({"type": "O", "frame": frame, "at": start})
+        stack.append((end, frame))
+    while stack:
+        closed_at, frame = stack.pop()
+        events.append({"type": "C", "frame": frame, "at": closed_at})
+    return events
+
+
+# ==============================================================================
+# Sampler
+# ==============================================================================
+
+_active: List[RequestProfile] = []
+_active_lock = threading.Lock()
+_sampler: Optional[threading.Thread] = None
+
+
+def _sample_loop() -> None:
+    global _sampler
+    interval = get_settings().profiling_interval_ms / 1000
+    last = time.perf_counter()
+    while True:
+        time.sleep(interval)
+        with _active_lock:
+            profiles = list(_active)
+            if not profiles:
+                # Exit with the last profile; the next one starts a new thread
+                _sampler = None
+                return
+        now = time.perf_counter()
+        weight, last = now - last, now
+        frames = sys._current_frames()
+        for profile in profiles:
+            try:
+                profile.sample(frames, now, weight)
+            except Exception:
+                logger.exception("Profile sampling failed for %s", profile.id)
+        del frames
+
+
+def start_profile(route: str, requested: bool = False) -> Optional[RequestProfile]:
+    """
+    Starts profiling the current request when it is requested or sampled.
+
+    Must be called from the request's task, before the route runs: the profile is
+    bound to the current context so that the route and its threadpool calls see it.
+
+    Returns:
+        Optional[RequestProfile]: The profile, or None when this request is not profiled.
+    """
+    global _sampler
+    settings = get_settings()
+    if not settings.profiling_enabled or route not in PROFILED_ROUTES:
+        return None
+    if not requested and random.random() * 100 >= settings.profiling_sample_percent:
+        return None
+
+    profile = RequestProfile(route)
+    with _active_lock:
+        # Bound the overhead: extra sampled requests simply run unprofiled
+        if len(_active) >= settings.profiling_max_concurrent:
+            return None
+        _active.append(profile)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="request-profiler", daemon=True)
+            _sampler.start()
+    profile._token = current_profile.set(profile)
+    PROFILES.inc(route=route)
+    return profile
+
+
+def stop_profile(profile: RequestProfile, status: int) -> None:
+    """Stops sampling the request. Call from the context that started it."""
+    with profile._lock:
+        profile.end = time.perf_counter()
+        profile.status = status
+    with _active_lock:
+        if profile in _active:
+            _active.remove(profile)
+    current_profile.reset(profile._token)
+
+
+# ==============================================================================
+# Storage
+# ==============================================================================
+
+def _profile_dir() -> Path:
+    return Path(get_settings().profiling_path)
+
+
+def save_profile(profile: RequestProfile) -> None:
+    """Writes the speedscope, folded-stack and metadata files and prunes old profiles."""
+    directory = _profile_dir()
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"{profile.id}.speedscope.json").write_text(json.dumps(profile.to_speedscope()))
+        (directory / f"{profile.id}.folded").write_text(profile.to_folded())
+        # Metadata last: listings only show complete profiles
+        (directory / f"{profile.id}.json").write_text(json.dumps(profile.metadata()))
+
+        keep = get_settings().profiling_keep_last
+        stale = sorted(directory.glob("*.json"), key=lambda p: p.name, reverse=True)
+        for meta in [p for p in stale if not p.name.endswith(".speedscope.json")][keep:]:
+            profile_id = meta.name[: -len(".json")]
+            for suffix in (".json", ".speedscope.json", ".folded"):
+                (directory / f"{profile_id}{suffix}").unlink(missing_ok=True)
+    except OSError:
+        logger.exception("Could not save profile %s", profile.id)
+
+
+def list_profiles(limit: int = 50) -> List[Dict[str, Any]]:
+    """Metadata of the most recent profiles, newest first."""
+    directory = _profile_dir()
+    if not directory.is_dir():
+        return []
+    metas = sorted(
+        (p for p in directory.glob("*.json") if not p.name.endswith(".speedscope.json")),
+        key=lambda p: p.name,
+        reverse=True,
+    )
+    out = []
+    for meta in metas[:limit]:
+        try:
+            out.append(json.loads(meta.read_text()))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def profile_file(profile_id: str, fmt: str = "speedscope") -> Optional[Path]:
+    """Path of a stored profile in "speedscope" or "folded" format, or None."""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    suffix = ".speedscope.json" if fmt == "speedscope" else ".folded"
+    path = _profile_dir() / f"{profile_id}{suffix}"
+    return path if path.is_file() else None
@@ -0,0 +1,201 @@
+"""
+Compact Chunk Store Module
+
+Chunk text used to travel inside the vector index's metadata, so every query
+response carried the full text of every match, and the index paid for it in
+metadata storage. With parent-child retrieval the vector index only holds small
+child chunks' embeddings; their text and the larger parent sections they belong to
+live here:
+
+- `chunks.dat`: an append-only file of JSON records, read through `mmap`.
+- `chunks.idx`: an append-only text index of `key<TAB>offset<TAB>length` lines.
+  Later lines win; a length of -1 is a deletion marker.
+
+Child records are keyed by vector ID (`{doc_key}#{n}`) and point at their parent
+(`{doc_key}#p{n}`), so deleting a document is a prefix delete. Several worker
+processes can share one store: appends take an exclusive `flock`, readers tail the
+index on a miss, and `compact` swaps in fresh files that readers detect by inode.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: single process, the thread lock suffices
+    fcntl = None
+
+from ..config import get_settings
+
+_DELETED = -1
+
+
+class ChunkStore:
+    def __init__(self, path: str) -> None:
+        self._dir = Path(path)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._data_path = self._dir / "chunks.dat"
+        self._index_path = self._dir / "chunks.idx"
+        self._lock_path = self._dir / "chunks.lock"
+        for p in (self._data_path, self._index_path, self._lock_path):
+            p.touch(exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._index_pos = 0
+        self._garbage = 0
+        self._inode = None
+        self._mmap: mmap.mmap | None = None
+        self._mapped_size = 0
+        self._reload()
+
+    # ------------------------------------------------------------------
+    # Index / mapping maintenance
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False) -> Iterator[None]:
+        with open(self._lock_path, "rb") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload(self) -> None:
+        self._offsets, self._index_pos, self._garbage = {}, 0, 0
+        self._inode = os.stat(self._data_path).st_ino
+        self._unmap()
+        self._tail_index()
+
+    def _tail_index(self) -> None:
+        """Applies index lines appended (by any process) since the last read."""
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_pos)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # a writer is mid-append; pick it up next time
+                self._index_pos += len(line)
+                key, offset, length = line.decode("utf-8").rstrip("\n").split("\t")
+                if key in self._offsets:
+                    self._garbage += 1
+                if int(length) == _DELETED:
+                    self._offsets.pop(key, None)
+                else:
+                    self._offsets[key] = (int(offset), int(length))
+
+    def _unmap(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap, self._mapped_size = None, 0
+
+    def _view(self, end: int) -> mmap.mmap:
+        if self._mmap is None or end > self._mapped_size:
+            self._unmap()
+            with open(self._data_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                self._mmap = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self._mapped_size = size
+        return self._mmap
+
+    def _check_generation(self) -> None:
+        # `compact` in another process replaces the files; the old offsets are void
+        if os.stat(self._data_path).st_ino != self._inode:
+            self._reload()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def put_many(self, records: Dict[str, dict]) -> None:
+        if not records:
+            return
+        with self._lock, self._file_lock():
+            self._check_generation()
+            lines: List[str] = []
+            with open(self._data_path, "ab") as data:
+                offset = data.seek(0, os.SEEK_END)
+                for key, record in records.items():
+                    blob = json.dumps(record, ensure_ascii=False).encode("utf-8")
+                    data.write(blob)
+                    lines.append(f"{key}\t{offset}\t{len(blob)}\n")
+                    offset += len(blob)
+            with open(self._index_path, "a", encoding="utf-8") as index:
+                index.write("".join(lines))
+            self._tail_index()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        keys = list(keys)
+        # A shared lock keeps `compact` from swapping files between the index and data reads
+        with self._lock, self._file_lock(shared=True):
+            self._check_generation()
+            if any(k not in self._offsets for k in keys):
+                self._tail_index()
+            return self._read(keys)
+
+    def _read(self, keys: List[str]) -> Dict[str, dict]:
+        found = [(k, self._offsets[k]) for k in keys if k in self._offsets]
+        if not found:
+            return {}
+        view = self._view(max(offset + length for _, (offset, length) in found))
+        return {k: json.loads(view[offset : offset + length]) for k, (offset, length) in found}
+
+    def get_prefix(self, prefix: str) -> Dict[str, dict]:
+        """Every live record whose key starts with `prefix` (one document's chunks)."""
+        with self._lock, self._file_lock(shared=True):
+            self._check_generation()
+            self._tail_index()
+            return self._read([k for k in self._offsets if k.startswith(prefix)])
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock, self._file_lock():
+            self._check_generation()
+            self._tail_index()
+            doomed = [k for k in self._offsets if k.startswith(prefix)]
+            if doomed:
+                with open(self._index_path, "a", encoding="utf-8") as index:
+                    index.write("".join(f"{k}\t0\t{_DELETED}\n" for k in doomed))
+                self._tail_index()
+            return len(doomed)
+
+    @property
+    def garbage_ratio(self) -> float:
+        total = len(self._offsets) + self._garbage
+        return self._garbage / total if total else 0.0
+
+    def compact(self) -> int:
+        """Rewrites only the live records. Returns the number of records kept."""
+        with self._lock, self._file_lock():
+            self._check_generation()
+            self._tail_index()
+            live = self._read(list(self._offsets))
+            tmp_data = self._dir / "chunks.dat.tmp"
+            tmp_index = self._dir / "chunks.idx.tmp"
+            lines: List[str] = []
+            with open(tmp_data, "wb") as data:
+                offset = 0
+                for key, record in live.items():
+                    blob = json.dumps(record, ensure_ascii=False).encode("utf-8")
+                    data.write(blob)
+                    lines.append(f"{key}\t{offset}\t{len(blob)}\n")
+                    offset += len(blob)
+            tmp_index.write_text("".join(lines), encoding="utf-8")
+            os.replace(tmp_index, self._index_path)
+            os.replace(tmp_data, self._data_path)
+            self._reload()
+            return len(live)
+
+
+@lru_cache(maxsize=1)
+def get_chunk_store() -> ChunkStore:
+    return ChunkStore(get_settings().chunk_store_path)
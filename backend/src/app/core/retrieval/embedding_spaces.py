@@ -0,0 +1,112 @@
+"""
+Embedding Namespace Module
+
+Vectors produced by different embedding models, or by the same model at another
+dimension, live in different spaces: a query embedded with one cannot be compared
+with documents embedded with the other. Each embedding version ("model@dimension")
+therefore gets its own vector namespace (a Pinecone namespace on the same index, a
+subdirectory for the local store). The default namespace "" holds the vectors
+written before versions existed.
+
+Every tenant reads from exactly one namespace (its active one) and may be migrating
+to a target. The background migrator (`core.embedding_migration`) re-embeds a
+tenant's chunks into the target, then switches the active namespace atomically in
+the metadata store; until the dual-read window closes, searches are topped up
+from the previous namespace.
+"""
+
+from __future__ import annotations
+
+import json
+from functools import lru_cache
+from typing import Dict, NamedTuple, Tuple
+
+from .. import db
+from ..cache import cache_get, cache_set, get_cache
+from ..config import get_settings
+
+DEFAULT_NAMESPACE = ""
+
+
+class TenantSpaces(NamedTuple):
+    """A tenant's namespaces: where it reads, where new documents go, what it is leaving."""
+
+    read: str
+    target: str | None
+    previous: str | None
+
+    @property
+    def write(self) -> Tuple[str, ...]:
+        """Namespaces every new document is indexed into (dual-write during a migration)."""
+        return (self.read,) if self.target in (None, self.read) else (self.read, self.target)
+
+    @property
+    def all(self) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(ns for ns in (self.read, self.target, self.previous) if ns is not None))
+
+
+@lru_cache(maxsize=1)
+def namespace_versions() -> Dict[str, str]:
+    """Registered namespace -> version. Cached per process; namespaces are never renamed."""
+    versions = db.get_embedding_namespaces()
+    versions.setdefault(DEFAULT_NAMESPACE, get_settings().legacy_embedding_version or get_settings().embedding_version)
+    return versions
+
+
+def version_for(namespace: str) -> str:
+    """The embedding version a namespace holds; unregistered namespaces are named after theirs."""
+    return namespace_versions().get(namespace, namespace)
+
+
+def namespace_for(version: str) -> str:
+    """The namespace vectors of `version` are written to (the default one if it already holds them)."""
+    return DEFAULT_NAMESPACE if version_for(DEFAULT_NAMESPACE) == version else version
+
+
+def parse_version(version: str) -> Tuple[str, int]:
+    """Splits "model@dimension"."""
+    model, _, dim = version.rpartition("@")
+    if not model or not dim.isdigit():
+        raise ValueError(f"Malformed embedding version '{version}' (expected model@dimension).")
+    return model, int(dim)
+
+
+def current_namespace() -> str:
+    """Namespace of the configured embedding version, registered on first use."""
+    version = get_settings().embedding_version
+    namespace = namespace_for(version)
+    if namespace not in namespace_versions():
+        db.register_embedding_namespace(namespace, version)
+        namespace_versions.cache_clear()
+    return namespace
+
+
+def tenant_spaces(user_id: str | None) -> TenantSpaces:
+    """
+    Resolves a tenant's namespaces. Tenants the migrator has not touched read from
+    the namespace their documents are in; tenants without documents start directly
+    in the configured version.
+    """
+    if not user_id:
+        return TenantSpaces(current_namespace(), None, None)
+    blob = cache_get("embedding_spaces", user_id)
+    if blob is not None:
+        return TenantSpaces(*json.loads(blob))
+
+    row = db.get_tenant_embedding(user_id) or {}
+    if row.get("active_namespace") is not None:
+        spaces = TenantSpaces(row["active_namespace"], row["target_namespace"], row["previous_namespace"])
+    elif row.get("document_namespace") is not None:
+        spaces = TenantSpaces(row["document_namespace"], None, None)
+    else:
+        spaces = TenantSpaces(current_namespace(), None, None)
+    cache_set(
+        "embedding_spaces", user_id, json.dumps(list(spaces)).encode(),
+        ttl=get_settings().embedding_namespace_cache_ttl,
+    )
+    return spaces
+
+
+def invalidate_tenant_spaces(user_id: str) -> None:
+    """Drops the cached namespaces after a migration is planned, switched or finished."""
+    get_cache().delete(f"embedding_spaces:{user_id}")
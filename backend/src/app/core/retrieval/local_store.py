@@ -0,0 +1,552 @@
+"""
+Local Quantized Vector Store Module
+
+An offline alternative to Pinecone for local development, air-gapped deployments
+and tests. Vectors are kept in two tiers:
+
+1. Quantized codes (int8 or 1-bit) held in RAM and scanned for every query.
+2. The original float32 vectors, memory-mapped from disk and read only for the
+   small shortlist of candidates that get re-scored exactly.
+
+The store speaks the same metadata filter dialect as Pinecone (`{"user_id": ...}`,
+`{"source": {"$in": [...]}}`) so the multi-tenant filtering in `vector_store.py`
+works unchanged regardless of backend.
+
+On disk, a store is append-only, so an upsert costs what it writes and not the
+size of the corpus:
+
+- `vectors.f32`: raw float32 rows, appended.
+- `records.log`: one JSON line per operation (add, delete, metadata update). A row
+  is live once the "add" line naming it is complete; deletions only mask rows.
+
+Several worker processes can share one store, as with the chunk store: writes take
+an exclusive `flock`, every operation first applies the log lines other processes
+appended, and `compact` (run once most rows are dead, and by `reproject`) swaps in
+fresh files that the other processes detect by inode.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: single process, the thread lock suffices
+    fcntl = None
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from .quantization import (
+    QUANTIZATION_MODES,
+    hamming_scores,
+    int8_scores,
+    quantize_binary,
+    quantize_int8,
+    truncate_and_normalize,
+)
+
+# Compact once dead rows outnumber live ones (and are worth a rewrite)
+COMPACT_MIN_DEAD_ROWS = 1024
+
+
+def _match_condition(value: Any, condition: Any) -> bool:
+    if isinstance(condition, dict):
+        for op, operand in condition.items():
+            if op == "$eq" and value != operand:
+                return False
+            if op == "$ne" and value == operand:
+                return False
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+        return True
+    return value == condition
+
+
+def matches_filter(metadata: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    """Evaluates a Pinecone-style metadata filter against a metadata dict."""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif not _match_condition(metadata.get(key), condition):
+            return False
+    return True
+
+
+class LocalVectorStore(VectorStore):
+    """
+    A numpy-backed vector store with quantized scanning and float re-scoring.
+
+    Args:
+        embedding (Embeddings): The embedding model used for queries and `add_texts`.
+        path (str | None): Directory used for persistence. `None` keeps everything in memory.
+        quantization (str): One of "none", "int8" or "binary".
+        rescore_factor (int): How many quantized candidates to shortlist per requested
+            result before exact float re-scoring (k * rescore_factor).
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        *,
+        path: str | None = None,
+        quantization: str = "int8",
+        rescore_factor: int = 4,
+    ) -> None:
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {quantization}")
+
+        self._embedding = embedding
+        self._path = Path(path) if path else None
+        self._quantization = quantization
+        self._rescore_factor = max(1, rescore_factor)
+        self._lock = threading.RLock()
+        self._reset()
+
+        if self._path is not None:
+            self._path.mkdir(parents=True, exist_ok=True)
+            self._vectors_path = self._path / "vectors.f32"
+            self._log_path = self._path / "records.log"
+            self._lock_path = self._path / "vectors.lock"
+            self._lock_path.touch(exist_ok=True)
+            with self._lock, self._file_lock():
+                if not self._log_path.exists():
+                    self._import_legacy()
+                self._vectors_path.touch(exist_ok=True)
+                self._log_path.touch(exist_ok=True)
+                self._tail_log()
+
+    def _reset(self) -> None:
+        # Per row (dead rows keep their slot until `compact`); `_row` maps live IDs
+        self._ids: List[str | None] = []
+        self._texts: List[str | None] = []
+        self._metadatas: List[Dict[str, Any] | None] = []
+        self._row: Dict[str, int] = {}
+        self._dim: int | None = None
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._codes: np.ndarray | None = None
+        self._scales: np.ndarray | None = None
+        self._log_pos = 0
+        self._inode = None
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False) -> Iterator[None]:
+        if self._path is None:
+            yield
+            return
+        with open(self._lock_path, "rb") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """Applies what other processes wrote; call under `_lock` and the file lock."""
+        if self._path is None:
+            return
+        stat = os.stat(self._log_path)
+        if stat.st_ino != self._inode:
+            # Another process compacted the store; row numbers changed
+            self._reset()
+            self._tail_log()
+        elif stat.st_size > self._log_pos:
+            self._tail_log()
+
+    def _tail_log(self) -> None:
+        with open(self._log_path, "rb") as f:
+            self._inode = os.fstat(f.fileno()).st_ino
+            f.seek(self._log_pos)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # a writer is mid-append; pick it up next time
+                self._log_pos += len(line)
+                self._apply(json.loads(line))
+
+    def _map_vectors(self, rows: int) -> None:
+        if self._vectors.shape[0] >= rows:
+            return
+        row_bytes = self._dim * 4
+        available = os.stat(self._vectors_path).st_size // row_bytes
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(available, self._dim))
+
+    def _apply(self, op: Dict[str, Any], vectors: np.ndarray | None = None) -> None:
+        kind = op["op"]
+        if kind == "dim":
+            self._dim = op["dim"]
+        elif kind == "add":
+            start, ids = op["start"], op["ids"]
+            end = start + len(ids)
+            if vectors is None:
+                # Float rows stay on disk; only the new ones are read, to quantize them
+                self._map_vectors(end)
+                vectors = np.asarray(self._vectors[start:end])
+            else:
+                self._dim = self._dim or int(vectors.shape[1])
+                self._store_floats(start, vectors)
+            self._store_codes(start, vectors)
+            # Rows left by a writer that died before logging them stay dead
+            padding = start - len(self._ids)
+            for column in (self._ids, self._texts, self._metadatas):
+                column.extend([None] * padding)
+            for offset, (vid, text, metadata) in enumerate(zip(ids, op["texts"], op["metadatas"])):
+                self._kill(vid)
+                self._ids.append(vid)
+                self._texts.append(text)
+                self._metadatas.append(metadata)
+                self._row[vid] = start + offset
+        elif kind == "delete":
+            for vid in op["ids"]:
+                self._kill(vid)
+        elif kind == "update":
+            for vid in op["ids"]:
+                row = self._row.get(vid)
+                if row is not None:
+                    self._metadatas[row].update(op["values"])
+
+    def _kill(self, vid: str) -> None:
+        row = self._row.pop(vid, None)
+        if row is not None:
+            self._ids[row] = self._texts[row] = self._metadatas[row] = None
+
+    def _grow(self, array: np.ndarray | None, rows: int, shape: Tuple[int, ...], dtype: Any) -> np.ndarray:
+        """`array` with room for at least `rows` rows; capacity doubles, so appends stay amortized O(1)."""
+        if array is not None and array.shape[0] >= rows:
+            return array
+        capacity = max(rows, 2 * (array.shape[0] if array is not None else 0), 64)
+        grown = np.zeros((capacity, *shape), dtype=dtype)
+        if array is not None:
+            grown[: array.shape[0]] = array
+        return grown
+
+    def _store_floats(self, start: int, vectors: np.ndarray) -> None:
+        end = start + len(vectors)
+        current = self._vectors if self._vectors.shape[0] else None
+        self._vectors = self._grow(current, end, (vectors.shape[1],), np.float32)
+        self._vectors[start:end] = vectors
+
+    def _store_codes(self, start: int, vectors: np.ndarray) -> None:
+        # Per-vector quantization: existing codes never need recomputing
+        end = start + len(vectors)
+        if self._quantization == "int8":
+            codes, scales = quantize_int8(vectors)
+            self._codes = self._grow(self._codes, end, codes.shape[1:], np.int8)
+            self._scales = self._grow(self._scales, end, (), np.float32)
+            self._codes[start:end], self._scales[start:end] = codes, scales
+        elif self._quantization == "binary":
+            codes = quantize_binary(vectors)
+            self._codes = self._grow(self._codes, end, codes.shape[1:], np.uint8)
+            self._codes[start:end] = codes
+
+    def _write(self, op: Dict[str, Any], vectors: np.ndarray | None = None) -> None:
+        """Logs one operation and applies it; call under `_lock` and the exclusive file lock."""
+        if self._path is None:
+            if op["op"] == "add":
+                op["start"] = len(self._ids)
+            self._apply(op, vectors)
+            return
+        lines = []
+        if op["op"] == "add":
+            if self._dim is None:
+                lines.append({"op": "dim", "dim": int(vectors.shape[1])})
+                self._dim = int(vectors.shape[1])
+            row_bytes = self._dim * 4
+            with open(self._vectors_path, "r+b") as f:
+                size = f.seek(0, os.SEEK_END)
+                # Skip past a torn row left by a writer that died mid-append
+                op["start"] = -(-size // row_bytes)
+                f.seek(op["start"] * row_bytes)
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        lines.append(op)
+        with open(self._log_path, "a", encoding="utf-8") as log:
+            log.write("".join(json.dumps(line) + "\n" for line in lines))
+        self._tail_log()
+
+    def _rewrite(self, vectors: np.ndarray, ids: List[str], texts: List[str], metadatas: List[dict]) -> None:
+        """Replaces both files with the given rows; call under `_lock` and the exclusive file lock."""
+        tmp_vectors = self._path / "vectors.f32.tmp"
+        tmp_log = self._path / "records.log.tmp"
+        tmp_vectors.write_bytes(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        lines = []
+        if ids:
+            lines.append({"op": "dim", "dim": int(vectors.shape[1])})
+            lines.append({"op": "add", "start": 0, "ids": ids, "texts": texts, "metadatas": metadatas})
+        tmp_log.write_text("".join(json.dumps(line) + "\n" for line in lines), encoding="utf-8")
+        os.replace(tmp_vectors, self._vectors_path)
+        os.replace(tmp_log, self._log_path)
+        self._reset()
+        self._tail_log()
+
+    def _import_legacy(self) -> None:
+        """Converts a store saved as `records.json` + `vectors.npy` (whole-file rewrites)."""
+        records_file = self._path / "records.json"
+        vectors_file = self._path / "vectors.npy"
+        if not records_file.exists() or not vectors_file.exists():
+            return
+        records = json.loads(records_file.read_text(encoding="utf-8"))
+        self._rewrite(np.load(vectors_file), records["ids"], records["texts"], records["metadatas"])
+        records_file.unlink()
+        vectors_file.unlink()
+
+    def _live_rows(self) -> List[int]:
+        return sorted(self._row.values())
+
+    def _compact(self, dimensions: int | None = None) -> int:
+        """Rewrites only the live rows, optionally re-projected. Returns the number kept."""
+        rows = self._live_rows()
+        ids, texts, metadatas = ([column[r] for r in rows] for column in (self._ids, self._texts, self._metadatas))
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32) if rows else np.zeros((0, 0), dtype=np.float32)
+        if dimensions is not None and rows:
+            vectors = truncate_and_normalize(vectors, dimensions)
+        if self._path is not None:
+            self._rewrite(vectors, ids, texts, metadatas)
+        else:
+            self._reset()
+            if rows:
+                self._write({"op": "add", "ids": ids, "texts": texts, "metadatas": metadatas}, vectors)
+        return len(rows)
+
+    def _maybe_compact(self) -> None:
+        dead = len(self._ids) - len(self._row)
+        if dead >= COMPACT_MIN_DEAD_ROWS and dead > len(self._row):
+            self._compact()
+
+    # ------------------------------------------------------------------
+    # VectorStore API
+    # ------------------------------------------------------------------
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    @property
+    def dimension(self) -> int | None:
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            return self._dim if self._row else None
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        vectors = self._embedding.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Upserts pre-computed embeddings. Existing IDs are replaced."""
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [os.urandom(16).hex() for _ in texts]
+
+        new_vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(new_vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        new_vectors = new_vectors / norms
+
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self._dim is not None and self._dim != new_vectors.shape[1]:
+                raise RuntimeError(
+                    f"Local vector store dimension mismatch: store={self._dim}, "
+                    f"new={new_vectors.shape[1]}."
+                )
+            op = {"op": "add", "ids": list(ids), "texts": list(texts), "metadatas": [dict(m) for m in metadatas]}
+            self._write(op, new_vectors)
+        return ids
+
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> Optional[bool]:
+        with self._lock, self._file_lock():
+            self._refresh()
+            targets = {vid for vid in ids or [] if vid in self._row}
+            if filter:
+                targets.update(vid for vid, row in self._row.items() if matches_filter(self._metadatas[row], filter))
+            if targets:
+                self._write({"op": "delete", "ids": sorted(targets)})
+                self._maybe_compact()
+        return True
+
+    def _live(self, filter: Optional[Dict[str, Any]] = None) -> List[int]:
+        """Live rows matching `filter`, in insertion order; call under `_lock`."""
+        return [row for row in self._live_rows() if matches_filter(self._metadatas[row], filter)]
+
+    def count(self, filter: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            return len(self._live(filter))
+
+    def ids(self, filter: Optional[Dict[str, Any]] = None) -> List[str]:
+        """IDs of the records matching `filter`, in insertion order."""
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            return [self._ids[row] for row in self._live(filter)]
+
+    def update_metadata(self, filter: Dict[str, Any], values: Dict[str, Any]) -> int:
+        """Sets `values` on every record matching `filter`. Returns the number updated."""
+        with self._lock, self._file_lock():
+            self._refresh()
+            targets = [self._ids[row] for row in self._live(filter)]
+            if targets:
+                self._write({"op": "update", "ids": targets, "values": values})
+            return len(targets)
+
+    def sources(self) -> set:
+        """Distinct (user_id, source) pairs in the store."""
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            return {(md.get("user_id"), md.get("source")) for md in (self._metadatas[r] for r in self._row.values())}
+
+    def _wanted_rows(self, ids: List[str]) -> List[int]:
+        return sorted(self._row[vid] for vid in set(ids) if vid in self._row)
+
+    def get_by_ids(self, ids: List[str], /) -> List[Document]:
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            return [
+                Document(id=self._ids[i], page_content=self._texts[i], metadata=dict(self._metadatas[i]))
+                for i in self._wanted_rows(ids)
+            ]
+
+    def fetch(self, ids: List[str]) -> List[Tuple[Document, np.ndarray]]:
+        """Returns the stored documents together with their float vectors."""
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            return [
+                (
+                    Document(id=self._ids[i], page_content=self._texts[i], metadata=dict(self._metadatas[i])),
+                    np.array(self._vectors[i], dtype=np.float32),
+                )
+                for i in self._wanted_rows(ids)
+            ]
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        *,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            if not self._row:
+                return []
+
+            q = np.asarray(embedding, dtype=np.float32)
+            q_norm = np.linalg.norm(q)
+            if q_norm:
+                q = q / q_norm
+
+            candidates = np.array(self._live(filter), dtype=np.int64)
+            if candidates.size == 0:
+                return []
+
+            # Stage 1: cheap approximate scan over the quantized codes.
+            if self._quantization == "int8":
+                approx = int8_scores(self._codes[candidates], self._scales[candidates], q)
+            elif self._quantization == "binary":
+                approx = hamming_scores(self._codes[candidates], q)
+            else:
+                approx = None
+
+            if approx is not None:
+                shortlist_size = min(candidates.size, k * self._rescore_factor)
+                top = np.argpartition(-approx, shortlist_size - 1)[:shortlist_size]
+                candidates = candidates[top]
+
+            # Stage 2: exact float re-scoring of the shortlist.
+            scores = np.asarray(self._vectors[candidates]) @ q
+            order = np.argsort(-scores)[:k]
+
+            return [
+                (
+                    Document(
+                        id=self._ids[candidates[i]],
+                        page_content=self._texts[candidates[i]],
+                        metadata=dict(self._metadatas[candidates[i]]),
+                    ),
+                    float(scores[i]),
+                )
+                for i in order
+            ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = self._embedding.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k=k, **kwargs)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def reproject(self, dimensions: int) -> int:
+        """
+        Re-projects every stored vector to a smaller Matryoshka dimension in place.
+
+        Returns:
+            int: The number of vectors re-projected.
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            return self._compact(dimensions) if self._row else 0
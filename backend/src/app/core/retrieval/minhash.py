@@ -0,0 +1,124 @@
+"""
+Near-Duplicate Detection Module
+
+Exact-text deduplication misses the near-duplicates that actually crowd the top-K:
+the same clause in two versions of a contract, boilerplate repeated through a
+document, or a file uploaded twice under different names.
+
+Every chunk gets a MinHash signature of its word 3-shingles at ingestion, stored
+base64-encoded in the vector metadata (`minhash`). The fraction of equal signature
+slots estimates the Jaccard similarity of two chunks, so:
+
+- at ingestion, `LSHIndex` (banded locality-sensitive hashing) finds candidate
+  pairs among a document's chunks without comparing all of them, and chunks nearly
+  identical to an earlier one are not embedded;
+- at query time, `diversify` drops hits that nearly duplicate a better-ranked hit.
+  Unlike MMR it needs no embedding vectors, only the metadata already returned.
+
+Hash parameters come from a fixed seed: signatures must stay comparable across
+processes and releases.
+"""
+
+from __future__ import annotations
+
+import base64
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Hashable, List, Set
+
+import numpy as np
+from langchain_core.documents import Document
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+# 16 bands of 4 rows: pairs above ~0.6 Jaccard almost always share a bucket
+LSH_BANDS = 16
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_WORDS = re.compile(r"\w+")
+
+METADATA_KEY = "minhash"
+
+
+def signature(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of the text's word shingles."""
+    words = _WORDS.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i : i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # Universal hashing (a*x + b) mod p; a, x < 2**32 so the product cannot overflow
+    permuted = (hashes[:, None] * _A + _B) % _MERSENNE
+    return (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def encode_signature(sig: np.ndarray) -> str:
+    return base64.b64encode(np.asarray(sig, dtype="<u4").tobytes()).decode("ascii")
+
+
+def decode_signature(value: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(value), dtype="<u4")
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the two texts."""
+    return float(np.mean(a == b))
+
+
+def document_signature(doc: Document) -> np.ndarray:
+    """The stored signature, or one computed from the text for chunks indexed without it."""
+    stored = (doc.metadata or {}).get(METADATA_KEY)
+    return decode_signature(stored) if stored else signature(doc.page_content or "")
+
+
+class LSHIndex:
+    """Banded LSH buckets: items sharing any band are near-duplicate candidates."""
+
+    def __init__(self, bands: int = LSH_BANDS) -> None:
+        self._rows = NUM_PERM // bands
+        self._bands = bands
+        self._buckets: Dict[tuple, Set[Hashable]] = defaultdict(set)
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+
+    def _keys(self, sig: np.ndarray) -> List[tuple]:
+        return [(band, sig[band * self._rows : (band + 1) * self._rows].tobytes()) for band in range(self._bands)]
+
+    def add(self, key: Hashable, sig: np.ndarray) -> None:
+        self._signatures[key] = sig
+        for bucket in self._keys(sig):
+            self._buckets[bucket].add(key)
+
+    def candidates(self, sig: np.ndarray) -> Set[Hashable]:
+        """Stored items sharing at least one band with `sig`."""
+        found: Set[Hashable] = set()
+        for bucket in self._keys(sig):
+            found |= self._buckets.get(bucket, set())
+        return found
+
+    def near_duplicate(self, sig: np.ndarray, threshold: float) -> Hashable | None:
+        """A stored item whose estimated Jaccard similarity with `sig` reaches `threshold`."""
+        for key in self.candidates(sig):
+            if similarity(sig, self._signatures[key]) >= threshold:
+                return key
+        return None
+
+
+def diversify(docs: List[Document], threshold: float) -> List[Document]:
+    """
+    Keeps documents in rank order, dropping each one that nearly duplicates a
+    better-ranked document already kept.
+    """
+    kept: List[Document] = []
+    kept_signatures: List[np.ndarray] = []
+    for doc in docs:
+        sig = document_signature(doc)
+        if any(similarity(sig, other) >= threshold for other in kept_signatures):
+            continue
+        kept.append(doc)
+        kept_signatures.append(sig)
+    return kept
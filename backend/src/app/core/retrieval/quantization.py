@@ -0,0 +1,88 @@
+"""
+Embedding Compression Module
+
+This module contains the numeric helpers used to shrink embedding storage:
+
+1. Matryoshka truncation: `text-embedding-3-*` models are trained so that the
+   leading N dimensions of a vector are themselves a usable embedding. Keeping
+   only the first 256/512/1024 dimensions (and re-normalizing) cuts storage and
+   dot-product cost by 3-12x with a small recall loss.
+2. Scalar (int8) quantization: every vector is stored as int8 codes plus a single
+   float32 scale, a 4x reduction over float32.
+3. Binary quantization: only the sign of each dimension is kept (1 bit per dim),
+   a 32x reduction. Candidates are ranked by Hamming similarity.
+
+Quantized scores are only used to shortlist candidates. The caller re-scores the
+shortlist against the original float vectors, which restores ranking accuracy.
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+
+def truncate_and_normalize(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Re-projects embeddings to a smaller Matryoshka dimension.
+
+    Args:
+        vectors (np.ndarray): A (n, d) or (d,) float array of embeddings.
+        dimensions (int): The target dimension. Must be <= d.
+
+    Returns:
+        np.ndarray: float32 vectors truncated to `dimensions` and L2-normalized.
+    """
+    arr = np.asarray(vectors, dtype=np.float32)
+    if arr.shape[-1] < dimensions:
+        raise ValueError(
+            f"Cannot re-project {arr.shape[-1]}-dim vectors up to {dimensions} dimensions."
+        )
+    arr = arr[..., :dimensions]
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (arr / norms).astype(np.float32)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-vector int8 quantization.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (codes int8 of shape (n, d), scales float32 of shape (n,)).
+    """
+    arr = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(arr).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(arr / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def int8_scores(codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Approximate dot products between a float query and int8-quantized vectors."""
+    q = np.asarray(query, dtype=np.float32)
+    return (codes.astype(np.float32) @ q) * scales
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Sign-bit quantization packed into uint8 (d/8 bytes per vector)."""
+    arr = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return np.packbits(arr > 0, axis=1)
+
+
+# Popcount lookup table for a single byte, used for fast Hamming distance.
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hamming_scores(packed: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """
+    Similarity between a float query and binary-quantized vectors.
+
+    Returns the number of matching sign bits (higher is more similar).
+    """
+    q_packed = quantize_binary(query)[0]
+    mismatches = _POPCOUNT[np.bitwise_xor(packed, q_packed)].sum(axis=1, dtype=np.int32)
+    return -mismatches.astype(np.float32)
@@ -0,0 +1,106 @@
+"""
+Document Routing Module
+
+Tenants with many files suffer from "crowding": every sub-question searches the
+whole tenant partition, so near-miss chunks from unrelated documents push the
+truly relevant ones out of the top-K.
+
+At ingestion time each document gets a compact profile (a short summary and the
+centroid of its chunk embeddings) stored in Postgres. At query time the query
+embedding is compared against those centroids and the vector search is narrowed
+to the top-M most similar documents with a `doc_id $in` filter.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from ..config import get_settings
+from ..db import get_document_profiles
+from ..metrics import record_cache
+
+# user_id -> (loaded_at, document IDs, normalized centroid matrix)
+_profile_cache: Dict[str, Tuple[float, List[int], np.ndarray]] = {}
+_cache_lock = threading.Lock()
+
+
+def compute_centroid(vectors: Sequence[Sequence[float]]) -> np.ndarray | None:
+    """Mean of a document's chunk embeddings, L2-normalized."""
+    if not len(vectors):
+        return None
+    centroid = np.asarray(vectors, dtype=np.float32).mean(axis=0)
+    norm = np.linalg.norm(centroid)
+    return centroid / norm if norm else centroid
+
+
+def encode_centroid(centroid: np.ndarray | None) -> bytes | None:
+    """Packs a centroid as raw float32 bytes for a BYTEA column."""
+    if centroid is None:
+        return None
+    return np.asarray(centroid, dtype=np.float32).tobytes()
+
+
+def decode_centroid(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+def invalidate_document_profiles(user_id: str) -> None:
+    """Drops the cached centroids for a user after an upload or delete."""
+    with _cache_lock:
+        _profile_cache.pop(user_id, None)
+
+
+def _load_profiles(user_id: str, dim: int) -> Tuple[List[int], np.ndarray]:
+    settings = get_settings()
+    now = time.monotonic()
+
+    with _cache_lock:
+        cached = _profile_cache.get(user_id)
+        # The tenant's embedding version (and so the query dimension) may have switched
+        if cached and now - cached[0] < settings.document_routing_cache_ttl and cached[2].shape[1] == dim:
+            record_cache("document_profiles", hit=True)
+            return cached[1], cached[2]
+
+    record_cache("document_profiles", hit=False)
+
+    doc_ids: List[int] = []
+    centroids: List[np.ndarray] = []
+    for row in get_document_profiles(user_id):
+        centroid = decode_centroid(row["centroid"])
+        # Profiles written under a different embedding size cannot be compared
+        if centroid.shape[0] != dim:
+            continue
+        doc_ids.append(row["id"])
+        centroids.append(centroid)
+
+    matrix = np.vstack(centroids) if centroids else np.zeros((0, dim), dtype=np.float32)
+    with _cache_lock:
+        _profile_cache[user_id] = (now, doc_ids, matrix)
+    return doc_ids, matrix
+
+
+def route_documents(query_vector: Sequence[float], user_id: str) -> List[int] | None:
+    """
+    Picks the top-M documents whose centroids best match the query.
+
+    Returns:
+        List[int] | None: The document IDs to restrict the search to, or None when
+            routing would not narrow anything (small corpus or routing disabled).
+    """
+    settings = get_settings()
+    if not settings.document_routing_enabled:
+        return None
+
+    q = np.asarray(query_vector, dtype=np.float32)
+    doc_ids, matrix = _load_profiles(user_id, q.shape[0])
+    top_m = settings.document_routing_top_m
+    if len(doc_ids) <= top_m:
+        return None
+
+    scores = matrix @ q
+    top = np.argpartition(-scores, top_m - 1)[:top_m]
+    return [doc_ids[i] for i in top[np.argsort(-scores[top])]]
@@ -0,0 +1,79 @@
+"""
+Document Scope Resolution Module
+
+A question can be scoped to one file, several files or a collection (a folder-like
+label set per file). Every vector carries the integer ID of its document
+(`doc_id`, the `user_files.id`), so a scope is resolved ONCE per request to a
+short list of IDs and the vector filter becomes `doc_id $in [...]` instead of a
+list of reconstructed path strings.
+
+Resolution validates the requested names against the user's document catalogue
+(filename -> ID and collection), cached per user in the shared cache and
+invalidated whenever a document is added, deleted or moved between collections.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Dict, Iterable, List
+
+from .. import db
+from ..cache import cache_get, cache_set, get_cache
+from ..config import get_settings
+
+
+class ScopeError(ValueError):
+    """The requested scope names files or a collection the user does not have."""
+
+
+def document_catalog(user_id: str) -> Dict[str, dict]:
+    """The user's documents keyed by filename: {"id": int, "collection": str | None}."""
+    blob = cache_get("doc_catalog", user_id)
+    if blob is not None:
+        return json.loads(blob)
+    catalog = {
+        row["filename"]: {"id": row["id"], "collection": row["collection"]}
+        for row in db.get_document_catalog(user_id)
+    }
+    cache_set(
+        "doc_catalog", user_id, json.dumps(catalog).encode(), ttl=get_settings().document_scope_cache_ttl
+    )
+    return catalog
+
+
+def invalidate_scopes(user_id: str) -> None:
+    """Drops the cached catalogue after an upload, delete or collection change."""
+    get_cache().delete(f"doc_catalog:{user_id}")
+
+
+def resolve_scope(
+    user_id: str,
+    filenames: Iterable[str] | None = None,
+    collection: str | None = None,
+) -> List[int] | None:
+    """
+    Resolves filenames and/or a collection to the union of their document IDs.
+
+    Returns:
+        List[int] | None: Sorted document IDs, or None when nothing was requested
+            (the question searches the whole tenant).
+
+    Raises:
+        ScopeError: A filename is unknown, or the collection holds no documents.
+    """
+    names = sorted({name for name in filenames or () if name})
+    if not names and not collection:
+        return None
+
+    catalog = document_catalog(user_id)
+    missing = [name for name in names if name not in catalog]
+    if missing:
+        raise ScopeError(f"Unknown document(s): {', '.join(missing)}")
+
+    ids = {catalog[name]["id"] for name in names}
+    if collection:
+        members = {entry["id"] for entry in catalog.values() if entry["collection"] == collection}
+        if not members:
+            raise ScopeError(f"Collection '{collection}' has no documents.")
+        ids |= members
+    return sorted(ids)
@@ -8,6 +8,10 @@ generating stable, deterministic citation IDs.
 
 These IDs are essential for the system's "hallucination filter" (Verification Agent) 
 and for providing clickable, verifiable evidence cards in the frontend UI.
+
+Chunk IDs are computed once at ingestion (`assign_chunk_ids`) and stored in each
+vector's metadata as `chunk_id`; serialization reuses them and only hashes chunks
+indexed before the field existed.
 """
 
 from __future__ import annotations
@@ -46,6 +50,21 @@ def _stable_chunk_hash(source: str, page_label: str, text: str) -> str:
     return hashlib.sha1(raw).hexdigest()[:8]
 
 
+def compute_chunk_id(doc: Document) -> str:
+    """Citation ID for a chunk: P{page_label}-C{hash8}."""
+    metadata = doc.metadata or {}
+    page_label = metadata.get("page_label", metadata.get("page", "unknown"))
+    source = metadata.get("source", "unknown")
+    text = (doc.page_content or "").strip()
+    return f"P{page_label}-C{_stable_chunk_hash(str(source), str(page_label), text)}"
+
+
+def assign_chunk_ids(chunks: List[Document]) -> None:
+    """Stamps `chunk_id` into each chunk's metadata at ingestion time (in place)."""
+    for chunk in chunks:
+        chunk.metadata["chunk_id"] = compute_chunk_id(chunk)
+
+
 def serialize_chunks_with_ids(docs: List[Document]) -> Tuple[str, Dict[str, dict]]:
     """
     Transforms retrieved documents into a citation-aware CONTEXT string and metadata map.
@@ -81,9 +100,8 @@ def serialize_chunks_with_ids(docs: List[Document]) -> Tuple[str, Dict[str, dict
 
         text = (doc.page_content or "").strip()
 
-        # Generate the deterministic ID for this specific chunk
-        chunk_hash = _stable_chunk_hash(str(source), str(page_label), text)
-        chunk_id = f"P{page_label}-C{chunk_hash}"
+        # Reuse the ID stamped at ingestion; hash only legacy chunks that lack one
+        chunk_id = metadata.get("chunk_id") or compute_chunk_id(doc)
 
         # Format the chunk exactly as the SUMMARIZATION_SYSTEM_PROMPT expects it.
         # Example: "[P4-C12345678] Chunk from page 4:\nHere is the text..."
@@ -98,6 +116,10 @@ def serialize_chunks_with_ids(docs: List[Document]) -> Tuple[str, Dict[str, dict
             "source": source,
             "snippet": (text[:150] + "...") if len(text) > 150 else text,
             "text": text,
+            # The vector-store ID lets later turns re-fetch this chunk (conversation working set)
+            "vector_id": doc.id,
+            # Similarity to the query (None for chunks that did not come from a scored search)
+            "score": metadata.get("score"),
         }
 
     # Join the individual chunk strings with double newlines to clearly 
@@ -0,0 +1,280 @@
+"""
+Tenant Snapshot Module
+
+Moving a tenant to another index or region, or rebuilding an index, used to mean
+re-running ingestion for every file: re-parsing each PDF and re-embedding each
+chunk. A snapshot holds everything ingestion produced, so a rebuild becomes an
+I/O-bound copy:
+
+    <snapshot>/
+        manifest.json   format version, embedding model/dimension, one entry per document
+        vectors.npy     float32 matrix, one row per vector, grouped by document
+        columns.json    per-vector metadata as columns ({"key": [...], "page": [...], ...})
+        chunks.jsonl    chunk-store records (child and parent texts), one per line
+        files/          the uploaded PDFs (only with `include_files`)
+
+Vector IDs, parent IDs and chunk-store keys are stored without their per-document
+prefix, and user and document identity live only in the manifest, so a snapshot
+can be imported under another user ID. Import skips documents whose content hash
+matches what the target already holds. Vectors are copied as-is when the embedding
+model and dimension match, truncated when only the Matryoshka dimension shrank,
+and re-embedded only when the model differs. Export reads, and import writes, the
+embedding namespace the tenant currently reads from.
+"""
+
+from __future__ import annotations
+
+import json
+import shutil
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from pinecone.exceptions import PineconeApiException
+
+from .. import db
+from ..deletion import purge_source, source_path
+from .chunk_store import get_chunk_store
+from .embedding_spaces import parse_version, tenant_spaces, version_for
+from .quantization import truncate_and_normalize
+from .routing import compute_centroid, encode_centroid, invalidate_document_profiles
+from .scopes import invalidate_scopes
+from .vector_store import (
+    _document_key,
+    _upsert_embeddings,
+    delete_source_vectors,
+    document_vectors,
+    get_embeddings_for,
+    get_namespace_store,
+)
+
+FORMAT = "intellirag-snapshot"
+VERSION = 1
+
+# Identity is per document (manifest), rewritten on import rather than stored per vector
+_IDENTITY_KEYS = ("user_id", "doc_id", "source", "text", "score")
+
+# Document fields carried over from `user_files`
+_DOCUMENT_FIELDS = ("filename", "summary", "collection", "file_size", "page_count", "chunk_count", "content_hash")
+
+
+def _local_key(key: str, doc_key: str) -> str:
+    prefix = f"{doc_key}#"
+    return key[len(prefix):] if key.startswith(prefix) else key
+
+
+def export_tenant(user_id: str, out_dir: str, include_files: bool = False) -> Dict[str, int]:
+    """
+    Writes one user's documents, vectors and chunk texts to a snapshot directory.
+
+    Returns:
+        Dict[str, int]: Counts of documents, vectors and chunk-store records written.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    namespace = tenant_spaces(user_id).read
+    model, dim = parse_version(version_for(namespace))
+    vector_store = get_namespace_store(namespace)
+    chunk_store = get_chunk_store()
+
+    documents: List[dict] = []
+    rows: List[dict] = []
+    vectors: List[np.ndarray] = []
+    chunk_lines: List[str] = []
+    for row in db.get_user_documents(user_id):
+        source = row["file_path"]
+        doc_key = _document_key(user_id, source)
+        start = len(rows)
+        for vid, text, metadata, vec in document_vectors(vector_store, user_id, source):
+            values = {k: v for k, v in metadata.items() if k not in _IDENTITY_KEYS}
+            if "parent_id" in values:
+                values["parent_id"] = _local_key(values["parent_id"], doc_key)
+            rows.append({**values, "key": _local_key(vid, doc_key), "text": text})
+            vectors.append(vec)
+
+        for key, record in chunk_store.get_prefix(f"{doc_key}#").items():
+            record = dict(record)
+            if "parent_id" in record:
+                record["parent_id"] = _local_key(record["parent_id"], doc_key)
+            chunk_lines.append(json.dumps({"doc": len(documents), "key": _local_key(key, doc_key), **record}))
+
+        file_name = None
+        if include_files and Path(source).is_file():
+            (out / "files").mkdir(exist_ok=True)
+            file_name = f"files/{row['filename']}"
+            shutil.copyfile(source, out / file_name)
+
+        documents.append({
+            **{field: row.get(field) for field in _DOCUMENT_FIELDS},
+            "vectors": [start, len(rows)],
+            "file": file_name,
+        })
+
+    matrix = np.vstack(vectors).astype(np.float32) if vectors else np.zeros((0, dim), dtype=np.float32)
+    np.save(out / "vectors.npy", matrix)
+    keys = sorted({k for row in rows for k in row})
+    (out / "columns.json").write_text(
+        json.dumps({k: [row.get(k) for row in rows] for k in keys}, ensure_ascii=False), encoding="utf-8"
+    )
+    (out / "chunks.jsonl").write_text("".join(line + "\n" for line in chunk_lines), encoding="utf-8")
+
+    # Written last: a snapshot without a manifest is incomplete
+    manifest = {
+        "format": FORMAT,
+        "version": VERSION,
+        "user_id": user_id,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "embedding_model": model,
+        "embedding_dimension": int(matrix.shape[1]) if len(matrix) else dim,
+        "documents": documents,
+    }
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    return {"documents": len(documents), "vectors": len(rows), "chunk_records": len(chunk_lines)}
+
+
+def _vector_mode(manifest: dict, version: str) -> str:
+    """How snapshot vectors become target vectors: "copy", "truncate" or "reembed"."""
+    model, dim = parse_version(version)
+    if manifest["embedding_model"] != model:
+        return "reembed"
+    if manifest["embedding_dimension"] == dim:
+        return "copy"
+    # Matryoshka embeddings: a prefix of a larger vector is a valid smaller one
+    if manifest["embedding_dimension"] > dim:
+        return "truncate"
+    return "reembed"
+
+
+def read_manifest(snapshot_dir: str) -> dict:
+    manifest = json.loads((Path(snapshot_dir) / "manifest.json").read_text(encoding="utf-8"))
+    if manifest.get("format") != FORMAT or manifest.get("version") != VERSION:
+        raise ValueError(f"{snapshot_dir} is not a version {VERSION} {FORMAT}.")
+    return manifest
+
+
+def _load_snapshot(snap: Path) -> Tuple[dict, np.ndarray, List[dict], Dict[int, Dict[str, dict]]]:
+    manifest = read_manifest(str(snap))
+
+    matrix = np.load(snap / "vectors.npy")
+    columns = json.loads((snap / "columns.json").read_text(encoding="utf-8"))
+    count = len(columns.get("key", []))
+    rows = [{k: values[i] for k, values in columns.items() if values[i] is not None} for i in range(count)]
+
+    chunks: Dict[int, Dict[str, dict]] = defaultdict(dict)
+    with open(snap / "chunks.jsonl", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            chunks[record.pop("doc")][record.pop("key")] = record
+    return manifest, matrix, rows, chunks
+
+
+def import_tenant(
+    snapshot_dir: str,
+    user_id: str | None = None,
+    workers: int = 8,
+    batch_size: int = 100,
+    force: bool = False,
+) -> Dict[str, int]:
+    """
+    Bulk-loads a snapshot into the configured vector backend and metadata store.
+
+    Args:
+        snapshot_dir: Directory written by `export_tenant`.
+        user_id: Target user (defaults to the snapshot's own).
+        workers: Concurrent upsert batches (Pinecone).
+        batch_size: Vectors per upsert call.
+        force: Re-import documents even when the target has the same content hash.
+
+    Returns:
+        Dict[str, int]: Counts of documents imported and skipped, vectors loaded and
+            chunks re-embedded.
+    """
+    snap = Path(snapshot_dir)
+    manifest, matrix, rows, chunks = _load_snapshot(snap)
+    user_id = user_id or manifest["user_id"]
+    # A tenant being migrated picks the imported documents up like any other
+    namespace = tenant_spaces(user_id).read
+    version = version_for(namespace)
+    mode = _vector_mode(manifest, version)
+
+    existing = {row["filename"]: row for row in db.get_user_documents(user_id)}
+    report = {"imported": 0, "skipped": 0, "vectors": 0, "reembedded": 0}
+    ids: List[str] = []
+    texts: List[str] = []
+    metadatas: List[dict] = []
+    vectors: List[List[float]] = []
+    saves: List[dict] = []
+
+    for n, doc in enumerate(manifest["documents"]):
+        filename = doc["filename"]
+        current = existing.get(filename)
+        if not force and current and doc.get("content_hash") and current.get("content_hash") == doc["content_hash"]:
+            report["skipped"] += 1
+            continue
+
+        source = source_path(user_id, filename)
+        doc_key = _document_key(user_id, source)
+        # Same order as an upload: finish pending deletes, then replace the old version
+        purge_source(user_id, source)
+        if current:
+            delete_source_vectors(user_id, [source])
+        doc_id = db.allocate_document_id(user_id, filename)
+
+        start, end = doc["vectors"]
+        doc_rows = rows[start:end]
+        doc_vectors = matrix[start:end]
+        if mode == "truncate":
+            doc_vectors = truncate_and_normalize(doc_vectors, parse_version(version)[1])
+        elif mode == "reembed" and doc_rows:
+            # Child text lives in the chunk records when the vector was stored without it
+            embed_texts = [row.get("text") or chunks[n].get(row["key"], {}).get("text", "") for row in doc_rows]
+            doc_vectors = np.asarray(get_embeddings_for(version).embed_documents(embed_texts), dtype=np.float32)
+            report["reembedded"] += len(embed_texts)
+
+        for row, vec in zip(doc_rows, doc_vectors):
+            metadata = {k: v for k, v in row.items() if k not in ("key", "text")}
+            if "parent_id" in metadata:
+                metadata["parent_id"] = f"{doc_key}#{metadata['parent_id']}"
+            metadata.update(user_id=user_id, doc_id=doc_id, source=source)
+            ids.append(f"{doc_key}#{row['key']}")
+            texts.append(row.get("text") or "")
+            metadatas.append(metadata)
+            vectors.append(np.asarray(vec, dtype=np.float32).tolist())
+
+        if chunks.get(n):
+            records = {}
+            for key, record in chunks[n].items():
+                record = dict(record)
+                if "parent_id" in record:
+                    record["parent_id"] = f"{doc_key}#{record['parent_id']}"
+                records[f"{doc_key}#{key}"] = record
+            get_chunk_store().put_many(records)
+
+        if doc.get("file"):
+            Path(source).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(snap / doc["file"], source)
+
+        saves.append({
+            **{field: doc.get(field) for field in _DOCUMENT_FIELDS},
+            "file_path": source,
+            "centroid": encode_centroid(compute_centroid(doc_vectors)),
+            "doc_id": doc_id,
+        })
+        report["imported"] += 1
+
+    if ids:
+        try:
+            _upsert_embeddings(get_namespace_store(namespace), texts, vectors, metadatas, ids, batch_size, workers)
+        except PineconeApiException as e:
+            raise RuntimeError(f"Pinecone bulk upsert failed: {e}") from e
+    report["vectors"] = len(ids)
+
+    # Metadata rows last, as on upload: a document is listed only once it is searchable
+    db.save_files_metadata([
+        {**save, "user_id": user_id, "embedding_namespace": namespace} for save in saves
+    ])
+    invalidate_document_profiles(user_id)
+    invalidate_scopes(user_id)
+    return report
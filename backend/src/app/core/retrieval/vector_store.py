@@ -3,21 +3,35 @@ Vector Store Integration Module (Multi-Tenant Edition)
 """
 from __future__ import annotations
 
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
-from typing import List, Optional, Dict, Any
 from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Sequence, Set, Tuple
 
+import numpy as np
 from pinecone import Pinecone
 from pinecone.exceptions import PineconeApiException
 
 from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
 from langchain_openai import OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from ..config import get_settings, current_user_id
-
-EXPECTED_EMBED_DIM = 3072
+from ..cache import cache_get, cache_set
+from ..config import NATIVE_EMBEDDING_DIMENSIONS, get_settings, current_document_scope, current_user_id
+from ..deletion import tombstoned_sources
+from ..llm.batching import BatchingEmbeddings
+from ..metrics import NEAR_DUPLICATES, RETRIEVAL_HITS, timed
+from .chunk_store import get_chunk_store
+from .embedding_spaces import DEFAULT_NAMESPACE, namespace_versions, parse_version, tenant_spaces, version_for
+from .local_store import LocalVectorStore
+from .minhash import METADATA_KEY, LSHIndex, encode_signature, signature
+from .quantization import truncate_and_normalize
+from .routing import compute_centroid, route_documents
+from .serialization import assign_chunk_ids
 
 def _extract_index_dimension(pc: Pinecone, index_name: str) -> int | None:
     try:
@@ -31,36 +45,144 @@ def _extract_index_dimension(pc: Pinecone, index_name: str) -> int | None:
     return None
 
 @lru_cache(maxsize=1)
-def _get_vector_store() -> PineconeVectorStore:
+def _get_embeddings() -> BatchingEmbeddings:
     settings = get_settings()
-    pc = Pinecone(api_key=settings.pinecone_api_key)
-    
-    index_dim = _extract_index_dimension(pc, settings.pinecone_index_name)
-    if index_dim is not None and index_dim != EXPECTED_EMBED_DIM:
-        raise RuntimeError("Pinecone index dimension mismatch.")
-
-    index = pc.Index(settings.pinecone_index_name)
-    embeddings = OpenAIEmbeddings(
+    # `dimensions` asks the API for Matryoshka-truncated, re-normalized vectors
+    client = OpenAIEmbeddings(
         model=settings.openai_embedding_model_name,
         api_key=settings.openai_api_key,
+        dimensions=settings.openai_embedding_dimensions,
+    )
+    return BatchingEmbeddings(
+        client,
+        max_batch_size=settings.embedding_batch_max_size,
+        max_in_flight=settings.embedding_max_in_flight,
     )
-    return PineconeVectorStore(index=index, embedding=embeddings)
 
 
-def get_retriever(
-    k: int | None = None,
-    search_type: str = "similarity",
-    fetch_k: Optional[int] = None,
-    lambda_mult: Optional[float] = None,
-    *,
-    document_scope: str | None = None,
-):
+@lru_cache(maxsize=4)
+def get_embeddings_for(version: str) -> BatchingEmbeddings:
+    """Embedding client for any "model@dimension" version (the configured one is shared)."""
     settings = get_settings()
-    if k is None:
-        k = settings.retrieval_k
+    if version == settings.embedding_version:
+        return _get_embeddings()
+    model, dim = parse_version(version)
+    client = OpenAIEmbeddings(
+        model=model,
+        api_key=settings.openai_api_key,
+        dimensions=None if NATIVE_EMBEDDING_DIMENSIONS.get(model) == dim else dim,
+    )
+    return BatchingEmbeddings(
+        client,
+        max_batch_size=settings.embedding_batch_max_size,
+        max_in_flight=settings.embedding_max_in_flight,
+    )
 
-    vector_store = _get_vector_store()
+
+def _open_store(namespace: str) -> VectorStore:
+    settings = get_settings()
+    version = version_for(namespace)
+    expected_dim = parse_version(version)[1]
+    embeddings = get_embeddings_for(version)
+
+    if settings.vector_backend == "local":
+        path = Path(settings.local_vector_store_path)
+        if namespace != DEFAULT_NAMESPACE:
+            path = path / "namespaces" / re.sub(r"[^A-Za-z0-9_.@-]", "_", namespace)
+        store = LocalVectorStore(
+            embeddings,
+            path=str(path),
+            quantization=settings.local_vector_quantization,
+            rescore_factor=settings.local_vector_rescore_factor,
+        )
+        if store.dimension is not None and store.dimension != expected_dim:
+            raise RuntimeError(
+                f"Local vector store dimension mismatch: store={store.dimension}, "
+                f"{version}={expected_dim}. Run the `reproject-embeddings` command."
+            )
+        return store
+
+    pc = Pinecone(api_key=settings.pinecone_api_key)
     
+    index_dim = _extract_index_dimension(pc, settings.pinecone_index_name)
+    if index_dim is not None and index_dim != expected_dim:
+        # Namespaces share the index dimension; other dimensions need another index
+        raise RuntimeError(
+            f"Pinecone index dimension mismatch: index={index_dim}, {version}={expected_dim}."
+        )
+
+    index = pc.Index(settings.pinecone_index_name)
+    return PineconeVectorStore(index=index, embedding=embeddings, namespace=namespace or None)
+
+
+@lru_cache(maxsize=1)
+def _get_vector_store() -> VectorStore:
+    # The default namespace holds whichever version was registered for it
+    return _open_store(DEFAULT_NAMESPACE)
+
+
+@lru_cache(maxsize=8)
+def get_namespace_store(namespace: str) -> VectorStore:
+    """The vector store of one embedding namespace (see `embedding_spaces`)."""
+    if namespace == DEFAULT_NAMESPACE:
+        return _get_vector_store()
+    return _open_store(namespace)
+
+
+def _index_kwargs(vector_store: VectorStore) -> Dict[str, Any]:
+    """Namespace argument for raw Pinecone index calls made on behalf of `vector_store`."""
+    namespace = getattr(vector_store, "_namespace", None)
+    return {"namespace": namespace} if namespace else {}
+
+
+def _read_version() -> str:
+    return version_for(tenant_spaces(current_user_id.get()).read)
+
+
+def _query_embedding_key(query: str, version: str) -> str:
+    raw = f"{version}|{query}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def embed_queries(queries: List[str], version: str | None = None) -> List[List[float]]:
+    """
+    Embeds several queries in one batched API call (coalesced with concurrent callers),
+    in the embedding version the current tenant reads from unless `version` is given.
+
+    Vectors are cached (see `core/cache.py`), so repeated sub-questions across turns,
+    threads and workers skip the embedding API entirely.
+    """
+    settings = get_settings()
+    version = version or _read_version()
+    keys = [_query_embedding_key(q, version) for q in queries]
+    vectors: List[List[float] | None] = []
+    for key in keys:
+        blob = cache_get("query_embedding", key)
+        vectors.append(np.frombuffer(blob, dtype=np.float32).tolist() if blob is not None else None)
+
+    missing = [i for i, vec in enumerate(vectors) if vec is None]
+    if missing:
+        embeddings = get_embeddings_for(version)
+        texts = [queries[i] for i in missing]
+        with timed("embedding.query"):
+            if isinstance(embeddings, BatchingEmbeddings):
+                fresh = embeddings.embed_queries(texts)
+            else:
+                fresh = embeddings.embed_documents(texts)
+        for i, vec in zip(missing, fresh):
+            vectors[i] = vec
+            cache_set(
+                "query_embedding",
+                keys[i],
+                np.asarray(vec, dtype=np.float32).tobytes(),
+                ttl=settings.embedding_cache_ttl,
+            )
+    return vectors  # type: ignore[return-value]
+
+
+def _build_filter(
+    document_scope: Sequence[int] | None = None, tombstoned: Collection[str] = ()
+) -> Dict[str, Any]:
     # ---------------------------------------------------------
     # FEATURE: Mandatory Multitenant Filtering
     # ---------------------------------------------------------
@@ -72,11 +194,43 @@ def get_retriever(
     filter_dict: Dict[str, Any] = {"user_id": user_id}
 
     if document_scope:
-        # Reconstruct the multi-tenant file path so Pinecone metadata matches
-        exact_source_path = str(Path(f"data/uploads/{user_id}/{document_scope}"))
-        filter_dict["source"] = exact_source_path
+        # Integer document IDs resolved once per request (see `scopes.resolve_scope`)
+        ids = sorted(document_scope)
+        filter_dict["doc_id"] = ids[0] if len(ids) == 1 else {"$in": ids}
+    if tombstoned:
+        # Deleted documents stay unsearchable while their vectors are being cleaned up
+        filter_dict["source"] = {"$nin": sorted(tombstoned)}
+
+    return filter_dict
+
 
-    search_kwargs: Dict[str, Any] = {"k": k, "filter": filter_dict}
+def _active_scope(document_scope: Sequence[int] | None) -> Sequence[int] | None:
+    # An explicit scope wins; otherwise the one resolved for the current question
+    return document_scope if document_scope is not None else current_document_scope.get()
+
+
+def _tombstoned() -> Set[str]:
+    user_id = current_user_id.get()
+    return tombstoned_sources(user_id) if user_id else set()
+
+
+def get_retriever(
+    k: int | None = None,
+    search_type: str = "similarity",
+    fetch_k: Optional[int] = None,
+    lambda_mult: Optional[float] = None,
+    *,
+    document_scope: Sequence[int] | None = None,
+):
+    settings = get_settings()
+    if k is None:
+        k = settings.retrieval_k
+
+    vector_store = get_namespace_store(tenant_spaces(current_user_id.get()).read)
+    search_kwargs: Dict[str, Any] = {
+        "k": k,
+        "filter": _build_filter(_active_scope(document_scope), _tombstoned()),
+    }
 
     if fetch_k is not None:
         search_kwargs["fetch_k"] = fetch_k
@@ -86,6 +240,18 @@ def get_retriever(
     return vector_store.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
 
 
+def _search_with_scores(
+    vector_store: VectorStore, query_vector: List[float], k: int, filter_dict: Dict[str, Any]
+) -> List[Document]:
+    """Similarity search that stamps each hit's relevance score into `metadata["score"]`."""
+    results = vector_store.similarity_search_by_vector_with_score(query_vector, k=k, filter=filter_dict)
+    docs = []
+    for doc, score in results:
+        doc.metadata["score"] = float(score)
+        docs.append(doc)
+    return hydrate_documents(docs)
+
+
 def retrieve(
     query: str,
     k: int | None = None,
@@ -93,21 +259,307 @@ def retrieve(
     fetch_k: Optional[int] = None,
     lambda_mult: Optional[float] = None,
     *,
-    document_scope: str | None = None,
+    document_scope: Sequence[int] | None = None,
 ) -> List[Document]:
-    retriever = get_retriever(
-        k=k,
-        search_type=search_type,
-        fetch_k=fetch_k,
-        lambda_mult=lambda_mult,
-        document_scope=document_scope,
+    """
+    Searches the current user's chunks, restricted to `document_scope` (document IDs)
+    or, by default, to the scope resolved for the current question. Similarity
+    results carry their relevance score in `metadata["score"]` (cosine similarity
+    for both backends).
+    """
+    document_scope = _active_scope(document_scope)
+    tombstoned = _tombstoned()
+
+    if search_type != "similarity":
+        retriever = get_retriever(
+            k=k,
+            search_type=search_type,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            document_scope=document_scope,
+        )
+        with timed("vector_search"):
+            docs = hydrate_documents(retriever.invoke(query))
+        RETRIEVAL_HITS.inc(len(docs), path="mmr")
+        return docs
+
+    settings = get_settings()
+    if k is None:
+        k = settings.retrieval_k
+
+    filter_dict = _build_filter(document_scope, tombstoned)
+    spaces = tenant_spaces(filter_dict["user_id"])
+    vector_store = get_namespace_store(spaces.read)
+
+    # Embed once and reuse the vector for both routing and the search itself
+    query_vector = embed_queries([query], version_for(spaces.read))[0]
+
+    # ---------------------------------------------------------
+    # FEATURE: Document Routing (auto-scope)
+    # ---------------------------------------------------------
+    # Without an explicit scope, narrow the search to the documents whose
+    # centroids best match the query. Fall back to the whole tenant partition
+    # if the routed documents cannot fill the top-K.
+    if not document_scope:
+        routed_ids = route_documents(query_vector, filter_dict["user_id"])
+        if routed_ids:
+            routed_filter = {**filter_dict, "doc_id": {"$in": routed_ids}}
+            with timed("vector_search", path="routed"):
+                docs = _search_with_scores(vector_store, query_vector, k, routed_filter)
+            RETRIEVAL_HITS.inc(len(docs), path="routed")
+            if len(docs) >= k:
+                return docs
+
+    with timed("vector_search", path="tenant"):
+        docs = _search_with_scores(vector_store, query_vector, k, filter_dict)
+    RETRIEVAL_HITS.inc(len(docs), path="tenant")
+
+    # ---------------------------------------------------------
+    # FEATURE: Dual Read During Embedding Cutover
+    # ---------------------------------------------------------
+    # Right after a tenant switched embedding versions, a chunk missed by the
+    # migration can still be found in the previous namespace. Its scores are not
+    # comparable, so those hits only fill the tail of a short result list.
+    if spaces.previous is not None and len(docs) < k:
+        seen = {d.id for d in docs}
+        previous_vector = embed_queries([query], version_for(spaces.previous))[0]
+        with timed("vector_search", path="previous"):
+            extra = _search_with_scores(get_namespace_store(spaces.previous), previous_vector, k, filter_dict)
+        extra = [d for d in extra if d.id not in seen][: k - len(docs)]
+        RETRIEVAL_HITS.inc(len(extra), path="previous")
+        docs += extra
+    return docs
+
+
+def fetch_chunks(ids: List[str]) -> List[Tuple[Document, np.ndarray]]:
+    """
+    Fetches stored chunks and their vectors by vector ID for the current user.
+
+    Chunks belonging to another tenant are silently dropped, so a stale or forged
+    ID list can never leak data across users.
+    """
+    if not ids:
+        return []
+
+    user_id = current_user_id.get()
+    if not user_id:
+        raise RuntimeError("FATAL: Attempted vector fetch without an authenticated user_id.")
+
+    # Vectors come from the namespace queries are embedded for, so they stay comparable
+    vector_store = get_namespace_store(tenant_spaces(user_id).read)
+    if isinstance(vector_store, LocalVectorStore):
+        fetched = vector_store.fetch(ids)
+    else:
+        try:
+            with timed("vector_fetch"):
+                vectors = vector_store.index.fetch(ids=ids, **_index_kwargs(vector_store)).vectors or {}
+        except PineconeApiException as e:
+            raise RuntimeError(f"Pinecone fetch failed: {e}") from e
+        fetched = []
+        for vid in ids:
+            record = vectors.get(vid)
+            if record is None:
+                continue
+            metadata = dict(record.metadata or {})
+            text = metadata.pop("text", "")
+            fetched.append((
+                Document(id=vid, page_content=text, metadata=metadata),
+                np.asarray(record.values, dtype=np.float32),
+            ))
+
+    hydrate_documents([doc for doc, _ in fetched])
+    tombstoned = tombstoned_sources(user_id)
+    return [
+        (doc, vec) for doc, vec in fetched
+        if doc.metadata.get("user_id") == user_id and doc.metadata.get("source") not in tombstoned
+    ]
+
+
+# Pinecone caps the number of IDs per fetch
+FETCH_BATCH = 100
+
+
+def _document_key(user_id: str, source: str) -> str:
+    """Stable per-document prefix for vector IDs (lets Pinecone `list(prefix=...)` a document)."""
+    return hashlib.sha1(f"{user_id}||{source}".encode("utf-8")).hexdigest()[:16]
+
+
+def _upsert_embeddings(
+    vector_store: VectorStore,
+    texts: List[str],
+    vectors: List[List[float]],
+    metadatas: List[dict],
+    ids: List[str],
+    batch_size: int = 100,
+    workers: int = 1,
+) -> None:
+    """
+    Writes pre-computed embeddings to whichever backend is configured. With
+    `workers` > 1, Pinecone batches are upserted concurrently (bulk loads).
+    """
+    if isinstance(vector_store, LocalVectorStore):
+        vector_store.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+        return
+
+    # PineconeVectorStore reads chunk text back from the "text" metadata key
+    records = [
+        (vid, vec, {**md, "text": text})
+        for vid, vec, md, text in zip(ids, vectors, metadatas, texts)
+    ]
+    batches = [records[i : i + batch_size] for i in range(0, len(records), batch_size)]
+    kwargs = _index_kwargs(vector_store)
+    if workers <= 1 or len(batches) <= 1:
+        for batch in batches:
+            vector_store.index.upsert(vectors=batch, **kwargs)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda batch: vector_store.index.upsert(vectors=batch, **kwargs), batches))
+
+
+def document_vectors(vector_store: VectorStore, user_id: str, source: str) -> List[Tuple[str, str, dict, np.ndarray]]:
+    """(vector ID, stored text, metadata, vector) for every vector of one document."""
+    if isinstance(vector_store, LocalVectorStore):
+        ids = vector_store.ids({"user_id": user_id, "source": source})
+        return [(doc.id, doc.page_content, doc.metadata, vec) for doc, vec in vector_store.fetch(ids)]
+
+    out = []
+    kwargs = _index_kwargs(vector_store)
+    try:
+        for id_page in vector_store.index.list(prefix=f"{_document_key(user_id, source)}#", **kwargs):
+            for i in range(0, len(id_page), FETCH_BATCH):
+                fetched = vector_store.index.fetch(ids=id_page[i : i + FETCH_BATCH], **kwargs).vectors or {}
+                for vid, record in fetched.items():
+                    metadata = dict(record.metadata or {})
+                    text = metadata.pop("text", "")
+                    out.append((vid, text, metadata, np.asarray(record.values, dtype=np.float32)))
+    except PineconeApiException as e:
+        raise RuntimeError(f"Pinecone fetch failed: {e}") from e
+    return out
+
+
+# ---------------------------------------------------------
+# FEATURE: Parent-Child Chunking
+# ---------------------------------------------------------
+# Small child chunks are embedded for precise matching; the parent section each
+# one came from is what the LLM reads. Both texts live in the local chunk store.
+
+# The only metadata kept on vectors when chunk text lives in the chunk store
+VECTOR_METADATA_KEYS = ("user_id", "doc_id", "source", "page", "page_label", "chunk_id", "parent_id", METADATA_KEY)
+
+
+def _split_parent_child(
+    docs: List[Document], doc_key: str
+) -> Tuple[List[Document], List[str], Dict[str, dict]]:
+    """
+    Splits pages into parent sections and each parent into child chunks.
+
+    Returns:
+        Tuple[List[Document], List[str], Dict[str, dict]]: The child chunks to embed,
+            their vector IDs, and the chunk store records of parents and children
+            (written by the caller once the vectors are upserted).
+    """
+    settings = get_settings()
+    parent_splitter = RecursiveCharacterTextSplitter(chunk_size=settings.parent_chunk_size, chunk_overlap=0)
+    child_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.child_chunk_size, chunk_overlap=settings.child_chunk_overlap
     )
-    return retriever.invoke(query)
 
+    parents = parent_splitter.split_documents(docs)
+    # Citations name the parent section, which is the text the LLM actually cites
+    assign_chunk_ids(parents)
+
+    children: List[Document] = []
+    ids: List[str] = []
+    records: Dict[str, dict] = {}
+    for p, parent in enumerate(parents):
+        parent_key = f"{doc_key}#p{p}"
+        records[parent_key] = {"text": parent.page_content}
+        for child in child_splitter.split_documents([parent]):
+            child.metadata["parent_id"] = parent_key
+            vector_id = f"{doc_key}#{len(children)}"
+            records[vector_id] = {"text": child.page_content, "parent_id": parent_key}
+            children.append(child)
+            ids.append(vector_id)
+    return children, ids, records
+
+
+def hydrate_documents(docs: List[Document]) -> List[Document]:
+    """Fills in chunk text from the chunk store for vectors stored without it (in place)."""
+    missing = [d for d in docs if not d.page_content and d.id]
+    if missing:
+        records = get_chunk_store().get_many(d.id for d in missing)
+        for doc in missing:
+            record = records.get(doc.id)
+            if record is not None:
+                doc.page_content = record["text"]
+    return docs
+
+
+def expand_to_parents(docs: List[Document]) -> List[Document]:
+    """
+    Replaces child chunks with their parent sections, keeping rank order and merging
+    children of the same parent. Chunks without a parent pass through unchanged.
+    """
+    parent_ids = [d.metadata.get("parent_id") for d in docs if d.metadata.get("parent_id")]
+    records = get_chunk_store().get_many(parent_ids) if parent_ids else {}
 
-def index_documents(docs: List[Document]) -> int:
+    out: List[Document] = []
+    seen = set()
+    for doc in docs:
+        parent_id = doc.metadata.get("parent_id")
+        record = records.get(parent_id) if parent_id else None
+        if record is None:
+            out.append(doc)
+            continue
+        if parent_id in seen:
+            continue
+        seen.add(parent_id)
+        # Keep the child's vector ID so the working set can re-fetch the matched chunk
+        out.append(Document(id=doc.id, page_content=record["text"], metadata=dict(doc.metadata)))
+    return out
+
+
+def _suppress_near_duplicates(
+    chunks: List[Document], ids: List[str], threshold: float
+) -> Tuple[List[Document], List[str]]:
+    """
+    Stamps a MinHash signature on each chunk (in place) and drops chunks nearly
+    identical to an earlier chunk of the same document, before they are embedded.
+    Copies across documents are left to query-time `diversify`: dropping them here
+    would lose the copy once the original is deleted.
+    """
+    index = LSHIndex()
+    kept_chunks: List[Document] = []
+    kept_ids: List[str] = []
+    for chunk, vector_id in zip(chunks, ids):
+        sig = signature(chunk.page_content)
+        if index.near_duplicate(sig, threshold) is not None:
+            continue
+        index.add(vector_id, sig)
+        chunk.metadata[METADATA_KEY] = encode_signature(sig)
+        kept_chunks.append(chunk)
+        kept_ids.append(vector_id)
+    if len(kept_chunks) < len(chunks):
+        NEAR_DUPLICATES.inc(len(chunks) - len(kept_chunks), stage="ingest")
+    return kept_chunks, kept_ids
+
+
+def index_documents(docs: List[Document], doc_id: int | None = None) -> Dict[str, Any]:
+    """
+    Chunks, embeds and upserts documents for the current user. `doc_id` is the
+    document's `user_files.id`, stamped on every vector for scope filtering.
+
+    While the tenant is migrating to another embedding version, chunks are written
+    to both the active and the target namespace, so the migrator can skip them.
+
+    Returns:
+        Dict[str, Any]: {"chunks_indexed": int, "centroid": np.ndarray | None,
+            "next_centroid": np.ndarray | None, "embedding_namespace": str}. The
+            centroid of the chunk embeddings (in the active namespace) feeds the
+            document routing index; next_centroid is the one in the target namespace.
+    """
     if not docs:
-        return 0
+        return {"chunks_indexed": 0, "centroid": None, "next_centroid": None, "embedding_namespace": None}
 
     # ---------------------------------------------------------
     # FEATURE: Tagging Documents for Multitenancy
@@ -120,62 +572,240 @@ def index_documents(docs: List[Document]) -> int:
     # LangChain's splitter will carry this metadata down to every single chunk.
     for doc in docs:
         doc.metadata["user_id"] = user_id
+        if doc_id is not None:
+            doc.metadata["doc_id"] = doc_id
 
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = splitter.split_documents(docs)
-
-    vector_store = _get_vector_store()
+    settings = get_settings()
+    source = str(docs[0].metadata.get("source", "unknown"))
+    doc_key = _document_key(user_id, source)
+
+    records: Dict[str, dict] = {}
+    if settings.chunk_store_enabled:
+        chunks, ids, records = _split_parent_child(docs, doc_key)
+    else:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+        chunks = splitter.split_documents(docs)
+        # Citation IDs are computed once here and travel with the vector metadata
+        assign_chunk_ids(chunks)
+        ids = [f"{doc_key}#{n}" for n in range(len(chunks))]
+    if settings.near_duplicate_suppression_enabled:
+        chunks, ids = _suppress_near_duplicates(chunks, ids, settings.near_duplicate_ingest_threshold)
+        if records:
+            # Suppressed children get no vector, so don't store their texts either
+            kept = set(ids) | {records[vid]["parent_id"] for vid in ids}
+            records = {key: record for key, record in records.items() if key in kept}
+    if not chunks:
+        return {"chunks_indexed": 0, "centroid": None, "next_centroid": None, "embedding_namespace": None}
+
+    texts = [c.page_content for c in chunks]
+    metadatas = [dict(c.metadata) for c in chunks]
+    if settings.chunk_store_enabled:
+        # Text lives in the chunk store; the index keeps only what filtering and citations need
+        stored_texts = [""] * len(texts)
+        metadatas = [{k: md[k] for k in VECTOR_METADATA_KEYS if k in md} for md in metadatas]
+    else:
+        stored_texts = texts
+
+    centroids: Dict[str, np.ndarray | None] = {}
+    namespaces = tenant_spaces(user_id).write
+    for namespace in namespaces:
+        # Embed once per version ourselves so the same vectors serve the upsert and the centroid
+        with timed("embedding.documents"):
+            vectors = get_embeddings_for(version_for(namespace)).embed_documents(texts)
+
+        try:
+            with timed("vector_upsert"):
+                _upsert_embeddings(get_namespace_store(namespace), stored_texts, vectors, metadatas, ids)
+        except PineconeApiException as e:
+            raise RuntimeError(f"Pinecone upsert failed: {e}") from e
+        centroids[namespace] = compute_centroid(vectors)
+
+    # A re-upload overwrites the `{doc_key}#{n}` IDs it reuses; drop the rest of the
+    # previous version only now, so a failed upsert leaves it searchable
+    _delete_stale_vectors(user_id, source, set(ids), namespaces)
+
+    if settings.chunk_store_enabled:
+        # Only replace the stored texts once the new vectors are in place
+        store = get_chunk_store()
+        store.delete_prefix(f"{doc_key}#")
+        store.put_many(records)
+
+    return {
+        "chunks_indexed": len(chunks),
+        "centroid": centroids[namespaces[0]],
+        "next_centroid": centroids[namespaces[-1]] if len(namespaces) > 1 else None,
+        "embedding_namespace": namespaces[-1],
+    }
+
+
+def _document_vector_ids(vector_store: VectorStore, user_id: str, source: str) -> List[str]:
+    if isinstance(vector_store, LocalVectorStore):
+        return vector_store.ids({"user_id": user_id, "source": source})
+    prefix = f"{_document_key(user_id, source)}#"
     try:
-        vector_store.add_documents(chunks)
+        return [vid for page in vector_store.index.list(prefix=prefix, **_index_kwargs(vector_store)) for vid in page]
     except PineconeApiException as e:
-        raise RuntimeError(f"Pinecone upsert failed: {e}") from e
+        raise RuntimeError(f"Pinecone list failed: {e}") from e
 
-    return len(chunks)
 
+def _delete_stale_vectors(user_id: str, source: str, current: Set[str], written: List[str]) -> None:
+    """
+    Deletes a document's vectors that are not in `current`; in namespaces other than
+    `written` every vector of the document is stale.
+    """
+    for namespace in tenant_spaces(user_id).all:
+        vector_store = get_namespace_store(namespace)
+        keep = current if namespace in written else set()
+        stale = [vid for vid in _document_vector_ids(vector_store, user_id, source) if vid not in keep]
+        if not stale:
+            continue
+        try:
+            for i in range(0, len(stale), FETCH_BATCH):
+                vector_store.delete(ids=stale[i : i + FETCH_BATCH])
+        except PineconeApiException as e:
+            raise RuntimeError(f"Pinecone targeted delete failed: {e}") from e
+
+
+def _delete_vectors(user_id: str, sources: List[str]) -> None:
+    """Deletes the vectors (not the chunk store records) of documents in every namespace."""
+    for namespace in tenant_spaces(user_id).all:
+        try:
+            # Pinecone allows filtering by multiple values using the "$in" operator
+            get_namespace_store(namespace).delete(filter={"user_id": user_id, "source": {"$in": list(sources)}})
+        except PineconeApiException as e:
+            raise RuntimeError(f"Pinecone targeted delete failed: {e}") from e
+
+
+def delete_source_vectors(user_id: str, sources: List[str]) -> None:
+    """
+    Deletes every vector of the given documents in one filtered call.
 
-def delete_user_vectors() -> None:
+    Takes the user explicitly: the deletion worker runs outside any request context.
+    Covers every embedding namespace the tenant has vectors in.
     """
-    Deletes ONLY the vectors belonging to the currently authenticated user.
+    if not sources:
+        return
+
+    _delete_vectors(user_id, sources)
+
+    store = get_chunk_store()
+    for source in sources:
+        store.delete_prefix(f"{_document_key(user_id, source)}#")
+
+
+def count_source_vectors(user_id: str, source: str) -> int:
+    """Counts the vectors still stored for one document in any of the tenant's namespaces."""
+    prefix = f"{_document_key(user_id, source)}#"
+    count = 0
+    for namespace in tenant_spaces(user_id).all:
+        vector_store = get_namespace_store(namespace)
+        if isinstance(vector_store, LocalVectorStore):
+            count += vector_store.count(filter={"user_id": user_id, "source": source})
+            continue
+
+        # Vector IDs are prefixed per document, so a prefix listing needs no metadata scan
+        try:
+            count += sum(len(page) for page in vector_store.index.list(prefix=prefix, **_index_kwargs(vector_store)))
+        except PineconeApiException as e:
+            raise RuntimeError(f"Pinecone list failed: {e}") from e
+    return count
+
+
+def list_indexed_sources() -> Set[Tuple[str, str]] | None:
     """
-    settings = get_settings()
-    user_id = current_user_id.get()
-    if not user_id:
-        raise RuntimeError("Cannot clear vectors: No active user context.")
+    Every (user_id, source) pair present in the vector store, for orphan detection.
 
-    pc = Pinecone(api_key=settings.pinecone_api_key)
-    index = pc.Index(settings.pinecone_index_name)
+    Returns None for Pinecone, whose metadata cannot be enumerated cheaply.
+    """
+    if get_settings().vector_backend != "local":
+        return None
+    sources: Set[Tuple[str, str]] = set()
+    for namespace in namespace_versions():
+        sources |= get_namespace_store(namespace).sources()
+    return sources
 
-    try:
-        # Pinecone allows destructive actions safely gated by metadata filters
-        index.delete(filter={"user_id": user_id})
-    except PineconeApiException as e:
-        raise RuntimeError(f"Pinecone delete_user_vectors failed: {e}") from e
 
+def backfill_doc_ids(documents: List[dict]) -> int:
+    """
+    Stamps `doc_id` on vectors indexed before documents had integer IDs, so scoped
+    and routed searches find them.
+
+    Args:
+        documents: {"id", "user_id", "file_path"} rows from `user_files`.
 
-def delete_specific_vectors(filenames: List[str]) -> None:
+    Returns:
+        int: The number of vectors updated.
     """
-    Deletes specific vectors from Pinecone based on the filenames.
+    vector_store = _get_vector_store()
+    updated = 0
+    for row in documents:
+        if isinstance(vector_store, LocalVectorStore):
+            updated += vector_store.update_metadata(
+                {"user_id": row["user_id"], "source": row["file_path"]}, {"doc_id": row["id"]}
+            )
+            continue
+
+        prefix = f"{_document_key(row['user_id'], row['file_path'])}#"
+        try:
+            for id_page in vector_store.index.list(prefix=prefix):
+                for vid in id_page:
+                    vector_store.index.update(id=vid, set_metadata={"doc_id": row["id"]})
+                updated += len(id_page)
+        except PineconeApiException as e:
+            raise RuntimeError(f"Pinecone metadata backfill failed: {e}") from e
+    return updated
+
+
+def reproject_vectors(dimensions: int, target_index: str | None = None, batch_size: int = 100) -> int:
+    """
+    Re-projects every stored vector to a smaller Matryoshka dimension.
+
+    The local backend is rewritten in place. Pinecone index dimensions are immutable,
+    so for Pinecone the truncated vectors are copied into `target_index`, which must
+    already exist with the new dimension. Point `PINECONE_INDEX_NAME` at it and set
+    `OPENAI_EMBEDDING_DIMENSIONS` once the copy has finished.
+
+    Returns:
+        int: The number of vectors re-projected.
     """
-    if not filenames:
-        return
-        
     settings = get_settings()
-    user_id = current_user_id.get()
-    
-    if not user_id:
-        raise RuntimeError("Cannot clear vectors: No active user context.")
 
-    pc = Pinecone(api_key=settings.pinecone_api_key)
-    index = pc.Index(settings.pinecone_index_name)
+    if settings.vector_backend == "local":
+        store = LocalVectorStore(
+            _get_embeddings(),
+            path=settings.local_vector_store_path,
+            quantization=settings.local_vector_quantization,
+            rescore_factor=settings.local_vector_rescore_factor,
+        )
+        return store.reproject(dimensions)
 
-    # Reconstruct the exact source paths that were injected during indexing
-    sources = [str(Path(f"data/uploads/{user_id}/{fname}")) for fname in filenames]
+    if not target_index:
+        raise ValueError("Pinecone re-projection requires a target index with the new dimension.")
 
-    try:
-        # Pinecone allows filtering by multiple values using the "$in" operator
-        index.delete(filter={
-            "user_id": user_id,
-            "source": {"$in": sources}
-        })
-    except PineconeApiException as e:
-        raise RuntimeError(f"Pinecone targeted delete failed: {e}") from e
\ No newline at end of file
+    pc = Pinecone(api_key=settings.pinecone_api_key)
+    target_dim = _extract_index_dimension(pc, target_index)
+    if target_dim is not None and target_dim != dimensions:
+        raise RuntimeError(f"Target index '{target_index}' has dimension {target_dim}, expected {dimensions}.")
+
+    source = pc.Index(settings.pinecone_index_name)
+    target = pc.Index(target_index)
+
+    migrated = 0
+    for id_page in source.list():
+        for i in range(0, len(id_page), batch_size):
+            batch_ids = id_page[i : i + batch_size]
+            fetched = source.fetch(ids=batch_ids).vectors
+            if not fetched:
+                continue
+            ids = list(fetched.keys())
+            values = truncate_and_normalize([fetched[vid].values for vid in ids], dimensions)
+            try:
+                target.upsert(vectors=[
+                    (vid, vec.tolist(), fetched[vid].metadata or {})
+                    for vid, vec in zip(ids, values)
+                ])
+            except PineconeApiException as e:
+                raise RuntimeError(f"Pinecone re-projection upsert failed: {e}") from e
+            migrated += len(ids)
+
+    return migrated
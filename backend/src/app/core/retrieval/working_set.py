@@ -0,0 +1,107 @@
+"""
+Conversation Working Set Module
+
+Follow-up questions ("and what about section 4?") are usually answered by the same
+handful of chunks the previous turns already retrieved. Each thread therefore keeps
+a compact working set: the vector IDs of recently cited chunks, persisted in the
+graph state. Only IDs are checkpointed; the chunk text and vectors are resolved
+through a process-local LRU cache and, on a miss, one batched vector-store fetch.
+Cache entries are keyed by tenant and embedding namespace as well as vector ID:
+thread IDs are client-supplied, so a hit must never bypass the tenant check that
+`fetch_chunks` applies, and vectors from a namespace the tenant has moved away
+from are not comparable with its query vectors.
+
+Follow-up sub-questions are re-ranked against the working set first. The full
+retrieval agent (an LLM call plus a vector query) only runs when the working set
+does not cover the question well enough.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ..config import current_user_id
+from ..deletion import tombstoned_sources
+from ..metrics import record_cache
+from .embedding_spaces import tenant_spaces
+from .vector_store import fetch_chunks
+
+# Process-wide cap on cached chunks (text + vector) across all threads
+_CACHE_MAX_ENTRIES = 4096
+
+# (user_id, namespace, vector ID) -> (Document, vector)
+_cache: "OrderedDict[Tuple[str, str, str], Tuple[Document, np.ndarray]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_working_set(ids: Sequence[str]) -> List[Tuple[Document, np.ndarray]]:
+    """Resolves working-set IDs to (Document, vector) pairs, fetching only cache misses."""
+    user_id = current_user_id.get()
+    if not ids or not user_id:
+        return []
+    namespace = tenant_spaces(user_id).read
+
+    with _cache_lock:
+        missing = [vid for vid in ids if (user_id, namespace, vid) not in _cache]
+    record_cache("working_set", hit=True, count=len(ids) - len(missing))
+    record_cache("working_set", hit=False, count=len(missing))
+
+    if missing:
+        # Tenant-checked and read from the tenant's current namespace
+        fetched = fetch_chunks(missing)
+        with _cache_lock:
+            for doc, vec in fetched:
+                _cache[(user_id, namespace, doc.id)] = (doc, vec)
+            while len(_cache) > _CACHE_MAX_ENTRIES:
+                _cache.popitem(last=False)
+
+    # Chunks of documents deleted since they were cached must not resurface
+    tombstoned = tombstoned_sources(user_id)
+
+    out: List[Tuple[Document, np.ndarray]] = []
+    with _cache_lock:
+        for vid in ids:
+            key = (user_id, namespace, vid)
+            entry = _cache.get(key)
+            if entry is not None and entry[0].metadata.get("source") not in tombstoned:
+                _cache.move_to_end(key)
+                out.append(entry)
+    return out
+
+
+def rerank_working_set(
+    query_vector: Sequence[float],
+    chunks: List[Tuple[Document, np.ndarray]],
+    min_score: float,
+    top_n: int,
+) -> List[Document]:
+    """Returns the working-set chunks scoring at least `min_score`, best first."""
+    if not chunks:
+        return []
+
+    q = np.asarray(query_vector, dtype=np.float32)
+    q_norm = np.linalg.norm(q)
+    if q_norm:
+        q = q / q_norm
+
+    matrix = np.vstack([vec for _, vec in chunks])
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    scores = (matrix @ q) / norms
+
+    order = np.argsort(-scores)[:top_n]
+    return [chunks[i][0] for i in order if scores[i] >= min_score]
+
+
+def update_working_set(previous: Sequence[str], recent: Sequence[str], max_size: int) -> List[str]:
+    """Most-recently-used ordering: this turn's IDs first, then older ones, capped."""
+    merged: List[str] = []
+    for vid in list(recent) + list(previous):
+        if vid and vid not in merged:
+            merged.append(vid)
+    return merged[:max_size]
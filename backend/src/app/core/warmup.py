@@ -0,0 +1,136 @@
+"""
+Worker Warm-up and Shutdown Module
+
+A freshly booted worker otherwise pays for every lazy singleton on its first
+request: building the agents and the compiled graph, opening the checkpoint
+connection pool, connecting to the vector index and fetching Clerk's JWKS.
+
+`warm_up()` front-loads that work during the FastAPI lifespan, before the worker
+reports ready. Every step is best-effort: a failing dependency is logged and
+retried lazily on first use instead of preventing the worker from starting.
+
+`shutdown()` is its counterpart at the end of the lifespan: it closes every pool
+and client the worker opened and drops the memoized singletons, so a worker
+recycled by gunicorn (`--max-requests`) returns its DB connections immediately.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from .config import get_settings
+from .metrics import record_stage
+
+logger = logging.getLogger(__name__)
+
+
+def _open_checkpoint_pool() -> None:
+    from .agents import graph
+
+    graph.get_postgres_saver()
+
+
+def _build_graph() -> None:
+    from .agents import graph
+    from .agents.agents import build_agents
+
+    build_agents()
+    graph.get_qa_graph()
+
+
+def _connect_vector_store() -> None:
+    from .retrieval import vector_store
+    from .retrieval.chunk_store import get_chunk_store
+
+    vector_store._get_vector_store()
+    if get_settings().chunk_store_enabled:
+        get_chunk_store()
+
+
+DEFAULT_STEPS: Dict[str, Callable[[], None]] = {
+    "checkpoint_pool": _open_checkpoint_pool,
+    "graph": _build_graph,
+    "vector_store": _connect_vector_store,
+}
+
+
+def warm_up(extra_steps: Optional[Dict[str, Callable[[], None]]] = None) -> Dict[str, float]:
+    """
+    Runs each warm-up step once.
+
+    Args:
+        extra_steps: Additional named steps (e.g. the API's JWKS prefetch).
+
+    Returns:
+        Dict[str, float]: Seconds spent per step; failed steps are reported as -1.
+    """
+    report: Dict[str, float] = {}
+    for name, step in {**DEFAULT_STEPS, **(extra_steps or {})}.items():
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warm-up step '%s' failed; it will be retried on first use.", name)
+            report[name] = -1.0
+            continue
+        report[name] = round(time.perf_counter() - start, 4)
+        record_stage(f"warmup.{name}", report[name])
+    return report
+
+
+def _is_built(factory_fn: Callable) -> bool:
+    # Stand-ins (benchmarks) may replace the memoized factories with plain callables
+    info = getattr(factory_fn, "cache_info", None)
+    return bool(info and info().currsize)
+
+
+def shutdown() -> None:
+    """Closes pools/clients opened by this worker and clears the memoized singletons."""
+    from .agents import agents, graph
+    from .cache import close_cache
+    from .deletion import get_deletion_worker
+    from .embedding_migration import get_embedding_migrator
+    from .llm import factory, scheduler
+    from .retrieval import chunk_store, embedding_spaces, vector_store
+
+    if _is_built(get_deletion_worker):
+        get_deletion_worker().stop()
+    if _is_built(get_embedding_migrator):
+        get_embedding_migrator().stop()
+
+    if _is_built(graph.get_postgres_saver):
+        try:
+            graph.get_postgres_saver().conn.close()
+        except Exception:
+            logger.exception("Failed to close the checkpoint connection pool.")
+
+    if _is_built(factory._get_http_client):
+        factory._get_http_client().close()
+
+    close_cache()
+
+    for cached in (
+        graph.get_qa_graph,
+        graph.get_postgres_saver,
+        agents.get_planning_agent,
+        agents.get_retrieval_agent,
+        agents.get_context_critic_agent,
+        agents.get_summarization_agent,
+        agents.get_verification_agent,
+        factory.create_chat_model,
+        factory._get_http_client,
+        get_deletion_worker,
+        get_embedding_migrator,
+        scheduler.get_llm_scheduler,
+        vector_store._get_vector_store,
+        vector_store._get_embeddings,
+        vector_store.get_namespace_store,
+        vector_store.get_embeddings_for,
+        embedding_spaces.namespace_versions,
+        chunk_store.get_chunk_store,
+    ):
+        cache_clear = getattr(cached, "cache_clear", None)
+        if cache_clear is not None:
+            cache_clear()
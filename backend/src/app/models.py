@@ -1,15 +1,34 @@
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Literal, Optional, List, Union
 from pydantic import BaseModel, Field
 from datetime import datetime
 
 class QuestionRequest(BaseModel):
     question: str = Field(..., description="The user's question.")
     thread_id: Optional[str] = Field(None, description="Unique session ID for memory.")
-    document_scope: Optional[str] = Field(None, description="Optional specific PDF filename to query.")
+    document_scope: Optional[Union[str, List[str]]] = Field(
+        None, description="Optional PDF filename, or list of filenames, to restrict the question to."
+    )
+    collection: Optional[str] = Field(
+        None, description="Optional collection; every document in it is added to the scope."
+    )
+    include_timings: bool = Field(False, description="Return per-stage latency and token usage.")
+    priority: Literal["interactive", "bulk"] = Field(
+        "interactive", description="Admission lane; bulk requests yield to interactive ones."
+    )
+    verbosity: Literal["minimal", "standard", "full"] = Field(
+        "standard",
+        description=(
+            "minimal: answer + citation references; standard: adds snippets, plan, traces and "
+            "critic rationale; full: adds the CONTEXT blocks and full citation text."
+        ),
+    )
+    fields: Optional[List[str]] = Field(
+        None, description="Explicit list of response fields to return (overrides verbosity)."
+    )
 
 class QAResponse(BaseModel):
     answer: str
-    context: str
+    context: Optional[str] = None
     plan: Optional[str] = None
     sub_questions: Optional[List[str]] = None
     citations: Optional[Dict[str, Any]] = None
@@ -22,15 +41,40 @@ class QAResponse(BaseModel):
     confidence: str = "low"
     thread_id: Optional[str] = None
 
+    # Per-stage wall time and per-agent token/cost usage (only when requested)
+    timings: Optional[Dict[str, Any]] = None
+
+class ChunkItem(BaseModel):
+    vector_id: str
+    chunk_id: Optional[str] = None
+    text: str
+    source: Optional[str] = None
+    page: Optional[Any] = None
+    page_label: Optional[Any] = None
+
+class ChunkListResponse(BaseModel):
+    chunks: List[ChunkItem]
+
 # --- MODELS FOR FILE MANAGEMENT ---
 
 class FileItem(BaseModel):
     id: int
     filename: str
     upload_timestamp: datetime
+    summary: Optional[str] = None
+    file_size: Optional[int] = None
+    page_count: Optional[int] = None
+    chunk_count: Optional[int] = None
+    content_hash: Optional[str] = None
+    collection: Optional[str] = None
 
 class FileListResponse(BaseModel):
     files: List[FileItem]
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page.")
 
 class DeleteFilesRequest(BaseModel):
-    filenames: List[str]
\ No newline at end of file
+    filenames: List[str]
+
+class SetCollectionRequest(BaseModel):
+    filenames: List[str]
+    collection: Optional[str] = Field(None, description="Target collection; null removes the files from theirs.")
\ No newline at end of file
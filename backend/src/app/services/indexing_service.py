@@ -1,16 +1,85 @@
 """
 Document Indexing Service Module
 """
+import logging
 from pathlib import Path
+from typing import Any, Dict, List
+
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage, SystemMessage
 # CHANGED: Swapped PyPDFLoader for the much more robust PyMuPDFLoader
 from langchain_community.document_loaders import PyMuPDFLoader
+
+from ..core.agents.prompts import DOCUMENT_SUMMARY_SYSTEM_PROMPT
+from ..core.llm.factory import create_chat_model
+from ..core.metrics import Counter, instrumented, register
+from ..core.retrieval.routing import encode_centroid
 from ..core.retrieval.vector_store import index_documents
+from .page_triage import triage_pages
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FALLBACKS = register(Counter(
+    "intellirag_summary_fallbacks_total",
+    "Documents routed by their leading text because summarization failed, by reason.",
+))
 
-def index_pdf_file(file_path: Path) -> int:
+# Only the opening of a document is sent to the summarizer to bound ingestion cost
+SUMMARY_INPUT_CHARS = 6000
+SUMMARY_FALLBACK_CHARS = 500
+
+
+def summarize_document(docs: List[Document]) -> str:
     """
-    Parses a physical PDF file from disk and orchestrates ingestion.
+    Generates a compact summary for the document routing index.
+
+    Falls back to the document's leading text if the LLM call fails, so a
+    summarizer outage never blocks ingestion.
+    """
+    text = "\n".join((d.page_content or "").strip() for d in docs).strip()
+    if not text:
+        return ""
+
+    try:
+        result = create_chat_model().invoke([
+            SystemMessage(content=DOCUMENT_SUMMARY_SYSTEM_PROMPT),
+            HumanMessage(content=text[:SUMMARY_INPUT_CHARS]),
+        ])
+        summary = str(result.content).strip()
+        if summary:
+            return summary
+        SUMMARY_FALLBACKS.inc(reason="empty")
+    except Exception:
+        logger.warning("Document summarization failed; using the leading text", exc_info=True)
+        SUMMARY_FALLBACKS.inc(reason="error")
+    return " ".join(text[:SUMMARY_FALLBACK_CHARS].split())
+
+
+@instrumented("index_pdf")
+def index_pdf_file(file_path: Path, doc_id: int | None = None) -> Dict[str, Any]:
+    """
+    Parses a physical PDF file from disk and orchestrates ingestion. `doc_id` (the
+    `user_files.id`) is stamped on every vector for document scoping. Blank,
+    image-only and duplicate pages and running headers/footers never reach the
+    embedding API (see `page_triage`).
+
+    Returns:
+        Dict[str, Any]: {"chunks_indexed", "page_count", "summary", "centroid",
+            "next_centroid", "embedding_namespace", "skipped_pages"} where the
+            centroids are packed float32 bytes ready for the metadata store.
     """
     # PyMuPDFLoader is faster and ignores 'bbox' layout errors
     loader = PyMuPDFLoader(str(file_path))
     docs = loader.load()
-    return index_documents(docs)
\ No newline at end of file
+    page_count = len(docs)
+    docs, triage = triage_pages(docs, file_path)
+    indexed = index_documents(docs, doc_id=doc_id)
+    return {
+        "chunks_indexed": indexed["chunks_indexed"],
+        "page_count": page_count,
+        "summary": summarize_document(docs),
+        "centroid": encode_centroid(indexed["centroid"]),
+        "next_centroid": encode_centroid(indexed["next_centroid"]),
+        "embedding_namespace": indexed["embedding_namespace"],
+        "skipped_pages": triage,
+    }
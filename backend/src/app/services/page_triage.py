@@ -0,0 +1,173 @@
+"""
+Page Triage Module
+
+`PyMuPDFLoader` returns every page as-is. Blank pages, scanned pages without a text
+layer, running headers/footers and repeated pages (cover sheets, legal notices,
+slide handouts) then get chunked, embedded and stored like real content: they cost
+embedding calls and their chunks crowd genuine matches out of the top-K.
+
+`triage_pages` runs between loading and chunking:
+
+1. Pages with (almost) no text are dropped and flagged as "blank" or, when the page
+   holds images, "image_only" (a scan that would need OCR, which is not run here).
+2. Lines that recur at the top or bottom of many pages (after masking digits, so
+   "Page 3 of 40" matches "Page 4 of 40") are stripped as running headers/footers.
+3. Pages whose remaining text nearly duplicates an earlier page (word-shingle
+   Jaccard similarity) are collapsed into the first occurrence. MinHash LSH picks
+   the candidate pairs, so long documents are not compared page against page.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import Counter as TallyCounter
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+from langchain_core.documents import Document
+
+from ..core.config import get_settings
+from ..core.metrics import Counter, register
+from ..core.retrieval.minhash import LSHIndex, signature
+
+TRIAGED_PAGES = register(Counter("intellirag_triaged_pages_total", "PDF pages skipped before chunking, by reason."))
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+_WORDS = re.compile(r"\w+")
+
+SHINGLE_SIZE = 5
+# Running headers/footers are short; longer lines are body text even at a page edge
+BOILERPLATE_MAX_CHARS = 100
+
+
+def _line_key(line: str) -> str:
+    if len(line) > BOILERPLATE_MAX_CHARS:
+        return ""
+    return _SPACES.sub(" ", _DIGITS.sub("#", line)).strip().lower()
+
+
+def _page_index(doc: Document, fallback: int) -> int:
+    page = doc.metadata.get("page")
+    return page if isinstance(page, int) else fallback
+
+
+def _classify_empty(file_path: Path | None, pages: List[int]) -> Dict[int, str]:
+    """"image_only" for text-less pages that hold images, "blank" otherwise."""
+    kinds = {page: "blank" for page in pages}
+    if file_path is None or not pages:
+        return kinds
+    try:
+        import pymupdf
+
+        with pymupdf.open(str(file_path)) as pdf:
+            for page in pages:
+                if 0 <= page < pdf.page_count and pdf[page].get_images(full=False):
+                    kinds[page] = "image_only"
+    except Exception:
+        pass
+    return kinds
+
+
+def _strip_boilerplate(docs: List[Document]) -> int:
+    """
+    Removes running headers/footers in place.
+
+    Returns:
+        int: The number of lines removed.
+    """
+    settings = get_settings()
+    depth = settings.page_triage_boilerplate_lines
+    if len(docs) < settings.page_triage_boilerplate_min_pages:
+        return 0
+
+    def edges(lines: List[str]) -> List[Tuple[str, str]]:
+        head = [("top", _line_key(line)) for line in lines[:depth]]
+        tail = [("bottom", _line_key(line)) for line in lines[-depth:]]
+        return head + tail
+
+    page_lines = [[line for line in d.page_content.splitlines() if line.strip()] for d in docs]
+    tally: TallyCounter = TallyCounter()
+    for lines in page_lines:
+        tally.update(set(edges(lines)))
+    threshold = max(2, settings.page_triage_boilerplate_ratio * len(docs))
+    boilerplate = {key for key, count in tally.items() if count >= threshold and key[1]}
+    if not boilerplate:
+        return 0
+
+    removed = 0
+    for doc, lines in zip(docs, page_lines):
+        keep = []
+        for i, line in enumerate(lines):
+            key = _line_key(line)
+            position = "top" if i < depth else "bottom" if i >= len(lines) - depth else None
+            if position and (position, key) in boilerplate:
+                removed += 1
+                continue
+            keep.append(line)
+        doc.page_content = "\n".join(keep)
+    return removed
+
+
+def _shingles(text: str) -> Set[int]:
+    words = _WORDS.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {hash(" ".join(words))} if words else set()
+    return {hash(" ".join(words[i : i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def triage_pages(docs: List[Document], file_path: Path | None = None) -> Tuple[List[Document], Dict[str, Any]]:
+    """
+    Drops empty pages, strips running headers/footers and collapses near-duplicate pages.
+
+    Returns:
+        Tuple[List[Document], Dict[str, Any]]: The pages to chunk, and a report with
+            the 1-based page numbers skipped per reason ("blank", "image_only",
+            "duplicate") and the number of boilerplate lines stripped.
+    """
+    settings = get_settings()
+    report: Dict[str, Any] = {"blank": [], "image_only": [], "duplicate": [], "boilerplate_lines": 0}
+    if not settings.page_triage_enabled or not docs:
+        return docs, report
+
+    min_chars = settings.page_triage_min_chars
+    numbers = [_page_index(d, i) for i, d in enumerate(docs)]
+    empty = [i for i, d in enumerate(docs) if len((d.page_content or "").strip()) < min_chars]
+    kinds = _classify_empty(file_path, [numbers[i] for i in empty])
+    for i in empty:
+        report[kinds[numbers[i]]].append(numbers[i] + 1)
+    empty_set = set(empty)
+    remaining = [i for i in range(len(docs)) if i not in empty_set]
+    pages = [docs[i] for i in remaining]
+
+    report["boilerplate_lines"] = _strip_boilerplate(pages)
+
+    threshold = settings.page_triage_duplicate_threshold
+    kept: List[Document] = []
+    kept_shingles: List[Set[int]] = []
+    index = LSHIndex()
+    for i, doc in zip(remaining, pages):
+        shingles = _shingles(doc.page_content)
+        sig = signature(doc.page_content)
+        duplicate = False
+        # LSH only proposes candidates; the exact shingle Jaccard decides
+        for k in index.candidates(sig):
+            other = kept_shingles[k]
+            # Jaccard can't exceed the size ratio, which skips most comparisons
+            small, large = sorted((len(shingles), len(other)))
+            if not large or small / large < threshold:
+                continue
+            if len(shingles & other) / len(shingles | other) >= threshold:
+                duplicate = True
+                break
+        if duplicate:
+            report["duplicate"].append(numbers[i] + 1)
+            continue
+        index.add(len(kept), sig)
+        kept.append(doc)
+        kept_shingles.append(shingles)
+
+    for reason in ("blank", "image_only", "duplicate"):
+        if report[reason]:
+            TRIAGED_PAGES.inc(len(report[reason]), reason=reason)
+    return kept, report
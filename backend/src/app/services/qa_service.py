@@ -10,11 +10,49 @@ internal state management, checkpointers, or node execution flow. It simply call
 a service function and receives a formatted dictionary in return.
 """
 
-from typing import Dict, Any
-from ..core.agents.graph import run_qa_flow
+import hashlib
+import json
+from typing import Dict, Any, List
 
+from ..core.agents.graph import record_turn, run_qa_flow, thread_memory
+from ..core.cache import cache_get, cache_set, get_cache
+from ..core.config import current_user_id, get_settings
+from ..core.metrics import collect_timings, timed
 
-def answer_question(question: str, thread_id: str, document_scope: str | None = None) -> Dict[str, Any]:
+
+def _corpus_version(user_id: str) -> int:
+    return get_cache().counter(f"corpus_version:{user_id}")
+
+
+def _answer_cache_ttl() -> int:
+    # A per-process cache only sees the version bumps of the worker that took the
+    # upload/delete; other workers would keep serving answers over the old corpus
+    settings = get_settings()
+    if settings.cache_backend == "memory" and settings.web_concurrency > 1:
+        return 0
+    return settings.answer_cache_ttl
+
+
+def invalidate_answers(user_id: str) -> None:
+    """Bumps the tenant's corpus version so answers cached before an upload/delete miss."""
+    get_cache().incr(f"corpus_version:{user_id}")
+
+
+# Only a thread's first turn is cached: later turns are planned against the
+# previous question and working set, which the key does not capture
+def _answer_key(user_id: str, question: str, document_scope: List[int] | None) -> str:
+    normalized = " ".join(question.lower().split())
+    scope = ",".join(map(str, sorted(document_scope or ())))
+    raw = f"{user_id}|{_corpus_version(user_id)}|{scope}|{normalized}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def answer_question(
+    question: str,
+    thread_id: str,
+    document_scope: List[int] | None = None,
+    include_timings: bool = False,
+) -> Dict[str, Any]:
     """
     Executes the multi-agent QA flow and retrieves a verified answer.
 
@@ -31,9 +69,12 @@ def answer_question(question: str, thread_id: str, document_scope: str | None =
         question (str): The raw, natural language question submitted by the user.
         thread_id (str): A unique session identifier (e.g., a UUID) generated by the 
             frontend to isolate and persist this specific conversation's memory.
-        document_scope (str | None): Optional filename (e.g., "report.pdf"). If provided, 
-            it strictly bounds the vector database retrieval to only that document, 
-            preventing cross-contamination of answers from other uploaded files.
+        document_scope (List[int] | None): Optional document IDs, resolved from the
+            requested files/collection by `scopes.resolve_scope`. If provided, it strictly
+            bounds the vector database retrieval to those documents, preventing
+            cross-contamination of answers from other uploaded files.
+        include_timings (bool): If True, attaches a "timings" block with per-stage
+            wall time and per-agent token usage/cost to the payload.
 
     Returns:
         Dict[str, Any]: A comprehensive payload containing:
@@ -43,6 +84,92 @@ def answer_question(question: str, thread_id: str, document_scope: str | None =
             - "sub_questions": The actual queries executed against the vector store.
             - "citations": A dictionary mapping chunk IDs to their metadata.
             - "confidence": A deterministic string ("high", "medium", "low").
+            - "timings": Only when `include_timings` is True.
     """
+    ttl = _answer_cache_ttl()
+    user_id = current_user_id.get()
+
     # Delegate the complex DAG execution to the graph module
-    return run_qa_flow(question, thread_id=thread_id, document_scope=document_scope)
\ No newline at end of file
+    with collect_timings() as timings:
+        with timed("qa_total"):
+            cache_key = None
+            if ttl and user_id and not thread_memory(thread_id)["previous_question"]:
+                cache_key = _answer_key(user_id, question, document_scope)
+            cached = cache_get("answer", cache_key) if cache_key else None
+            if cached is not None:
+                result = json.loads(cached)
+                # The graph did not run, so advance the thread's memory ourselves
+                record_turn(thread_id, question, result)
+            else:
+                result = run_qa_flow(question, thread_id=thread_id, document_scope=document_scope)
+                if cache_key:
+                    cache_set("answer", cache_key, json.dumps(result, default=str).encode("utf-8"), ttl=ttl)
+
+    if include_timings:
+        result["timings"] = timings.as_dict()
+    return result
+
+# ==============================================================================
+# Response projection
+# ==============================================================================
+
+# Fields returned per verbosity level; "full" is every QAResponse field
+VERBOSITY_FIELDS = {
+    "minimal": ("answer", "confidence", "thread_id", "citations", "timings"),
+    "standard": (
+        "answer", "confidence", "thread_id", "citations", "timings",
+        "plan", "sub_questions", "retrieval_traces", "context_rationale",
+    ),
+    "full": (
+        "answer", "confidence", "thread_id", "citations", "timings",
+        "plan", "sub_questions", "retrieval_traces", "context_rationale",
+        "context", "raw_context",
+    ),
+}
+
+# Citation keys per verbosity; full chunk text is otherwise fetched via GET /chunks
+_CITATION_KEYS = {
+    "minimal": ("page", "page_label", "source", "vector_id"),
+    "standard": ("page", "page_label", "source", "vector_id", "snippet", "score"),
+    "full": ("page", "page_label", "source", "vector_id", "snippet", "score", "text"),
+}
+
+
+def build_qa_payload(
+    result: Dict[str, Any],
+    thread_id: str,
+    verbosity: str = "standard",
+    fields: list[str] | None = None,
+) -> Dict[str, Any]:
+    """
+    Projects a QA result down to what the client asked for.
+
+    `fields` (if given) selects response fields explicitly; otherwise `verbosity`
+    decides. Citations always carry their `vector_id`, so omitted chunk text can be
+    fetched on demand instead of being shipped with every answer.
+    """
+    selected = set(fields) & set(VERBOSITY_FIELDS["full"]) if fields else set(VERBOSITY_FIELDS[verbosity])
+    selected.add("answer")
+
+    full = {
+        "answer": result.get("answer", ""),
+        "confidence": result.get("confidence", "low"),
+        "thread_id": thread_id,
+        "plan": result.get("plan"),
+        "sub_questions": result.get("sub_questions"),
+        "retrieval_traces": result.get("retrieval_traces"),
+        "context_rationale": result.get("context_rationale"),
+        "context": result.get("context", ""),
+        "raw_context": result.get("raw_context"),
+        "timings": result.get("timings"),
+    }
+    payload = {key: value for key, value in full.items() if key in selected and value is not None}
+
+    if "citations" in selected:
+        # An explicit `fields` request for citations gets the verbosity's citation shape
+        keys = _CITATION_KEYS[verbosity]
+        payload["citations"] = {
+            chunk_id: {k: meta.get(k) for k in keys if k in meta}
+            for chunk_id, meta in (result.get("citations") or {}).items()
+        }
+    return payload
@@ -0,0 +1,61 @@
+import asyncio
+
+from src.app.core.admission import AdmissionController
+
+
+def _controller(**overrides) -> AdmissionController:
+    params = dict(
+        max_in_flight=8,
+        per_user_max_in_flight=2,
+        per_user_max_queued=4,
+        bulk_max_in_flight=2,
+        max_queue=64,
+        queue_timeout=0.5,
+    )
+    params.update(overrides)
+    return AdmissionController(**params)
+
+
+def test_other_tenant_not_blocked_by_noisy_neighbor_backlog():
+    async def scenario() -> None:
+        controller = _controller()
+        release = asyncio.Event()
+
+        async def request(user_id: str) -> None:
+            async with controller.slot(user_id):
+                await release.wait()
+
+        # Tenant A: two requests run, two wait on A's own per-user limit
+        noisy = [asyncio.create_task(request("a")) for _ in range(4)]
+        await asyncio.sleep(0)
+        assert controller._user_in_flight["a"] == 2
+        assert controller._queued() == 2
+
+        # Tenant B arrives later and must take one of the six idle slots at once
+        await asyncio.wait_for(controller.acquire("b", "interactive"), timeout=0.1)
+        assert controller._user_in_flight["b"] == 1
+        assert controller._queued() == 2
+
+        controller.release("b", "interactive", 0.0)
+        release.set()
+        await asyncio.gather(*noisy)
+        assert controller._total_in_flight() == 0
+        assert controller._queued() == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiters_keep_fifo_order_within_a_user():
+    async def scenario() -> None:
+        controller = _controller(max_in_flight=1, per_user_max_in_flight=1)
+        order = []
+
+        async def request(i: int) -> None:
+            async with controller.slot("a"):
+                order.append(i)
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(request(i) for i in range(3)))
+        assert order == [0, 1, 2]
+
+    asyncio.run(scenario())
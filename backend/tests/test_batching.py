@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from src.app.core.llm.batching import MicroBatcher
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_idle_submit_is_sent_alone():
+    calls = []
+    batcher = MicroBatcher(lambda items: calls.append(list(items)) or [i * 2 for i in items], name="t")
+    assert batcher.submit(3) == 6
+    assert batcher.submit_many([1, 2]) == [2, 4]
+    assert calls == [[3], [1, 2]]
+
+
+def test_queued_callers_share_one_batch_and_the_leader_hands_off():
+    release = threading.Event()
+    calls = []
+
+    def batch_fn(items):
+        calls.append((threading.current_thread().name, list(items)))
+        if len(calls) == 1:
+            release.wait(5)
+        return [f"r{i}" for i in items]
+
+    batcher = MicroBatcher(batch_fn, name="t", max_in_flight=1)
+    results = {}
+
+    def call(item):
+        results[item] = batcher.submit(item)
+
+    first = threading.Thread(target=call, args=("a",), name="first")
+    first.start()
+    _wait_for(lambda: len(calls) == 1)
+    others = [threading.Thread(target=call, args=(item,), name=item) for item in ("b", "c")]
+    for thread in others:
+        thread.start()
+    _wait_for(lambda: len(batcher._pending) == 2)
+    release.set()
+    for thread in [first, *others]:
+        thread.join(5)
+
+    assert results == {"a": "ra", "b": "rb", "c": "rc"}
+    assert [items for _, items in calls] == [["a"], ["b", "c"]]
+    # The first caller returned once its own item was answered; a waiting caller led the next batch
+    assert calls[1][0] in ("b", "c")
+
+
+def test_result_length_mismatch_fails_every_caller():
+    batcher = MicroBatcher(lambda items: items[:-1], name="short")
+    with pytest.raises(RuntimeError, match="batch of 2 items returned 1 results"):
+        batcher.submit_many(["x", "y"])
+
+
+def test_exceptions_reach_the_caller_and_free_the_slot():
+    failing = True
+
+    def batch_fn(items):
+        if failing:
+            raise ValueError("provider down")
+        return items
+
+    batcher = MicroBatcher(batch_fn, name="t", max_in_flight=1)
+    with pytest.raises(ValueError, match="provider down"):
+        batcher.submit("x")
+    failing = False
+    assert batcher.submit("y") == "y"
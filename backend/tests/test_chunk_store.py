@@ -0,0 +1,62 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from src.app.core.retrieval.chunk_store import ChunkStore
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def _records(doc_key, n):
+    return {f"{doc_key}#{i}": {"text": f"{doc_key} chunk {i}"} for i in range(n)}
+
+
+def test_put_overwrite_and_delete_prefix(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.put_many({**_records("u:a", 3), **_records("u:b", 2)})
+    store.put_many({"u:a#1": {"text": "replaced"}})
+
+    assert store.get_many(["u:a#1", "u:b#0", "missing"]) == {
+        "u:a#1": {"text": "replaced"},
+        "u:b#0": {"text": "u:b chunk 0"},
+    }
+    assert store.delete_prefix("u:a#") == 3
+    assert store.get_prefix("u:a#") == {}
+    assert set(ChunkStore(str(tmp_path)).get_prefix("u:")) == {"u:b#0", "u:b#1"}
+
+
+def test_compact_keeps_only_live_records(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.put_many(_records("u:a", 50))
+    store.put_many(_records("u:b", 5))
+    store.delete_prefix("u:a#")
+    assert store.garbage_ratio > 0.5
+    size = (tmp_path / "chunks.dat").stat().st_size
+
+    assert store.compact() == 5
+    assert store.garbage_ratio == 0.0
+    assert (tmp_path / "chunks.dat").stat().st_size < size / 5
+    assert store.get_prefix("u:b#") == _records("u:b", 5)
+
+
+def test_other_process_compaction_is_detected(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.put_many({**_records("u:a", 20), **_records("u:b", 2)})
+    assert store.get_many(["u:b#1"]) == {"u:b#1": {"text": "u:b chunk 1"}}
+
+    # The other worker moves every live record to a new offset in fresh files
+    script = f"""
+import sys
+sys.path.insert(0, {str(BACKEND_DIR)!r})
+from src.app.core.retrieval.chunk_store import ChunkStore
+store = ChunkStore({str(tmp_path)!r})
+store.delete_prefix("u:a#")
+assert store.compact() == 2
+store.put_many({{"u:c#0": {{"text": "after compact"}}}})
+"""
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+    assert store.get_many(["u:b#1", "u:a#0", "u:c#0"]) == {
+        "u:b#1": {"text": "u:b chunk 1"},
+        "u:c#0": {"text": "after compact"},
+    }
@@ -0,0 +1,102 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from src.app.core.retrieval.local_store import LocalVectorStore
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+class _NoEmbeddings:
+    def embed_documents(self, texts):
+        raise AssertionError("tests pass pre-computed vectors")
+
+    def embed_query(self, text):
+        raise AssertionError("tests pass pre-computed vectors")
+
+
+def _store(path, **kwargs) -> LocalVectorStore:
+    return LocalVectorStore(_NoEmbeddings(), path=str(path) if path else None, **kwargs)
+
+
+def _add(store: LocalVectorStore, vectors, ids, source="a.pdf") -> None:
+    store.add_embeddings(
+        [f"text {vid}" for vid in ids],
+        np.asarray(vectors, dtype=np.float32).tolist(),
+        [{"user_id": "u", "source": source} for _ in ids],
+        list(ids),
+    )
+
+
+def test_upsert_delete_and_reload(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(30, 8))
+    store = _store(tmp_path)
+    _add(store, vectors[:20], [f"a{i}" for i in range(20)])
+    _add(store, vectors[20:], [f"b{i}" for i in range(10)], source="b.pdf")
+    # Re-adding an ID replaces the row; deleting masks it
+    _add(store, vectors[:1], ["a5"])
+    store.delete(filter={"source": "b.pdf"})
+    store.delete(ids=["a0"])
+
+    for reader in (store, _store(tmp_path)):
+        assert reader.count() == 19
+        assert reader.ids()[-1] == "a5"
+        hits = reader.similarity_search_by_vector_with_score(vectors[0].tolist(), k=1)
+        assert hits[0][0].id == "a5"
+
+
+def test_other_process_writes_and_compaction_are_picked_up(tmp_path):
+    store = _store(tmp_path)
+    _add(store, [[1, 0, 0, 0]], ["mine"])
+
+    script = f"""
+import sys
+sys.path.insert(0, {str(BACKEND_DIR)!r})
+from src.app.core.retrieval.local_store import LocalVectorStore
+store = LocalVectorStore(None, path={str(tmp_path)!r})
+assert store.ids() == ["mine"], store.ids()
+store.add_embeddings(["x"], [[0, 1, 0, 0]], [{{"user_id": "u"}}], ["theirs"])
+store._compact()
+store.add_embeddings(["y"], [[0, 0, 1, 0]], [{{"user_id": "u"}}], ["after-compact"])
+"""
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+    assert store.ids() == ["mine", "theirs", "after-compact"]
+    hits = store.similarity_search_by_vector_with_score([0, 0, 1, 0], k=1)
+    assert hits[0][0].id == "after-compact"
+
+
+def test_many_deletes_compact_the_files(tmp_path):
+    rng = np.random.default_rng(1)
+    store = _store(tmp_path)
+    _add(store, rng.normal(size=(3000, 4)), [f"v{i}" for i in range(3000)])
+    store.delete(ids=[f"v{i}" for i in range(2000)])
+
+    size = (tmp_path / "vectors.f32").stat().st_size
+    assert size == 1000 * 4 * 4
+    assert _store(tmp_path).count() == 1000
+
+
+def test_legacy_files_are_converted(tmp_path):
+    np.save(tmp_path / "vectors.npy", np.eye(3, dtype=np.float32))
+    (tmp_path / "records.json").write_text(
+        json.dumps({"ids": ["a", "b", "c"], "texts": ["A", "B", "C"], "metadatas": [{}, {}, {}]})
+    )
+    store = _store(tmp_path)
+    assert store.ids() == ["a", "b", "c"]
+    assert not (tmp_path / "records.json").exists()
+
+
+def test_reproject_in_memory():
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(50, 8))
+    store = _store(None)
+    _add(store, vectors, [f"v{i}" for i in range(50)])
+    assert store.reproject(4) == 50
+    assert store.dimension == 4
+    hits = store.similarity_search_by_vector_with_score(vectors[7][:4].tolist(), k=1)
+    assert hits[0][0].id == "v7"
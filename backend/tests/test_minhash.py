@@ -0,0 +1,37 @@
+from langchain_core.documents import Document
+
+from src.app.core.retrieval.minhash import METADATA_KEY, LSHIndex, diversify, encode_signature, signature
+
+CLAUSE = (
+    "The supplier shall deliver the goods to the buyer within thirty days of the order date "
+    "and shall bear all costs of transport insurance and customs clearance until the goods "
+    "are received and accepted in writing by an authorised representative of the buyer at "
+    "the delivery address stated in the purchase order"
+)
+REVISED = CLAUSE.replace("thirty days", "forty days")
+UNRELATED = (
+    "Either party may terminate this agreement by giving ninety days written notice to the "
+    "other party if the other party commits a material breach that remains unremedied"
+)
+
+
+def test_near_duplicate_respects_threshold():
+    index = LSHIndex()
+    index.add("clause", signature(CLAUSE))
+    index.add("other", signature(UNRELATED))
+
+    assert index.near_duplicate(signature(CLAUSE), threshold=1.0) == "clause"
+    assert index.near_duplicate(signature(REVISED), threshold=0.7) == "clause"
+    assert index.near_duplicate(signature(REVISED), threshold=1.0) is None
+    assert index.near_duplicate(signature("an entirely different sentence about lunch"), 0.7) is None
+
+
+def test_diversify_drops_lower_ranked_near_duplicates():
+    docs = [
+        Document(page_content=CLAUSE, metadata={METADATA_KEY: encode_signature(signature(CLAUSE))}),
+        Document(page_content=UNRELATED),  # no stored signature: computed from the text
+        Document(page_content=REVISED),
+    ]
+
+    assert [d.page_content for d in diversify(docs, threshold=0.7)] == [CLAUSE, UNRELATED]
+    assert len(diversify(docs, threshold=1.0)) == 3
@@ -36,6 +36,8 @@ export default function Page() {
   const [userFiles, setUserFiles] = useState<FileItem[]>([]);
   const [selectedScope, setSelectedScope] = useState<string | null>(null); // null = All Docs
   const [isDropdownOpen, setIsDropdownOpen] = useState(false);
+  const [filePrefix, setFilePrefix] = useState("");
+  const [filesCursor, setFilesCursor] = useState<string | null>(null);
   
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
@@ -51,20 +53,41 @@ export default function Page() {
   const highlightTimer = useRef<number | null>(null);
   const chatEndRef = useRef<HTMLDivElement>(null);
 
-  // Fetch user files on mount
+  // Fetch the first page of user files on mount, and again (debounced) when the
+  // picker's filename filter changes; /my-files is paginated and filters by prefix
   useEffect(() => {
+    let cancelled = false;
     async function loadFiles() {
       try {
         const token = await getToken();
-        if (!token) return;
-        const res = await getMyFiles(token);
+        if (!token || cancelled) return;
+        const res = await getMyFiles(token, { prefix: filePrefix.trim() || undefined });
+        if (cancelled) return;
         setUserFiles(res.files);
+        setFilesCursor(res.next_cursor ?? null);
       } catch (err) {
         console.error("Failed to load user files:", err);
       }
     }
-    loadFiles();
-  }, [getToken]);
+    const timer = window.setTimeout(loadFiles, filePrefix ? 250 : 0);
+    return () => {
+      cancelled = true;
+      window.clearTimeout(timer);
+    };
+  }, [getToken, filePrefix]);
+
+  async function loadMoreFiles() {
+    if (!filesCursor) return;
+    try {
+      const token = await getToken();
+      if (!token) return;
+      const res = await getMyFiles(token, { cursor: filesCursor, prefix: filePrefix.trim() || undefined });
+      setUserFiles(prev => [...prev, ...res.files]);
+      setFilesCursor(res.next_cursor ?? null);
+    } catch (err) {
+      console.error("Failed to load more files:", err);
+    }
+  }
 
   useEffect(() => {
     if (chatEndRef.current) {
@@ -407,11 +430,19 @@ export default function Page() {
                         All Uploaded Documents
                       </button>
                       
-                      {userFiles.length > 0 && <div className="h-px bg-white/5 my-1.5 mx-2" />}
+                      <div className="h-px bg-white/5 my-1.5 mx-2" />
+
+                      <input
+                        type="text"
+                        value={filePrefix}
+                        onChange={(e) => setFilePrefix(e.target.value)}
+                        placeholder="Filter by filename..."
+                        className="mx-1 mb-1.5 px-3 py-2 text-xs rounded-xl bg-black/30 border border-white/5 text-zinc-200 placeholder:text-zinc-500 focus:outline-none focus:border-indigo-500/30"
+                      />
                       
                       {userFiles.length === 0 && (
                         <div className="px-3 py-3 text-xs text-zinc-500 text-center italic">
-                          No documents uploaded yet.
+                          {filePrefix ? "No matching documents." : "No documents uploaded yet."}
                         </div>
                       )}
 
@@ -440,6 +471,16 @@ export default function Page() {
                           <span className="truncate">{file.filename}</span>
                         </button>
                       ))}
+
+                      {filesCursor && (
+                        <button
+                          type="button"
+                          onClick={loadMoreFiles}
+                          className="px-3 py-2 text-xs rounded-xl text-zinc-400 hover:bg-white/5 hover:text-zinc-200 transition-all outline-none"
+                        >
+                          Load more...
+                        </button>
+                      )}
                     </div>
                   </div>
                 </>
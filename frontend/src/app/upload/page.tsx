@@ -11,11 +11,13 @@ export default function UploadPage() {
   const { getToken } = useAuth();
 
   const [userFiles, setUserFiles] = useState<FileItem[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [selectedFiles, setSelectedFiles] = useState<Set<string>>(new Set());
   
   const [fileName, setFileName] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
   const [loadingFiles, setLoadingFiles] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [status, setStatus] = useState<string | null>(null);
   const [chunks, setChunks] = useState<number | null>(null);
   const [error, setError] = useState<string | null>(null);
@@ -30,6 +32,7 @@ export default function UploadPage() {
       if (!token) return;
       const res = await getMyFiles(token);
       setUserFiles(res.files);
+      setNextCursor(res.next_cursor ?? null);
     } catch (err) {
       console.error("Failed to load user files:", err);
     } finally {
@@ -37,6 +40,23 @@ export default function UploadPage() {
     }
   }, [getToken]);
 
+  // /my-files is paginated; fetch the next page and append it
+  async function loadMoreFiles() {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const token = await getToken();
+      if (!token) return;
+      const res = await getMyFiles(token, { cursor: nextCursor });
+      setUserFiles(prev => [...prev, ...res.files]);
+      setNextCursor(res.next_cursor ?? null);
+    } catch (err) {
+      console.error("Failed to load more files:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   useEffect(() => {
     fetchFiles();
   }, [fetchFiles]);
@@ -172,7 +192,7 @@ export default function UploadPage() {
         <div className="rounded-3xl border border-white/5 bg-zinc-900/40 p-4 sm:p-8 shadow-xl backdrop-blur-sm">
           
           <div className="flex flex-col sm:flex-row items-start sm:items-center justify-between gap-4 mb-6">
-            <h2 className="text-sm font-bold uppercase tracking-widest text-zinc-500">Your Files ({userFiles.length})</h2>
+            <h2 className="text-sm font-bold uppercase tracking-widest text-zinc-500">Your Files ({userFiles.length}{nextCursor ? "+" : ""})</h2>
             
             {userFiles.length > 0 && (
               <div className="flex items-center gap-3">
@@ -247,6 +267,17 @@ export default function UploadPage() {
                 </label>
               ))
             )}
+
+            {!loadingFiles && nextCursor && (
+              <button
+                type="button"
+                onClick={loadMoreFiles}
+                disabled={loadingMore}
+                className="mt-2 flex items-center justify-center gap-2 rounded-xl border border-white/5 bg-black/20 px-4 py-2.5 text-xs font-medium text-zinc-400 hover:border-white/10 hover:text-zinc-200 transition-all disabled:opacity-50"
+              >
+                {loadingMore ? <Spinner /> : "Load more"}
+              </button>
+            )}
           </div>
         </div>
       </div>
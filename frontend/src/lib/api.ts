@@ -71,9 +71,10 @@ export async function askQuestion(payload: QARequest, token?: string): Promise<Q
   }, token);
 }
 
-export async function indexPdf(file: File, token?: string): Promise<IndexPdfResponse> {
+export async function indexPdf(file: File, token?: string, collection?: string): Promise<IndexPdfResponse> {
   const form = new FormData();
   form.append("file", file);
+  if (collection) form.append("collection", collection);
 
   return request<IndexPdfResponse>("/index-pdf", {
     method: "POST",
@@ -89,9 +90,29 @@ export async function deleteMyFiles(filenames: string[], token?: string): Promis
   }, token);
 }
 
+export async function setFileCollection(
+  filenames: string[],
+  collection: string | null,
+  token?: string
+): Promise<{ updated_count: number }> {
+  return request<{ updated_count: number }>("/my-files/collection", {
+    method: "PUT",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ filenames, collection }),
+  }, token);
+}
+
 // --- NEW API CALL FOR FETCHING USER FILES ---
-export async function getMyFiles(token?: string): Promise<FileListResponse> {
-  return request<FileListResponse>("/my-files", {
+export async function getMyFiles(
+  token?: string,
+  params: { limit?: number; cursor?: string; prefix?: string } = {}
+): Promise<FileListResponse> {
+  const query = new URLSearchParams();
+  if (params.limit) query.set("limit", String(params.limit));
+  if (params.cursor) query.set("cursor", params.cursor);
+  if (params.prefix) query.set("prefix", params.prefix);
+  const qs = query.toString();
+  return request<FileListResponse>(qs ? `/my-files?${qs}` : "/my-files", {
     method: "GET",
   }, token);
 }
\ No newline at end of file
@@ -36,6 +36,13 @@ export type QAResponse = {
 export type IndexPdfResponse = {
   filename?: string;
   chunks_indexed?: number;
+  // 1-based page numbers left out of the index
+  skipped_pages?: {
+    blank: number[];
+    image_only: number[];
+    duplicate: number[];
+    boilerplate_lines: number;
+  };
   message?: string;
   status?: string;
 };
@@ -43,7 +50,9 @@ export type IndexPdfResponse = {
 export type QARequest = {
   question: string;
   thread_id?: string;
-  document_scope?: string | null;
+  // One filename or several; combined with `collection` when both are given
+  document_scope?: string | string[] | null;
+  collection?: string | null;
 };
 
 // --- NEW FILE MANAGEMENT TYPES ---
@@ -52,8 +61,15 @@ export type FileItem = {
   id: number;
   filename: string;
   upload_timestamp: string;
+  summary?: string | null;
+  file_size?: number | null;
+  page_count?: number | null;
+  chunk_count?: number | null;
+  content_hash?: string | null;
+  collection?: string | null;
 };
 
 export type FileListResponse = {
   files: FileItem[];
+  next_cursor?: string | null;
 };
\ No newline at end of file